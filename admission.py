@@ -0,0 +1,216 @@
+"""
+Admission Control — bounds how much work each route lets into the worker.
+
+Every route has a concurrency limit and a queue depth. A request beyond the
+limit waits in the route's queue; once the queue is full (or the wait
+exceeds ADMISSION_QUEUE_TIMEOUT) it is turned away at once with 503 and a
+Retry-After estimate, instead of piling more turns onto the model or more
+payments onto WorldPay. A session that already has ADMISSION_MAX_PER_SESSION
+requests in a route gets 429.
+
+All routes also share ADMISSION_MAX_CONCURRENCY slots. Freed slots go to
+routes in priority order — queued checkouts before queued chats — and a
+chat can't take a slot while a checkout is waiting. Keeping
+CHAT_MAX_CONCURRENCY below the shared total leaves headroom for checkouts
+even when chat is saturated.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from metrics import ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "48"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_MAX_PER_SESSION = int(os.getenv("ADMISSION_MAX_PER_SESSION", "2"))
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "32"))
+CHAT_QUEUE_DEPTH = int(os.getenv("CHAT_QUEUE_DEPTH", "64"))
+CHECKOUT_MAX_CONCURRENCY = int(os.getenv("CHECKOUT_MAX_CONCURRENCY", "16"))
+CHECKOUT_QUEUE_DEPTH = int(os.getenv("CHECKOUT_QUEUE_DEPTH", "64"))
+
+BUSY_MESSAGE = "We're very busy right now. Please try again shortly."
+
+
+class Overloaded(Exception):
+    """Request turned away; `status` is 429 or 503, `retry_after` in whole seconds."""
+
+    def __init__(self, status: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RouteLimit:
+    def __init__(self, name: str, limit: int, queue_depth: int, priority: int):
+        self.name = name
+        self.limit = limit
+        self.queue_depth = queue_depth
+        self.priority = priority  # lower is served first
+        self.active = 0
+        self.waiting: deque[asyncio.Future] = deque()
+        self.sessions: dict[str, int] = {}
+        self.service_time = 1.0  # moving average of seconds per admitted request
+        self.admitted = 0
+        self.rejected = 0
+
+
+class Ticket:
+    """An admitted request's slot; release() is idempotent."""
+
+    def __init__(self, controller: "AdmissionController", route: RouteLimit, session_id: Optional[str]):
+        self.controller = controller
+        self.route = route
+        self.session_id = session_id
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._leave(self)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        routes: list[RouteLimit],
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        max_per_session: int = ADMISSION_MAX_PER_SESSION,
+    ):
+        self.routes = {r.name: r for r in routes}
+        self._by_priority = sorted(routes, key=lambda r: r.priority)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_per_session = max_per_session
+        self.active = 0
+
+    @asynccontextmanager
+    async def admit(self, route: str, session_id: Optional[str] = None):
+        """Hold a slot on `route` for the block; raises Overloaded if none can be had."""
+        ticket = await self.enter(route, session_id)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    async def enter(self, route: str, session_id: Optional[str] = None) -> Ticket:
+        """
+        Take a slot on `route`, waiting in its queue if needed. Split from
+        admit() so a streamed response can hold its slot until the stream
+        ends; release the returned ticket when done.
+        """
+        r = self.routes[route]
+        if session_id and r.sessions.get(session_id, 0) >= self.max_per_session:
+            raise self._reject(r, 429, 1, "You already have a request in progress. Please wait for it to finish.")
+
+        queued = time.monotonic()
+        if not self._can_start(r):
+            if len(r.waiting) >= r.queue_depth:
+                raise self._reject(r, 503, self._retry_after(r), BUSY_MESSAGE)
+            await self._wait(r)
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - queued, route=r.name)
+
+        r.admitted += 1
+        if session_id:
+            r.sessions[session_id] = r.sessions.get(session_id, 0) + 1
+        return Ticket(self, r, session_id)
+
+    def _leave(self, ticket: Ticket) -> None:
+        r = ticket.route
+        # Smooth so one slow request doesn't swing Retry-After
+        r.service_time = 0.8 * r.service_time + 0.2 * (time.monotonic() - ticket.started)
+        if ticket.session_id:
+            r.sessions[ticket.session_id] -= 1
+            if not r.sessions[ticket.session_id]:
+                del r.sessions[ticket.session_id]
+        self._release(r)
+
+    def _can_start(self, r: RouteLimit) -> bool:
+        """Start now if there's room and no queued request that could use it is ahead of us."""
+        if self.active >= self.max_concurrency or r.active >= r.limit or r.waiting:
+            return False
+        if any(o.waiting and o.active < o.limit for o in self._by_priority if o.priority < r.priority):
+            return False
+        self._take(r)
+        return True
+
+    async def _wait(self, r: RouteLimit) -> None:
+        granted = asyncio.get_running_loop().create_future()
+        r.waiting.append(granted)
+        try:
+            await asyncio.wait({granted}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # Client went away while queued
+            self._abandon(r, granted)
+            raise
+        if not granted.done():
+            self._abandon(r, granted)
+            raise self._reject(r, 503, self._retry_after(r), BUSY_MESSAGE)
+
+    def _reject(self, r: RouteLimit, status: int, retry_after: int, message: str) -> Overloaded:
+        r.rejected += 1
+        ADMISSION_REJECTED.inc(route=r.name, status=status)
+        logger.info(f"Admission: {r.name} rejected with {status} ({r.active} active, {len(r.waiting)} queued)")
+        return Overloaded(status, retry_after, message)
+
+    def _abandon(self, r: RouteLimit, granted: asyncio.Future) -> None:
+        if granted.done() and not granted.cancelled():
+            # The slot was handed over as we gave up — pass it on
+            self._release(r)
+        else:
+            granted.cancel()
+            r.waiting.remove(granted)
+
+    def _take(self, r: RouteLimit) -> None:
+        r.active += 1
+        self.active += 1
+
+    def _release(self, r: RouteLimit) -> None:
+        r.active -= 1
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued requests, highest-priority route first."""
+        while self.active < self.max_concurrency:
+            route = next((r for r in self._by_priority if r.waiting and r.active < r.limit), None)
+            if route is None:
+                return
+            self._take(route)
+            route.waiting.popleft().set_result(None)
+
+    def _retry_after(self, r: RouteLimit) -> int:
+        """Seconds until the queue ahead of a new request should have drained."""
+        return max(1, min(60, math.ceil(r.service_time * (len(r.waiting) + 1) / max(r.limit, 1))))
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "routes": {
+                r.name: {
+                    "active": r.active,
+                    "limit": r.limit,
+                    "waiting": len(r.waiting),
+                    "queue_depth": r.queue_depth,
+                    "admitted": r.admitted,
+                    "rejected": r.rejected,
+                    "service_time_s": round(r.service_time, 3),
+                }
+                for r in self._by_priority
+            },
+        }
+
+
+admission = AdmissionController([
+    RouteLimit("checkout", CHECKOUT_MAX_CONCURRENCY, CHECKOUT_QUEUE_DEPTH, priority=0),
+    RouteLimit("chat", CHAT_MAX_CONCURRENCY, CHAT_QUEUE_DEPTH, priority=1),
+])
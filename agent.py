@@ -1,10 +1,17 @@
 """
 Central Shopping Agent — focuses on autonomous reasoning and tool orchestration.
 """
-import ollama
-import json
+import asyncio
 import logging
-from tools import TOOL_SCHEMAS, execute_tool
+from typing import Optional
+from tools import COMPACT_TOOL_RESULTS, execute_tool, execute_tools, aexecute_tools, encode_result
+from history_manager import HistoryManager, estimate_prompt_tokens
+from intent_router import IntentRouter, intent_router
+from response_cache import ResponseCache, response_cache
+from catalog_service import catalog_service
+from llm_client import LLMClient, LLM_BACKEND, OLLAMA_MODEL
+from llm_pool import PoolExhausted
+from metrics import span, TurnTrace, LLM_SECONDS, LLM_PROMPT_TOKENS, LLM_EVAL_TOKENS, PROMPT_TOKENS
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +21,8 @@ Your role is to:
 
 Show available products clearly when the user enters the store. use 'search_products' for showing & searching products. Show offers when available using 'get_best_offer' 
 
+To compare prices of several products, call 'get_best_offers' once with all of them instead of 'get_best_offer' for each.
+
 Help the user explore products (search, filter, categories).
 
 Confirm product selection before purchase.
@@ -25,39 +34,60 @@ When user says "checkout", "payment", "buy", "purchase", "pay", or similar terms
 You must follow a structured conversational flow.
 """
 
+BUSY_REPLY = "I'm helping a lot of shoppers right now. Please try again in a moment."
+
 class ShoppingAgent:
-    def __init__(self, model: str = "llama3.1"):
+    def __init__(
+        self,
+        model: str = OLLAMA_MODEL,
+        router: Optional[IntentRouter] = intent_router,
+        cache: Optional[ResponseCache] = response_cache,
+        backend: str = LLM_BACKEND,
+        compact_results: bool = COMPACT_TOOL_RESULTS,
+        llm: Optional[LLMClient] = None,
+    ):
         self.model = model
         self.max_iterations = 10
+        self.router = router
+        self.cache = cache
+        self.compact_results = compact_results
+        self.llm = llm or LLMClient(model, backend)
 
-    def chat(self, user_message: str, history: list[dict]) -> dict:
+    def chat(self, user_message: str, history: list[dict], pinned_offer: Optional[dict] = None, session_id: str = "default") -> dict:
         """
         Executes the reasoning loop for a single user interaction.
         """
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        messages.extend(history)
-        
-        # Track start of current turn for new_messages extraction
-        turn_start_idx = len(messages)
-        messages.append({"role": "user", "content": user_message})
+        trace = TurnTrace()
+        intent = self.router.route(user_message, pinned_offer) if self.router else None
+        if intent:
+            result = self._run_intent(intent, user_message)
+            trace.finish("router")
+            return result
 
+        cache_key, entry = self._cache_lookup(user_message, history, pinned_offer)
+        if entry:
+            result = self._replay(entry, user_message)
+            trace.finish("cache")
+            return result
+
+        messages, turn_start_idx = self._build_messages(user_message, history, pinned_offer)
         thinking_steps = []
-        state = {
-            "offer_details": None,
-            "search_results": [],
-            "trigger_checkout": False,
-        }
+        state = self._new_state()
+        plan = []
 
         for iteration in range(self.max_iterations):
-            logger.info(f"Agent turn {iteration + 1}")
+            self._record_prompt_size(state, iteration, messages)
             try:
-                response = ollama.chat(
-                    model=self.model,
-                    messages=messages,
-                    tools=TOOL_SCHEMAS,
-                )
+                with span(LLM_SECONDS, trace=trace, model=self.model) as s:
+                    response = self.llm.chat(messages, s, session_id)
+                    self._record_usage(s, response)
+            except PoolExhausted as e:
+                logger.warning(f"LLM busy: {e}")
+                trace.finish("busy")
+                return self._error_response(BUSY_REPLY)
             except Exception as e:
                 logger.error(f"Ollama error: {e}")
+                trace.finish("error")
                 return self._error_response("I encountered a thinking error. Please try again.")
 
             msg = response["message"]
@@ -65,26 +95,254 @@ class ShoppingAgent:
             if not msg.get("tool_calls"):
                 final_reply = msg.get("content", "I'm not sure how to help.")
                 messages.append({"role": "assistant", "content": final_reply})
+                self._cache_store(cache_key, plan, final_reply)
                 break
 
             # Handle tool calls
             messages.append(msg) # role: assistant with tool_calls
             
-            for tool_call in msg["tool_calls"]:
-                name = tool_call["function"]["name"]
-                args = tool_call["function"]["arguments"]
-                
-                thinking_steps.append(f"🔍 Executing **{name}**...")
-                result = execute_tool(name, args)
-                
+            calls = [(tc["function"]["name"], tc["function"]["arguments"]) for tc in msg["tool_calls"]]
+            plan.append(calls)
+            thinking_steps.extend(f"🔍 Executing **{name}**..." for name, _ in calls)
+
+            # Independent calls run concurrently; results come back in call order
+            with trace.part("tools"):
+                results = execute_tools(calls)
+            for (name, _), result in zip(calls, results):
                 # Update agent state based on tool results
                 self._update_state(state, name, result)
 
                 messages.append({
                     "role": "tool",
-                    "content": json.dumps(result),
+                    "content": encode_result(name, result, self.compact_results),
+                })
+
+        trace.finish("llm")
+        return self._turn_response(messages, turn_start_idx, thinking_steps, state)
+
+    async def achat(self, user_message: str, history: list[dict], pinned_offer: Optional[dict] = None, session_id: str = "default") -> dict:
+        """
+        Async variant of chat() for use inside the event loop.
+
+        LLM calls go through ollama.AsyncClient and tools run in a worker
+        thread, so concurrent sessions overlap their waits instead of
+        blocking each other.
+        """
+        result = self._error_response("I'm not sure how to help.")
+        async for event in self.astream(user_message, history, pinned_offer, session_id):
+            if event["event"] == "done":
+                result = event["result"]
+        return result
+
+    async def astream(self, user_message: str, history: list[dict], pinned_offer: Optional[dict] = None, session_id: str = "default"):
+        """
+        Runs the reasoning loop and yields progress events as they happen.
+
+        Events are dicts keyed by "event":
+          - "thinking":       {"step": str} before each tool runs
+          - "search_results": {"products": list} after a successful search
+          - "offer_details":  {"offer": dict} when an offer is selected
+          - "token":          {"content": str} streamed assistant text
+          - "done":           {"result": dict} same shape as chat()
+        """
+        trace = TurnTrace()
+        intent = self.router.route(user_message, pinned_offer) if self.router else None
+        if intent:
+            # Deterministic request — skip the LLM entirely
+            yield {"event": "thinking", "step": f"🔍 Executing **{intent['tool']}**..."}
+            result = await asyncio.to_thread(self._run_intent, intent, user_message)
+            trace.finish("router")
+            for event in self._result_events(result):
+                yield event
+            return
+
+        cache_key, entry = self._cache_lookup(user_message, history, pinned_offer)
+        if entry:
+            # Seen this exact turn before — replay its tools and reply without the LLM
+            for calls in entry["plan"]:
+                for name, _ in calls:
+                    yield {"event": "thinking", "step": f"🔍 Executing **{name}**..."}
+            result = await asyncio.to_thread(self._replay, entry, user_message)
+            trace.finish("cache")
+            for event in self._result_events(result):
+                yield event
+            return
+
+        messages, turn_start_idx = self._build_messages(user_message, history, pinned_offer)
+        thinking_steps = []
+        state = self._new_state()
+        plan = []
+
+        for iteration in range(self.max_iterations):
+            self._record_prompt_size(state, iteration, messages)
+            content = ""
+            tool_calls = []
+            try:
+                with span(LLM_SECONDS, trace=trace, model=self.model) as s:
+                    # Queued per session in the backend pool, so one busy session can't starve others
+                    async for chunk in self.llm.astream(messages, s, session_id):
+                        part = chunk["message"]
+                        if part.get("content"):
+                            content += part["content"]
+                            yield {"event": "token", "content": part["content"]}
+                        if part.get("tool_calls"):
+                            # Plain dicts, so history stays JSON-serialisable for the session store
+                            tool_calls.extend(
+                                {"function": {"name": tc["function"]["name"], "arguments": tc["function"]["arguments"]}}
+                                for tc in part["tool_calls"]
+                            )
+                        if chunk.get("done"):
+                            self._record_usage(s, chunk)
+                    state["first_token_ms"].append(s.get("first_token_ms"))
+            except PoolExhausted as e:
+                logger.warning(f"LLM busy: {e}")
+                trace.finish("busy")
+                yield {"event": "done", "result": self._error_response(BUSY_REPLY)}
+                return
+            except Exception as e:
+                logger.error(f"Ollama error: {e}")
+                trace.finish("error")
+                yield {"event": "done", "result": self._error_response("I encountered a thinking error. Please try again.")}
+                return
+
+            if not tool_calls:
+                final_reply = content or "I'm not sure how to help."
+                messages.append({"role": "assistant", "content": final_reply})
+                self._cache_store(cache_key, plan, final_reply)
+                break
+
+            # Handle tool calls
+            messages.append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+
+            calls = [(tc["function"]["name"], tc["function"]["arguments"]) for tc in tool_calls]
+            plan.append(calls)
+            for name, _ in calls:
+                step = f"🔍 Executing **{name}**..."
+                thinking_steps.append(step)
+                yield {"event": "thinking", "step": step}
+
+            # Tools are synchronous (catalog lookups, WorldPay HTTP) — run them in worker
+            # threads, independent ones concurrently; results come back in call order
+            with trace.part("tools"):
+                results = await aexecute_tools(calls)
+
+            for (name, _), result in zip(calls, results):
+                previous_offer = state["offer_details"]
+                self._update_state(state, name, result)
+                if name == "search_products" and result.get("found"):
+                    yield {"event": "search_results", "products": state["search_results"]}
+                if state["offer_details"] is not previous_offer:
+                    yield {"event": "offer_details", "offer": state["offer_details"]}
+
+                messages.append({
+                    "role": "tool",
+                    "content": encode_result(name, result, self.compact_results),
                 })
 
+        trace.finish("llm")
+        yield {"event": "done", "result": self._turn_response(messages, turn_start_idx, thinking_steps, state)}
+
+    async def warm_up(self) -> Optional[float]:
+        """Load the model with the system prompt and tools evaluated, before the first user turn."""
+        messages, _ = self._build_messages("Hi", [])
+        return await self.llm.awarm_up(messages)
+
+    def _run_intent(self, intent: dict, user_message: str) -> dict:
+        """Execute a routed intent's tool and answer from a template, recording the turn like the LLM would."""
+        name, args = intent["tool"], intent["arguments"]
+        state = self._new_state()
+        result = execute_tool(name, args)
+        self._update_state(state, name, result)
+        reply = IntentRouter.reply(intent, result)
+
+        messages = [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": "", "tool_calls": [{"function": {"name": name, "arguments": args}}]},
+            {"role": "tool", "content": encode_result(name, result, self.compact_results)},
+            {"role": "assistant", "content": reply},
+        ]
+        return self._turn_response(messages, 0, [f"🔍 Executing **{name}**..."], state)
+
+    def _cache_lookup(self, user_message: str, history: list, pinned_offer: Optional[dict]):
+        if not self.cache:
+            return None, None
+        key = self.cache.key(user_message, history, catalog_service.version, pinned_offer)
+        return key, self.cache.get(key, catalog_service.version)
+
+    def _cache_store(self, cache_key: Optional[str], plan: list, reply: str) -> None:
+        if cache_key and self.cache:
+            self.cache.put(cache_key, catalog_service.version, plan, reply)
+
+    def _replay(self, entry: dict, user_message: str) -> dict:
+        """Re-run a cached tool plan for fresh results and answer with the cached reply."""
+        state = self._new_state()
+        thinking_steps = []
+        messages = [{"role": "user", "content": user_message}]
+        for calls in entry["plan"]:
+            messages.append({
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"function": {"name": name, "arguments": args}} for name, args in calls],
+            })
+            for (name, _), result in zip(calls, execute_tools(calls)):
+                thinking_steps.append(f"🔍 Executing **{name}**...")
+                self._update_state(state, name, result)
+                messages.append({"role": "tool", "content": encode_result(name, result, self.compact_results)})
+        messages.append({"role": "assistant", "content": entry["reply"]})
+        return self._turn_response(messages, 0, thinking_steps, state)
+
+    def _result_events(self, result: dict) -> list[dict]:
+        """Stream events for a turn that was answered without the LLM."""
+        events = []
+        if result["search_results"]:
+            events.append({"event": "search_results", "products": result["search_results"]})
+        if result["offer_details"]:
+            events.append({"event": "offer_details", "offer": result["offer_details"]})
+        events.append({"event": "token", "content": result["reply"]})
+        events.append({"event": "done", "result": result})
+        return events
+
+    def _build_messages(self, user_message: str, history: list[dict], pinned_offer: Optional[dict] = None) -> tuple[list, int]:
+        # The active offer is pinned right after the system prompt so it survives history
+        # trimming and reads as standing context. It only changes when a new offer is
+        # quoted, so consecutive calls still share a long prompt prefix
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        messages.extend(HistoryManager.pinned_context(pinned_offer))
+        messages.extend(history)
+
+        # Track start of current turn for new_messages extraction
+        turn_start_idx = len(messages)
+        messages.append({"role": "user", "content": user_message})
+        return messages, turn_start_idx
+
+    def _new_state(self) -> dict:
+        return {
+            "offer_details": None,
+            "search_results": [],
+            "trigger_checkout": False,
+            "prompt_tokens": [],  # estimated prompt size of each LLM call
+            "first_token_ms": [],  # time to first chunk of each streamed LLM call
+        }
+
+    def _record_prompt_size(self, state: dict, iteration: int, messages: list) -> None:
+        prompt_tokens = estimate_prompt_tokens(messages)
+        state["prompt_tokens"].append(prompt_tokens)
+        PROMPT_TOKENS.observe(prompt_tokens, call="first" if iteration == 0 else "tool_followup")
+        logger.info(f"Agent turn {iteration + 1} (~{prompt_tokens} prompt tokens)")
+
+    def _record_usage(self, span_attrs: dict, response) -> None:
+        """Token counts the model reported for one call (final chunk when streaming)."""
+        prompt_tokens = response.get("prompt_eval_count") or 0
+        eval_tokens = response.get("eval_count") or 0
+        LLM_PROMPT_TOKENS.inc(prompt_tokens, model=self.model)
+        LLM_EVAL_TOKENS.inc(eval_tokens, model=self.model)
+        span_attrs["prompt_tokens"] = prompt_tokens
+        span_attrs["eval_tokens"] = eval_tokens
+        if response.get("load_duration"):
+            # Non-zero when this call had to (re)load the model
+            span_attrs["load_ms"] = round(response["load_duration"] / 1e6, 1)
+
+    def _turn_response(self, messages, turn_start_idx, thinking_steps, state) -> dict:
         return {
             "reply": messages[-1]["content"],
             "thinking_steps": thinking_steps,
@@ -97,6 +355,9 @@ class ShoppingAgent:
             state["search_results"] = result.get("products", [])
         elif name == "get_best_offer" and result.get("found"):
             state["offer_details"] = result.get("best_offer")
+        elif name == "get_best_offers" and result.get("count") == 1:
+            # A single priced product is as good as get_best_offer; comparisons leave the choice to the user
+            state["offer_details"] = next(q["best_offer"] for q in result["quotes"] if q["found"])
         elif name == "initiate_checkout" and result.get("success"):
             # Include offer details from initiate_checkout if available
             if result.get("offer_details"):
@@ -111,6 +372,8 @@ class ShoppingAgent:
             "offer_details": None,
             "search_results": [],
             "trigger_checkout": False,
+            "prompt_tokens": [],
+            "first_token_ms": [],
         }
 
 # Global singleton for easy use in main.py
@@ -0,0 +1,9 @@
+"""
+Benchmarks — reproducible latency / memory measurements for the hot paths.
+
+    python -m benchmarks.catalog_bench            # search, pricing, tool dispatch
+    python -m benchmarks.e2e_bench                # /chat and /checkout under load
+
+Both accept --json to save results and --baseline to fail (exit 1) when a
+p95 regresses by more than --tolerance against a previously saved run.
+"""
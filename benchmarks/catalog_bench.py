@@ -0,0 +1,123 @@
+"""
+Catalog benchmark — CatalogService.search, get_vendor_prices(_bulk) and tool
+dispatch against synthetic catalogs.
+
+    python -m benchmarks.catalog_bench                       # 1k and 100k SKUs
+    python -m benchmarks.catalog_bench --sizes 1000,100000,1000000
+
+Catalogs are generated from a fixed seed, so runs are comparable.
+"""
+import time
+import random
+import argparse
+import logging
+
+from catalog_service import catalog_service, CATALOG
+from catalog_store import MemoryCatalogStore
+from tools import execute_tool
+from benchmarks.stats import summarize, rss_mb, add_output_args, report
+
+BRANDS = ["Brooks", "ASICS", "Nike", "Hoka", "Saucony", "New Balance", "Penguin", "Vintage", "Scribner", "Knopf"]
+MODELS = ["Ghost", "Glycerin", "Nimbus", "Kayano", "Pegasus", "Clifton", "Ride", "Fresh Foam", "Atlas", "Horizon"]
+TAGS = ["running", "cushioned", "neutral", "stability", "trail", "fiction", "habits", "coding", "history", "classic"]
+SIZES = ["7", "7.5", "8", "8.5", "9", "9.5", "10", "10.5", "11", "12", "13"]
+
+QUERIES = [
+    {"query": "brooks"},
+    {"query": "running shoes", "category": "shoes"},
+    {"query": "cushioned", "size": "10.5"},
+    {"query": "nimbus", "max_price": 150},
+    {"query": "habits book", "category": "books"},
+    {"query": "trail"},
+    {"query": "gel"},
+    {"query": "zzz no match"},
+]
+
+
+def synthetic_catalog(n: int, seed: int = 7) -> dict:
+    """n products shaped like CATALOG entries, with the real products first."""
+    rng = random.Random(seed)
+    catalog = dict(CATALOG)
+    for i in range(max(0, n - len(catalog))):
+        category = "shoes" if i % 2 == 0 else "books"
+        brand = rng.choice(BRANDS)
+        model = rng.choice(MODELS)
+        pid = f"sku_{i}"
+        product = {
+            "id": pid,
+            "name": f"{brand} {model} {rng.randint(1, 40)}",
+            "brand": brand,
+            "category": category,
+            "description": f"Synthetic {category} item {i}.",
+            "base_price": round(rng.uniform(8, 250), 2),
+            "image_url": "/static/placeholder.png",
+            "tags": rng.sample(TAGS, 3),
+        }
+        if category == "shoes":
+            product["available_sizes"] = sorted(rng.sample(SIZES, 6), key=SIZES.index)
+            product["available_widths"] = ["D", "2E"]
+        catalog[pid] = product
+    return catalog
+
+
+def timed(fn, calls) -> tuple[list[float], float]:
+    """Per-call latencies and total wall time of fn(*args) over `calls`."""
+    samples = []
+    started = time.perf_counter()
+    for args in calls:
+        t = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t)
+    return samples, time.perf_counter() - started
+
+
+def bench_size(n: int, iterations: int) -> list[dict]:
+    rss_before = rss_mb()
+    catalog_service.set_store(MemoryCatalogStore(synthetic_catalog(n)))
+    started = time.perf_counter()
+    catalog_service.index  # build now, not inside the first search
+    build = time.perf_counter() - started
+    label = f"{n // 1000}k" if n < 1_000_000 else f"{n // 1_000_000}M"
+    results = [summarize(f"index_build[{label}]", [build], rss_mb=round(rss_mb() - rss_before, 1))]
+
+    searches = [(q,) for q in QUERIES] * max(1, iterations // len(QUERIES))
+    samples, elapsed = timed(lambda q: catalog_service.search(**q), searches)
+    results.append(summarize(f"search[{label}]", samples, elapsed))
+
+    rng = random.Random(n)
+    ids = [p.id for p in catalog_service.get_all_products()]
+    cold = [(rng.choice(ids),) for _ in range(min(iterations, 500))]
+    catalog_service.offer_cache.clear()
+    samples, elapsed = timed(catalog_service.get_vendor_prices, cold)
+    results.append(summarize(f"vendor_prices_cold[{label}]", samples, elapsed))
+    samples, elapsed = timed(catalog_service.get_vendor_prices, cold)
+    results.append(summarize(f"vendor_prices_cached[{label}]", samples, elapsed))
+
+    # get_best_offers-sized batches of cold products, one batched pricing pass each
+    batches = [([(rng.choice(ids), 1) for _ in range(20)],) for _ in range(max(1, len(cold) // 20))]
+    catalog_service.offer_cache.clear()
+    samples, elapsed = timed(catalog_service.get_vendor_prices_bulk, batches)
+    results.append(summarize(f"vendor_prices_bulk20[{label}]", samples, elapsed))
+
+    dispatch = [("search_products", q) for q in QUERIES] + [("get_best_offer", {"product_id": pid}) for (pid,) in cold[:len(QUERIES)]]
+    samples, elapsed = timed(execute_tool, dispatch * max(1, iterations // len(dispatch)))
+    results.append(summarize(f"execute_tool[{label}]", samples, elapsed, rss_mb=rss_mb()))
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000", help="comma-separated SKU counts (default 1000,100000)")
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per measurement (default 2000)")
+    add_output_args(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    for n in (int(s) for s in args.sizes.split(",")):
+        results.extend(bench_size(n, args.iterations))
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
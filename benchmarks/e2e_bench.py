@@ -0,0 +1,180 @@
+"""
+End-to-end benchmark — /chat and /checkout throughput under concurrent load.
+
+Starts three local servers on free ports and drives them over HTTP:
+  - fake_ollama.py     scripted LLM (search tool call, then a reply); one per --backends
+  - worldpay_mock.py   payment gateway
+  - main.py            the app, pointed at both via OLLAMA_HOSTS / WORLDPAY_BASE_URL
+
+    python -m benchmarks.e2e_bench --concurrency 32 --requests 1000
+    python -m benchmarks.e2e_bench --ollama-latency 0.2 --worldpay-latency 0.1
+
+Every /chat message is unique so the intent router and response cache stay
+out of the measurement; /checkout sessions first get a quote through the
+router ("best price for brooks ghost"), which is not timed. A checkout is
+timed until its queued payment job has settled (polling its status).
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+
+from benchmarks.stats import summarize, rss_mb, add_output_args, report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CARD = {
+    "card_type": "Visa",
+    "card_number": "4111 1111 1111 1111",
+    "card_expiry": "12/30",
+    "card_cvc": "123",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server on port {port} exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start within {timeout}s")
+
+
+@contextmanager
+def servers(
+    ollama_latency: float,
+    worldpay_latency: float,
+    verbose: bool = False,
+    extra_env: Optional[dict] = None,
+    backends: int = 1,
+):
+    """Run `backends` fake Ollama servers, the WorldPay mock and the app; yields (app_url, app_pid)."""
+    ports = {f"ollama{i}": free_port() for i in range(backends)}
+    ports.update({"worldpay": free_port(), "app": free_port()})
+    env = {
+        **os.environ,
+        "FAKE_OLLAMA_LATENCY": str(ollama_latency),
+        "WORLDPAY_MOCK_LATENCY": str(worldpay_latency),
+        "OLLAMA_HOSTS": ",".join(f"http://127.0.0.1:{ports[f'ollama{i}']}" for i in range(backends)),
+        "WORLDPAY_BASE_URL": f"http://127.0.0.1:{ports['worldpay']}",
+        "WORLDPAY_USERNAME": os.getenv("WORLDPAY_USERNAME", "bench"),
+        "WORLDPAY_PASSWORD": os.getenv("WORLDPAY_PASSWORD", "bench"),
+        "LLM_BACKEND": "ollama",
+        **(extra_env or {}),
+    }
+    processes = []
+    try:
+        modules = [(f"ollama{i}", "fake_ollama") for i in range(backends)] + [("worldpay", "worldpay_mock"), ("app", "main")]
+        for name, module in modules:
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(ports[name]), "--log-level", "warning"],
+                cwd=ROOT,
+                env=env,
+                stdout=None if verbose else subprocess.DEVNULL,
+                stderr=None if verbose else subprocess.DEVNULL,
+            )
+            processes.append(process)
+            wait_for_port(ports[name], process)
+        yield f"http://127.0.0.1:{ports['app']}", processes[-1].pid
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+async def run_load(concurrency: int, total: int, request) -> tuple[list[float], float, int]:
+    """Issue `total` requests from `concurrency` workers; returns (latencies, elapsed, errors)."""
+    samples: list[float] = []
+    errors = 0
+    next_id = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in next_id:
+            t = time.perf_counter()
+            try:
+                ok = await request(i)
+            except httpx.HTTPError:
+                ok = False
+            samples.append(time.perf_counter() - t)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started, errors
+
+
+async def pay(client: httpx.AsyncClient, session_id: str, poll: float = 0.02) -> bool:
+    """POST /checkout, then poll the queued job until it settles; True if the payment went through."""
+    response = await client.post("/checkout", json={"session_id": session_id, **CARD})
+    job = response.json()
+    while response.status_code in (200, 202) and job.get("status") == "pending":
+        await asyncio.sleep(poll)
+        response = await client.get(f"/checkout/status/{job['job_id']}", params={"session_id": session_id})
+        job = response.json()
+    return response.status_code == 200 and bool(job.get("success"))
+
+
+async def bench(app_url: str, concurrency: int, total: int) -> list[dict]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=60, limits=limits) as client:
+
+        async def chat(i: int) -> bool:
+            response = await client.post("/chat", json={"session_id": f"chat-{i}", "message": f"cushioned running shoes for race {i}"})
+            return response.status_code == 200 and bool(response.json().get("search_results"))
+
+        async def checkout(i: int) -> bool:
+            return await pay(client, f"pay-{i}")
+
+        await chat(total)  # warm up imports, index and connection pools (unique message, like the rest)
+        results = []
+        samples, elapsed, errors = await run_load(concurrency, total, chat)
+        results.append(summarize("chat", samples, elapsed, errors=errors))
+
+        quotes = [client.post("/chat", json={"session_id": f"pay-{i}", "message": "best price for brooks ghost"}) for i in range(total)]
+        for start in range(0, total, concurrency):
+            await asyncio.gather(*quotes[start:start + concurrency])
+        samples, elapsed, errors = await run_load(concurrency, total, checkout)
+        results.append(summarize("checkout", samples, elapsed, errors=errors))
+        return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients (default 16)")
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint (default 400)")
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="fake LLM delay per call in seconds")
+    parser.add_argument("--worldpay-latency", type=float, default=0.05, help="mock gateway delay in seconds")
+    parser.add_argument("--verbose", action="store_true", help="show server logs")
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    with servers(args.ollama_latency, args.worldpay_latency, args.verbose) as (app_url, app_pid):
+        results = asyncio.run(bench(app_url, args.concurrency, args.requests))
+        results[-1]["rss_mb"] = rss_mb(app_pid)
+    for r in results:
+        if r["errors"]:
+            print(f"warning: {r['errors']} failed {r['name']} requests")
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
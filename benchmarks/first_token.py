@@ -0,0 +1,87 @@
+"""
+First-token benchmark — time from sending a chat request to its first
+streamed chunk, on recorded sessions against the fake Ollama backend with
+a model load time and prompt-prefix caching (see fake_ollama.py).
+
+    python -m benchmarks.first_token
+    python -m benchmarks.first_token --load-time 3 --prompt-rate 300
+
+Scenarios, each with a freshly "started" backend:
+  unloaded        keep_alive=0, so every call reloads the model
+  cold            no warm-up: the first user pays the model load
+  warm            LLMClient.awarm_up() at startup (what main.py does)
+  history-first   warm, but the pinned offer placed after the history
+                  instead of right after the system prompt
+
+first_call[...] is the very first call of the run; first_token[...]
+covers every call. Intent router and response cache are off.
+"""
+import asyncio
+import argparse
+import logging
+from typing import Optional
+
+from agent import ShoppingAgent, SYSTEM_PROMPT
+from fake_ollama import FakeOllama, FakeOllamaTransport
+from history_manager import HistoryManager, history_manager
+from llm_client import LLMClient, OLLAMA_KEEP_ALIVE
+from benchmarks.replay import SAMPLE, load_conversations
+from benchmarks.stats import summarize, add_output_args, report
+
+
+class HistoryFirstAgent(ShoppingAgent):
+    """Alternative prompt layout for comparison: pinned offer between the history and the new message."""
+
+    def _build_messages(self, user_message: str, history: list[dict], pinned_offer: Optional[dict] = None) -> tuple[list, int]:
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        messages.extend(history)
+        messages.extend(HistoryManager.pinned_context(pinned_offer))
+        turn_start_idx = len(messages)
+        messages.append({"role": "user", "content": user_message})
+        return messages, turn_start_idx
+
+
+async def run_scenario(name: str, conversations: list, args, keep_alive: str, warm_up: bool, agent_class=ShoppingAgent) -> list[dict]:
+    fake = FakeOllama(latency=args.latency, prompt_rate=args.prompt_rate, token_rate=args.token_rate, load_time=args.load_time)
+    llm = LLMClient(keep_alive=keep_alive, transport=FakeOllamaTransport(fake))
+    agent = agent_class(router=None, cache=None, llm=llm)
+    if warm_up:
+        await agent.warm_up()
+
+    samples = []
+    for messages in conversations:
+        history, pinned = [], None
+        for _, message in messages:
+            result = await agent.achat(message, history, pinned)
+            samples.extend(ms / 1000 for ms in result["first_token_ms"] if ms is not None)
+            history = history_manager.compact(history + result["new_messages"])
+            pinned = result.get("offer_details") or pinned
+    return [summarize(f"first_call[{name}]", samples[:1]), summarize(f"first_token[{name}]", samples)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("conversations", nargs="?", default=SAMPLE, help="recorded JSONL (default: the bundled sample)")
+    parser.add_argument("--load-time", type=float, default=2.0, help="fake model load time in seconds (default 2)")
+    parser.add_argument("--prompt-rate", type=float, default=2000, help="fake prompt tokens evaluated per second (default 2000)")
+    parser.add_argument("--token-rate", type=float, default=0, help="fake tokens generated per second (0 = instant)")
+    parser.add_argument("--latency", type=float, default=0.01, help="fake per-call overhead in seconds")
+    add_output_args(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    conversations = load_conversations(args.conversations)
+    scenarios = [
+        ("unloaded", "0", False, ShoppingAgent),
+        ("cold", OLLAMA_KEEP_ALIVE, False, ShoppingAgent),
+        ("warm", OLLAMA_KEEP_ALIVE, True, ShoppingAgent),
+        ("history-first", OLLAMA_KEEP_ALIVE, True, HistoryFirstAgent),
+    ]
+    results = []
+    for name, keep_alive, warm_up, agent_class in scenarios:
+        results.extend(asyncio.run(run_scenario(name, conversations, args, keep_alive, warm_up, agent_class)))
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+"""
+Overload benchmark — a burst of /chat traffic with checkouts arriving
+during it, with admission control at the given limits vs. effectively off.
+
+    python -m benchmarks.overload_bench
+    python -m benchmarks.overload_bench --spike 400 --chat-limit 8 --chat-queue 16
+
+Each mode starts fresh servers (see e2e_bench). --spike chats are sent at
+once against a fake LLM with --parallel slots, and --checkouts sessions
+(quoted beforehand, untimed) pay while the burst is queued. Rows:
+  chat[...]       admitted chats (HTTP 200); errors = any other failure
+  rejected[...]   chats turned away with 503 + Retry-After (count only)
+  checkout[...]   checkout latency during the burst
+"""
+import time
+import asyncio
+import argparse
+
+import httpx
+
+from benchmarks.e2e_bench import servers, pay
+from benchmarks.stats import summarize, add_output_args, report
+
+UNLIMITED = {
+    "CHAT_MAX_CONCURRENCY": "100000",
+    "CHAT_QUEUE_DEPTH": "100000",
+    "CHECKOUT_MAX_CONCURRENCY": "100000",
+    "ADMISSION_MAX_CONCURRENCY": "100000",
+    "ADMISSION_QUEUE_TIMEOUT": "600",
+    "LLM_QUEUE_SIZE": "100000",
+    "LLM_QUEUE_TIMEOUT": "600",
+}
+
+
+async def burst(url: str, spike: int, checkouts: int, label: str) -> list[dict]:
+    limits = httpx.Limits(max_connections=spike + checkouts, max_keepalive_connections=spike + checkouts)
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+        for i in range(checkouts):
+            await client.post("/chat", json={"session_id": f"pay-{i}", "message": "best price for brooks ghost"})
+
+        chat_times, checkout_times, rejected, retry_after = [], [], 0, []
+        chat_errors = checkout_errors = 0
+
+        async def chat(i: int):
+            nonlocal rejected, chat_errors
+            t = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={"session_id": f"burst-{i}", "message": f"running shoes #{i}"})
+            except httpx.HTTPError:
+                chat_errors += 1
+                return
+            if response.status_code == 503:
+                rejected += 1
+                retry_after.append(int(response.headers.get("Retry-After", 0)))
+            elif response.status_code == 200:
+                chat_times.append(time.perf_counter() - t)
+            else:
+                chat_errors += 1
+
+        async def checkout(i: int):
+            nonlocal checkout_errors
+            await asyncio.sleep(0.2)  # land while the burst is queued
+            t = time.perf_counter()
+            try:
+                ok = await pay(client, f"pay-{i}")
+            except httpx.HTTPError:
+                ok = False
+            checkout_times.append(time.perf_counter() - t)
+            checkout_errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(chat(i) for i in range(spike)), *(checkout(i) for i in range(checkouts)))
+        elapsed = time.perf_counter() - started
+
+    rejected_row = {"name": f"rejected[{label}]", "count": rejected}
+    if retry_after:
+        rejected_row["retry_after_s"] = f"{min(retry_after)}-{max(retry_after)}"
+    return [
+        summarize(f"chat[{label}]", chat_times, elapsed, errors=chat_errors),
+        rejected_row,
+        summarize(f"checkout[{label}]", checkout_times, errors=checkout_errors),
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spike", type=int, default=200, help="chats sent at once (default 200)")
+    parser.add_argument("--checkouts", type=int, default=10, help="checkouts during the burst (default 10)")
+    parser.add_argument("--chat-limit", type=int, default=8, help="CHAT_MAX_CONCURRENCY for the limited run")
+    parser.add_argument("--chat-queue", type=int, default=16, help="CHAT_QUEUE_DEPTH for the limited run")
+    parser.add_argument("--ollama-latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--parallel", type=int, default=4, help="fake LLM concurrent generations")
+    parser.add_argument("--verbose", action="store_true", help="show server logs")
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    base = {"FAKE_OLLAMA_PARALLEL": str(args.parallel), "LLM_MAX_OUTSTANDING": str(args.parallel)}
+    limited = {**base, "CHAT_MAX_CONCURRENCY": str(args.chat_limit), "CHAT_QUEUE_DEPTH": str(args.chat_queue)}
+    results = []
+    for label, env in (("limited", limited), ("unlimited", {**base, **UNLIMITED})):
+        with servers(args.ollama_latency, 0.05, args.verbose, env) as (url, _):
+            results.extend(asyncio.run(burst(url, args.spike, args.checkouts, label)))
+    for r in results:
+        if "retry_after_s" in r:
+            print(f"{r['name']}: {r['count']} rejected, Retry-After {r['retry_after_s']}s")
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
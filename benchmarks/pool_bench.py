@@ -0,0 +1,110 @@
+"""
+LLM pool benchmark — BackendPool behaviour against in-process fake Ollama
+hosts (no sockets), driven through LLMClient.astream.
+
+    python -m benchmarks.pool_bench
+    python -m benchmarks.pool_bench --latency 0.2 --chatty 80
+
+Scenarios:
+  spread       3 hosts, 12 sessions: calls per host should come out even
+  fair / fifo  1 host; one session queues --chatty calls at once, then 8
+               other sessions send one each. quiet[...] is their latency,
+               with per-session round-robin vs. first-come first-served
+  dead-host    3 hosts, one refusing connections: calls are retried on
+               the others and the dead one is taken out of rotation
+"""
+import time
+import asyncio
+import argparse
+import logging
+
+import httpx
+
+from fake_ollama import FakeOllama, FakeOllamaTransport
+from llm_client import LLMClient
+from llm_pool import Backend, BackendPool
+from benchmarks.stats import summarize, add_output_args, report
+
+MESSAGES = [{"role": "user", "content": "running shoes"}]
+
+
+class RefusingTransport(httpx.AsyncBaseTransport):
+    """A host that is down."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+
+def fake_backend(name: str, latency: float, slots: int) -> Backend:
+    return Backend(f"http://{name}", FakeOllamaTransport(FakeOllama(latency=latency, parallel=slots)))
+
+
+async def call(llm: LLMClient, session: str) -> tuple[float, bool]:
+    started = time.perf_counter()
+    try:
+        async for _ in llm.astream(MESSAGES, session_id=session):
+            pass
+    except Exception:
+        return time.perf_counter() - started, False
+    return time.perf_counter() - started, True
+
+
+async def spread(args) -> list[dict]:
+    pool = BackendPool([fake_backend(f"host{i}", args.latency, 2) for i in range(3)], max_outstanding=2)
+    llm = LLMClient(pool=pool)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(call(llm, f"s{i % 12}") for i in range(args.calls)))
+    elapsed = time.perf_counter() - started
+    calls = "/".join(str(b["calls"]) for b in pool.stats()["backends"])
+    return [summarize("spread", [t for t, _ in results], elapsed, errors=sum(not ok for _, ok in results), calls=calls)]
+
+
+async def fairness(args, fair: bool) -> list[dict]:
+    pool = BackendPool([fake_backend("host0", args.latency, 2)], max_outstanding=2, queue_size=1000, fair=fair)
+    llm = LLMClient(pool=pool)
+    chatty = [asyncio.create_task(call(llm, "chatty")) for _ in range(args.chatty)]
+    await asyncio.sleep(0.01)  # the chatty session's calls are queued first
+    quiet = await asyncio.gather(*(call(llm, f"quiet{i}") for i in range(8)))
+    chatty = await asyncio.gather(*chatty)
+    label = "fair" if fair else "fifo"
+    return [
+        summarize(f"quiet[{label}]", [t for t, _ in quiet], errors=sum(not ok for _, ok in quiet)),
+        summarize(f"chatty[{label}]", [t for t, _ in chatty], errors=sum(not ok for _, ok in chatty)),
+    ]
+
+
+async def dead_host(args) -> list[dict]:
+    backends = [fake_backend(f"host{i}", args.latency, 2) for i in range(2)] + [Backend("http://dead", RefusingTransport())]
+    pool = BackendPool(backends, max_outstanding=2, failure_threshold=3, cooldown=60)
+    llm = LLMClient(pool=pool)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(call(llm, f"s{i % 12}") for i in range(args.calls)))
+    elapsed = time.perf_counter() - started
+    dead = pool.stats()["backends"][-1]
+    return [summarize(
+        "dead-host", [t for t, _ in results], elapsed,
+        errors=sum(not ok for _, ok in results), calls=f"{dead['calls']} to dead host, up={dead['up']}",
+    )]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="fake seconds per call (default 0.1)")
+    parser.add_argument("--calls", type=int, default=60, help="calls in the spread and dead-host runs (default 60)")
+    parser.add_argument("--chatty", type=int, default=40, help="calls the chatty session queues at once (default 40)")
+    add_output_args(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    results = asyncio.run(spread(args))
+    results += asyncio.run(fairness(args, fair=True))
+    results += asyncio.run(fairness(args, fair=False))
+    results += asyncio.run(dead_host(args))
+    for r in results:
+        if "calls" in r:
+            print(f"{r['name']}: calls per host {r['calls']}")
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+"""
+Prompt-size benchmark — estimated prompt tokens per LLM call on recorded
+sessions, with full JSON tool results vs. the compact model-facing encoding.
+
+    python -m benchmarks.prompt_tokens                      # bundled sample
+    python -m benchmarks.prompt_tokens recorded.jsonl
+
+Sessions are played in-process against the fake Ollama script with the
+intent router and response cache off, so every message reaches the
+"model". History is carried across turns exactly like main.py does
+(history_manager.compact + pinned offer), so later turns pay for earlier
+tool results too. Tool schemas are not counted (they are the same size
+in both modes).
+"""
+import argparse
+import logging
+
+from agent import ShoppingAgent
+from history_manager import history_manager
+from benchmarks.replay import SAMPLE, load_conversations
+
+
+def measure(conversations: list, compact: bool) -> dict:
+    agent = ShoppingAgent(router=None, cache=None, backend="fake", compact_results=compact)
+    calls = []
+    for messages in conversations:
+        history, pinned = [], None
+        for _, message in messages:
+            result = agent.chat(message, history, pinned)
+            calls.extend(result["prompt_tokens"])
+            history = history_manager.compact(history + result["new_messages"])
+            pinned = result.get("offer_details") or pinned
+    return {
+        "encoding": "compact" if compact else "json",
+        "llm_calls": len(calls),
+        "prompt_tokens": sum(calls),
+        "mean": round(sum(calls) / len(calls), 1) if calls else 0,
+        "max": max(calls, default=0),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("conversations", nargs="?", default=SAMPLE, help="recorded JSONL (default: the bundled sample)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    conversations = load_conversations(args.conversations)
+    before, after = measure(conversations, compact=False), measure(conversations, compact=True)
+    print(f"{'encoding':<10} {'llm_calls':>9} {'prompt_tokens':>13} {'mean':>8} {'max':>6}")
+    for row in (before, after):
+        print(f"{row['encoding']:<10} {row['llm_calls']:>9} {row['prompt_tokens']:>13} {row['mean']:>8} {row['max']:>6}")
+    if before["prompt_tokens"]:
+        saved = 1 - after["prompt_tokens"] / before["prompt_tokens"]
+        print(f"compact encoding saves {saved:.0%} of prompt tokens over {len(conversations)} sessions")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
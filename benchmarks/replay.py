@@ -0,0 +1,148 @@
+"""
+Replay load generator — plays recorded conversations against /chat.
+
+Conversations are JSONL lines {"ts", "session_id", "message"}, as written
+by the app with CHAT_RECORD_PATH set; benchmarks/conversations.jsonl is a
+small sample. Each virtual user takes a conversation, gives it a fresh
+session id and sends its messages in order, waiting for every reply. The
+run is repeated for each --concurrency level, so the table shows where
+throughput stops growing and latency starts queueing (slowdown = p50
+relative to the first level).
+
+    python -m benchmarks.replay                                   # spawn fake Ollama + app
+    python -m benchmarks.replay --concurrency 1,16,64 --token-rate 30 --parallel 4
+    python -m benchmarks.replay --concurrency 16,64 --token-rate 30 --parallel 4 --backends 3
+    python -m benchmarks.replay recorded.jsonl --url http://127.0.0.1:8001
+
+Without --url the fake Ollama server, WorldPay mock and app are started
+locally (see e2e_bench). --llm-only disables the intent router and
+response cache there, so every message reaches the (fake) model.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Optional
+
+import httpx
+
+from benchmarks.stats import summarize, add_output_args, report
+from benchmarks.e2e_bench import servers
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversations.jsonl")
+
+
+def load_conversations(path: str) -> list[list[tuple[float, str]]]:
+    """Recorded messages grouped by session, in recorded order: [[(ts, message), ...], ...]."""
+    sessions: OrderedDict[str, list] = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                sessions.setdefault(record["session_id"], []).append((record.get("ts", 0.0), record["message"]))
+    return [sorted(messages, key=lambda m: m[0]) for messages in sessions.values()]
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    conversations: list,
+    concurrency: int,
+    sessions: int,
+    speed: Optional[float],
+    label: str,
+) -> tuple[list[float], float, int]:
+    """
+    Play `sessions` conversations (cycling through the recording) with
+    `concurrency` users. With `speed`, the recorded gaps between a
+    session's messages are kept, divided by `speed`; otherwise users send
+    the next message as soon as the reply arrives.
+    """
+    samples: list[float] = []
+    errors = 0
+    queue = iter(range(sessions))
+
+    async def user():
+        nonlocal errors
+        for n in queue:
+            messages = conversations[n % len(conversations)]
+            session_id = f"replay-{label}-{n}"
+            for i, (ts, message) in enumerate(messages):
+                if speed and i:
+                    await asyncio.sleep(max(ts - messages[i - 1][0], 0) / speed)
+                t = time.perf_counter()
+                try:
+                    response = await client.post("/chat", json={"session_id": session_id, "message": message})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                samples.append(time.perf_counter() - t)
+                errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started, errors
+
+
+async def run(url: str, conversations: list, levels: list[int], sessions: Optional[int], speed: Optional[float]) -> list[dict]:
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    results = []
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=limits) as client:
+        await client.post("/chat", json={"session_id": "replay-warmup", "message": conversations[0][0][1]})
+        for level in levels:
+            samples, elapsed, errors = await replay(
+                client, conversations, level, sessions or max(level * 2, len(conversations)), speed, f"c{level}"
+            )
+            result = summarize(f"replay[c={level}]", samples, elapsed, errors=errors)
+            if results and results[0]["p50_ms"]:
+                result["slowdown"] = round(result["p50_ms"] / results[0]["p50_ms"], 2)
+            results.append(result)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("conversations", nargs="?", default=SAMPLE, help="recorded JSONL (default: the bundled sample)")
+    parser.add_argument("--url", help="replay against a running app instead of spawning one")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrent users per run (default 1,8,32)")
+    parser.add_argument("--sessions", type=int, help="conversations per run (default: 2x concurrency)")
+    parser.add_argument("--speed", type=float, help="keep recorded think time, divided by this factor")
+    parser.add_argument("--llm-only", action="store_true", help="disable the intent router and response cache (spawned app only)")
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="fake LLM overhead per call in seconds")
+    parser.add_argument("--token-rate", type=float, default=0, help="fake LLM tokens/second (0 = instant)")
+    parser.add_argument("--prompt-rate", type=float, default=0, help="fake LLM prompt tokens/second (0 = instant)")
+    parser.add_argument("--parallel", type=int, default=0, help="fake LLM concurrent generations (0 = unlimited)")
+    parser.add_argument("--backends", type=int, default=1, help="fake LLM servers behind the app's backend pool (default 1)")
+    parser.add_argument("--verbose", action="store_true", help="show server logs")
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.conversations)
+    if not conversations:
+        parser.error(f"no conversations in {args.conversations}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    extra_env = {
+        "FAKE_OLLAMA_TOKEN_RATE": str(args.token_rate),
+        "FAKE_OLLAMA_PROMPT_RATE": str(args.prompt_rate),
+        "FAKE_OLLAMA_PARALLEL": str(args.parallel),
+    }
+    if args.parallel:
+        # One pool slot per fake generation slot, so calls queue (fairly) in the app
+        extra_env["LLM_MAX_OUTSTANDING"] = str(args.parallel)
+    if args.llm_only:
+        extra_env.update({"INTENT_ROUTER_ENABLED": "false", "RESPONSE_CACHE_SIZE": "0"})
+    spawn = nullcontext((args.url, None)) if args.url else servers(args.ollama_latency, 0.05, args.verbose, extra_env, args.backends)
+
+    with spawn as (url, _):
+        results = asyncio.run(run(url, conversations, levels, args.sessions, args.speed))
+    for r in results:
+        if r["errors"]:
+            print(f"warning: {r['errors']} failed requests in {r['name']}")
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+"""
+Shared helpers: percentile summaries, memory readings, result tables and
+baseline comparison.
+"""
+import json
+import math
+import resource
+import sys
+from typing import Optional
+
+
+def percentile(sorted_samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(name: str, samples: list[float], elapsed: Optional[float] = None, **extra) -> dict:
+    """Latency summary in milliseconds; `elapsed` (seconds) adds throughput."""
+    ordered = sorted(samples)
+    result = {
+        "name": name,
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+    if elapsed:
+        result["rps"] = round(len(ordered) / elapsed, 1)
+    result.update(extra)
+    return result
+
+
+def rss_mb(pid: Optional[int] = None) -> float:
+    """Current resident set size of `pid` (default: this process) on Linux, else our getrusage peak."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * resource.getpagesize() / 2**20, 1)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes elsewhere
+        return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def print_table(results: list[dict]) -> None:
+    columns = ["name", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rps", "slowdown", "errors", "rss_mb"]
+    columns = [c for c in columns if any(c in r for r in results)]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in results:
+        print("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+def save(results: list[dict], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def regressions(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    """Names whose p95 is more than `tolerance` (fraction) slower than in the baseline file.
+
+    Single-shot timings shorter than 100ms (e.g. a small index build) are too
+    noisy to gate on and are skipped.
+    """
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)}
+    failures = []
+    for r in results:
+        before = baseline.get(r["name"])
+        if r["count"] == 1 and r["p95_ms"] < 100:
+            continue
+        if before and before["p95_ms"] > 0 and r["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            failures.append(f"{r['name']}: p95 {before['p95_ms']}ms → {r['p95_ms']}ms")
+    return failures
+
+
+def add_output_args(parser) -> None:
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare p95s against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown vs baseline (default 0.25)")
+
+
+def report(results: list[dict], args) -> int:
+    """Print, save and compare results; returns the process exit code."""
+    print_table(results)
+    if args.json:
+        save(results, args.json)
+    if args.baseline:
+        failures = regressions(results, args.baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        return 1 if failures else 0
+    return 0
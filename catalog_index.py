@@ -0,0 +1,246 @@
+"""
+Catalog Index — in-memory search structures for CatalogService.
+
+Precomputes each product's searchable text once and keeps:
+  - a token-level inverted index (token → product ids)
+  - a sorted suffix table over the token vocabulary, so a query word is
+    resolved by prefix lookup to every token that contains it (the same
+    substring semantics as the original `word in searchable` scan)
+  - category, price and shoe-size side-indexes for filtering without a
+    full scan
+
+All structures are updated incrementally by add() / remove().
+
+save() / load() persist a built index next to the catalog so workers can
+start without re-tokenising every product: the file is memory-mapped and
+unpickled straight from the mapping.
+"""
+import os
+import mmap
+import pickle
+import logging
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import count
+from typing import Optional
+from models import Product
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"CATIDX1\n"
+
+
+def searchable_text(product: Product) -> str:
+    """The lowercased text a product is matched against."""
+    return (
+        product.name + " " + product.brand + " " + product.category + " " + " ".join(product.tags)
+    ).lower()
+
+
+class CatalogIndex:
+    _WORD_CACHE_SIZE = 4096
+
+    def __init__(self, products=()):
+        self._seq = count()
+        self._order: dict[str, int] = {}              # product id → insertion rank (tie-break)
+        self._tokens: Optional[dict[str, set[str]]] = {}  # product id → its tokens (None until needed after load())
+        self._postings: dict[str, set[str]] = defaultdict(set)
+        self._suffixes: list[tuple[str, str]] = []    # sorted (suffix, token)
+        self._by_category: dict[str, set[str]] = defaultdict(set)
+        self._by_size: dict[str, set[str]] = defaultdict(set)  # shoes only
+        self._price_keys: list[float] = []
+        self._price_ids: list[str] = []
+        self._prices: dict[str, float] = {}
+        self._word_cache: dict[str, frozenset] = {}
+
+        self._bulk_load(products)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._order
+
+    # ── Persistence ─────────────────────────────────────────────────────────
+
+    # _tokens is left out: it is only needed by remove() and is the slowest part to unpickle
+    _STATE = ("_order", "_postings", "_suffixes", "_by_category", "_by_size", "_price_keys", "_price_ids", "_prices")
+
+    def save(self, path: str, fingerprint: str) -> None:
+        """Write the index for the catalog identified by `fingerprint` (atomic replace)."""
+        state = {name: getattr(self, name) for name in self._STATE}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_MAGIC + fingerprint.encode() + b"\n")
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str) -> Optional["CatalogIndex"]:
+        """The index saved for `fingerprint`, or None if the file is missing, stale or unreadable."""
+        header = _MAGIC + fingerprint.encode() + b"\n"
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[:len(header)] != header:
+                    return None
+                with memoryview(mm) as view:
+                    state = pickle.loads(view[len(header):])
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Ignoring unreadable catalog index {path}: {e}")
+            return None
+
+        index = cls()
+        for name in cls._STATE:
+            setattr(index, name, state[name])
+        index._tokens = None
+        index._seq = count(max(index._order.values(), default=-1) + 1)
+        return index
+
+    # ── Maintenance ─────────────────────────────────────────────────────────
+
+    def _bulk_load(self, products) -> None:
+        """Initial build: fill the maps, then sort the ordered structures once instead of per insert."""
+        for product in products:
+            pid = product.id
+            self._order[pid] = next(self._seq)
+            tokens = set(searchable_text(product).split())
+            self._tokens[pid] = tokens
+            for token in tokens:
+                self._postings[token].add(pid)
+
+            self._by_category[product.category].add(pid)
+            if product.category == "shoes":
+                for size in product.available_sizes:
+                    self._by_size[size].add(pid)
+            self._prices[pid] = product.base_price
+
+        self._suffixes = sorted((token[i:], token) for token in self._postings for i in range(len(token)))
+        # Stable sort keeps insertion order among equal prices, same as add()'s bisect_right
+        by_price = sorted(self._prices.items(), key=lambda item: item[1])
+        self._price_keys = [price for _, price in by_price]
+        self._price_ids = [pid for pid, _ in by_price]
+
+    def add(self, product: Product) -> None:
+        """Index a product, replacing any previous entry with the same id."""
+        pid = product.id
+        rank = self._order.get(pid)
+        if rank is not None:
+            self.remove(pid)
+
+        self._order[pid] = rank if rank is not None else next(self._seq)
+        tokens = set(searchable_text(product).split())
+        self._token_map()[pid] = tokens
+        for token in tokens:
+            if not self._postings[token]:
+                for i in range(len(token)):
+                    insort(self._suffixes, (token[i:], token))
+            self._postings[token].add(pid)
+
+        self._by_category[product.category].add(pid)
+        if product.category == "shoes":
+            for size in product.available_sizes:
+                self._by_size[size].add(pid)
+
+        price = product.base_price
+        i = bisect_right(self._price_keys, price)
+        self._price_keys.insert(i, price)
+        self._price_ids.insert(i, pid)
+        self._prices[pid] = price
+
+        self._word_cache.clear()
+
+    def remove(self, product_id: str) -> None:
+        if product_id not in self._order:
+            return
+
+        del self._order[product_id]
+        for token in self._token_map().pop(product_id, ()):
+            postings = self._postings[token]
+            postings.discard(product_id)
+            if not postings:
+                del self._postings[token]
+                for i in range(len(token)):
+                    j = bisect_left(self._suffixes, (token[i:], token))
+                    del self._suffixes[j]
+
+        for ids in self._by_category.values():
+            ids.discard(product_id)
+        for ids in self._by_size.values():
+            ids.discard(product_id)
+
+        price = self._prices.pop(product_id)
+        lo = bisect_left(self._price_keys, price)
+        hi = bisect_right(self._price_keys, price)
+        j = self._price_ids.index(product_id, lo, hi)
+        del self._price_keys[j]
+        del self._price_ids[j]
+
+        self._word_cache.clear()
+
+    def _token_map(self) -> dict[str, set[str]]:
+        if self._tokens is None:
+            # Invert the postings once, on the first add/remove after load()
+            tokens: dict[str, set[str]] = defaultdict(set)
+            for token, ids in self._postings.items():
+                for pid in ids:
+                    tokens[pid].add(token)
+            self._tokens = dict(tokens)
+        return self._tokens
+
+    # ── Lookup ──────────────────────────────────────────────────────────────
+
+    def match_word(self, word: str) -> frozenset:
+        """Ids of products whose searchable text contains `word`."""
+        cached = self._word_cache.get(word)
+        if cached is not None:
+            return cached
+
+        ids = set()
+        i = bisect_left(self._suffixes, (word,))
+        seen = set()
+        while i < len(self._suffixes) and self._suffixes[i][0].startswith(word):
+            token = self._suffixes[i][1]
+            if token not in seen:
+                seen.add(token)
+                ids |= self._postings[token]
+            i += 1
+
+        result = frozenset(ids)
+        if len(self._word_cache) >= self._WORD_CACHE_SIZE:
+            self._word_cache.clear()
+        self._word_cache[word] = result
+        return result
+
+    def candidates(self, category: Optional[str] = None, max_price: Optional[float] = None) -> Optional[set]:
+        """Ids passing the category/price filters, or None when unfiltered."""
+        allowed = None
+        if category:
+            allowed = set(self._by_category.get(category.lower(), ()))
+        if max_price is not None:
+            within = set(self._price_ids[:bisect_right(self._price_keys, max_price)])
+            allowed = within if allowed is None else allowed & within
+        return allowed
+
+    def size_mismatches(self, size: Optional[str]) -> set:
+        """Ids of shoes not offered in `size` (other categories never mismatch)."""
+        if not size:
+            return set()
+        return self._by_category.get("shoes", set()) - self._by_size.get(size, set())
+
+    def score(self, query: str, allowed: Optional[set] = None, excluded: Optional[set] = None) -> dict[str, int]:
+        """Per-product count of query words found in its searchable text."""
+        scores: dict[str, int] = defaultdict(int)
+        for word in query.lower().split():
+            for pid in self.match_word(word):
+                if allowed is not None and pid not in allowed:
+                    continue
+                if excluded and pid in excluded:
+                    continue
+                scores[pid] += 1
+        return scores
+
+    def rank(self, product_id: str) -> int:
+        """Insertion rank, used to break score ties in catalog order."""
+        return self._order[product_id]
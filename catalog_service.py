@@ -1,9 +1,24 @@
 """
 Product Catalog Service — agentic backend for the AI Shopping Chatbot.
 Provides a structured catalog of shoes and books with vendor pricing.
+
+CATALOG below is the default in-memory dataset; set CATALOG_BACKEND=sqlite
+to serve from a shared database instead (see catalog_store.py).
 """
-import random
+import os
+import time
+import heapq
+import logging
+import threading
 from typing import Optional
+from catalog_index import CatalogIndex
+from catalog_store import CatalogStore, store_from_env
+from models import Offer, Product
+from offer_cache import OfferCache
+from vendor_adapters import VendorGateway
+from semantic_index import SEMANTIC_WEIGHT, HashingEmbedder, SemanticIndex, embedder_from_env, load_numpy
+
+logger = logging.getLogger(__name__)
 
 CATALOG = {
     # ──────────────── SHOES ────────────────
@@ -255,6 +270,8 @@ CATALOG = {
     },
 }
 
+DEFAULT_SEARCH_RESULTS_LIMIT = int(os.getenv("DEFAULT_SEARCH_RESULTS_LIMIT", "6"))
+
 VENDORS = {
     "shoes": ["Amazon", "Zappos", "Road Runner Sports", "Dick's Sporting Goods", "Running Warehouse"],
     "books": ["Amazon", "Barnes & Noble", "ThriftBooks", "Book Depository", "eBay Books"],
@@ -262,97 +279,214 @@ VENDORS = {
 
 
 class CatalogService:
-    def search(self, query: str, category: Optional[str] = None, size: Optional[str] = None, max_price: Optional[float] = None) -> list[dict]:
-        """Full-text + category-aware product search with optional price filtering."""
-        query_lower = query.lower()
-        results = []
-
-        for product in CATALOG.values():
-            # Category filter
-            if category and product["category"] != category.lower():
-                continue
-            
-            # Price filter
-            if max_price is not None:
+    def __init__(self, store: Optional[CatalogStore] = None, semantic: Optional[bool] = None):
+        self._store = store
+        self._index: Optional[CatalogIndex] = None
+        # semantic=None follows SEMANTIC_SEARCH; True/False force it on/off
+        if semantic is None:
+            self._embedder = embedder_from_env()
+        else:
+            self._embedder = (embedder_from_env() or HashingEmbedder()) if semantic and load_numpy() else None
+        self._semantic: Optional[SemanticIndex] = None
+        self._semantic_version = None
+        self._semantic_refresh: Optional[threading.Thread] = None
+        self._semantic_lock = threading.Lock()
+        self.version = 0  # bumped whenever catalog contents change
+        self.offer_cache = OfferCache()
+        self.vendors = VendorGateway(VENDORS)
+
+    @property
+    def store(self) -> CatalogStore:
+        """Active storage backend, chosen from CATALOG_BACKEND on first use."""
+        if self._store is None:
+            self._store = store_from_env(CATALOG)
+        elif self._store.changed():
+            # Backing file was swapped underneath us — rebuild the index lazily
+            self._index = None
+            self.version += 1
+        return self._store
+
+    def set_store(self, store: CatalogStore) -> None:
+        """Hot-swap the catalog backend; the search index is rebuilt on next use."""
+        self._store = store
+        self._index = None
+        self.version += 1
+
+    @property
+    def index(self) -> CatalogIndex:
+        """Search index over the active store, built on first use."""
+        store = self.store
+        if self._index is None:
+            self._index = self._load_index(store)
+        return self._index
+
+    def _load_index(self, store: CatalogStore) -> CatalogIndex:
+        """Reuse the index saved for this exact catalog if there is one; else build it (and save it)."""
+        started = time.perf_counter()
+        fingerprint = store.fingerprint() if store.index_path else None
+        if fingerprint:
+            index = CatalogIndex.load(store.index_path, fingerprint)
+            if index is not None:
+                logger.info(f"Loaded catalog index ({len(index)} products) from {store.index_path} in {(time.perf_counter() - started) * 1000:.0f}ms")
+                return index
+
+        index = CatalogIndex(store.products())
+        logger.info(f"Built catalog index ({len(index)} products) in {(time.perf_counter() - started) * 1000:.0f}ms")
+        if fingerprint:
+            try:
+                index.save(store.index_path, fingerprint)
+            except OSError as e:
+                logger.warning(f"Could not save catalog index to {store.index_path}: {e}")
+        return index
+
+    def search(self, query: str, category: Optional[str] = None, size: Optional[str] = None, max_price: Optional[float] = None, limit: int = DEFAULT_SEARCH_RESULTS_LIMIT) -> list[Product]:
+        """Full-text + category-aware product search with optional price/size filtering."""
+        if max_price is not None:
+            try:
+                max_price = float(max_price)
+            except (ValueError, TypeError):
+                max_price = None
+
+        index = self.index
+        allowed = index.candidates(category=category, max_price=max_price)
+        excluded = index.size_mismatches(size)
+        scores = index.score(query, allowed, excluded)
+
+        semantic = self.semantic_index
+        if semantic is not None:
+            scores = self._blend(semantic, index, query, scores, allowed, excluded, limit)
+
+        # Only the top `limit` ids are ordered and materialised
+        top = heapq.nsmallest(limit, scores, key=lambda pid: (-scores[pid], index.rank(pid)))
+        store = self.store
+        return [store.get(pid) for pid in top]
+
+    @property
+    def semantic_index(self) -> Optional[SemanticIndex]:
+        """Embedding index over the active store (None when semantic search is off)."""
+        if self._embedder is None:
+            return None
+        store = self.store
+        if self._semantic is None:
+            self._semantic = SemanticIndex.load_or_build(store.products(), self._embedder)
+            self._semantic_version = self.version
+        elif self._semantic_version != self.version:
+            self._refresh_semantic(store)
+        return self._semantic
+
+    def _refresh_semantic(self, store: CatalogStore) -> None:
+        """
+        Bring the embeddings up to date with the catalog in a background
+        thread (only changed products are embedded); searches keep using the
+        current matrix until the new one is swapped in.
+        """
+        with self._semantic_lock:
+            if self._semantic_refresh is not None:
+                return
+            version, previous = self.version, self._semantic
+
+            def refresh():
                 try:
-                    m_price = float(max_price)
-                    if product["base_price"] > m_price:
-                        continue
-                except (ValueError, TypeError):
-                    pass
-
-            # Relevance scoring
-            score = 0
-            searchable = (
-                product["name"] + " " + product["brand"] + " " + product["category"] + " " + " ".join(product.get("tags", []))
-            ).lower()
-
-            for word in query_lower.split():
-                if word in searchable:
-                    score += 1
-
-            if score == 0:
+                    index = SemanticIndex.load_or_build(store.products(), self._embedder, previous=previous)
+                    # A product added meanwhile is picked up by the next refresh
+                    self._semantic, self._semantic_version = index, version
+                except Exception as e:
+                    logger.warning(f"Semantic index refresh failed; keeping the previous one: {e}")
+                    self._semantic_version = version
+                finally:
+                    self._semantic_refresh = None
+
+            self._semantic_refresh = threading.Thread(target=refresh, name="semantic-refresh", daemon=True)
+            self._semantic_refresh.start()
+
+    def _blend(self, semantic: SemanticIndex, index: CatalogIndex, query: str, scores: dict, allowed, excluded, limit: int) -> dict:
+        """Keyword score + weighted cosine similarity; adds close semantic matches the keywords missed."""
+        sims = semantic.similarities(query)
+        blended = {}
+        for pid, score in scores.items():
+            row = semantic.rows.get(pid)
+            blended[pid] = score + (SEMANTIC_WEIGHT * max(float(sims[row]), 0.0) if row is not None else 0.0)
+
+        for pid in semantic.top_k(sims, max(limit * 10, 50)):
+            # pid not in index: a product removed since the matrix was built
+            if pid in blended or pid not in index or (allowed is not None and pid not in allowed) or pid in excluded:
                 continue
+            blended[pid] = SEMANTIC_WEIGHT * float(sims[semantic.rows[pid]])
+        return blended
 
-            results.append({**product, "_score": score})
+    def add_product(self, product) -> None:
+        """Add or replace a catalog product (Product or dict) and update the search index."""
+        if not isinstance(product, Product):
+            product = Product.from_dict(product)
+        self.store.put(product)
+        if self._index is not None:
+            self._index.add(product)
+        self._update_semantic(lambda semantic: semantic.with_product(product))
 
-        results.sort(key=lambda x: x["_score"], reverse=True)
+    def _update_semantic(self, update) -> None:
+        """Bump the catalog version, patching the embedding matrix in place of a rebuild when it's current."""
+        current = self._semantic is not None and self._semantic_version == self.version
+        self.version += 1
+        if current:
+            try:
+                self._semantic = update(self._semantic)
+                self._semantic_version = self.version
+            except Exception as e:
+                logger.warning(f"Could not update the semantic index in place; it will be refreshed: {e}")
 
-        # Apply size filter for shoes after ranking
-        filtered = []
-        for r in results:
-            if size and r["category"] == "shoes":
-                if size not in r.get("available_sizes", []):
-                    continue
-            filtered.append(r)
+    def remove_product(self, product_id: str) -> None:
+        self.store.delete(product_id)
+        if self._index is not None:
+            self._index.remove(product_id)
+        self._update_semantic(lambda semantic: semantic.without(product_id))
 
-        return filtered[:6]  # Return top 6
+    def get_vendor_prices(self, product_id: str, width: Optional[str] = None, quantity: int = 1) -> list[Offer]:
+        """Vendor offers for a product, served from the offer cache while fresh."""
+        key = (self.version, product_id, width, quantity)
+        return self.offer_cache.get_or_price(key, lambda: self._price_offers(product_id, width, quantity))
 
-    def get_vendor_prices(self, product_id: str, width: Optional[str] = None, quantity: int = 1) -> list[dict]:
-        """Get simulated prices from multiple vendors for a given product."""
-        product = CATALOG.get(product_id)
+    def get_vendor_prices_bulk(self, items: list[tuple[str, int]], width: Optional[str] = None) -> list[list[Offer]]:
+        """
+        get_vendor_prices() for many (product_id, quantity) pairs, aligned with
+        `items`. Cached entries are reused; every miss is priced in one batch.
+        """
+        keys = [(self.version, product_id, width, quantity) for product_id, quantity in items]
+        results = [self.offer_cache.get(key) for key in keys]
+
+        missing: dict[tuple, tuple[Product, int]] = {}
+        for key, offers in zip(keys, results):
+            if offers is None and key not in missing:
+                product = self.store.get(key[1])
+                if product:
+                    missing[key] = (product, key[3])
+
+        priced = {}
+        if missing:
+            for key, offers in zip(missing, self.vendors.quote_many(list(missing.values()), width)):
+                priced[key] = self.offer_cache.put(key, sorted(offers, key=lambda x: x.unit_final_price))
+        return [offers if offers is not None else priced.get(key, []) for key, offers in zip(keys, results)]
+
+    def get_offer(self, offer_id: str) -> Optional[Offer]:
+        """Resolve a previously quoted offer by id (None once its snapshot expires)."""
+        return self.offer_cache.snapshot(offer_id)
+
+    def _price_offers(self, product_id: str, width: Optional[str], quantity: int) -> list[Offer]:
+        """Quote all vendors for a product in parallel; slow vendors are left out."""
+        product = self.store.get(product_id)
         if not product:
             return []
 
-        base = product["base_price"]
-        vendor_list = VENDORS.get(product["category"], VENDORS["books"])
-        offers = []
-
-        for vendor in vendor_list:
-            price = round(base + random.uniform(-base * 0.12, base * 0.12), 2)
-            discount = 0
-            if random.random() > 0.6:
-                discount = round(price * random.uniform(0.05, 0.18), 2)
-
-            unit_final_price = round(price - discount, 2)
-            total_price = round(unit_final_price * quantity, 2)
-
-            offers.append({
-                "vendor": vendor,
-                "product_id": product_id,
-                "product_name": product["name"],
-                "category": product["category"],
-                "size": None,  # Will be filled in by agent
-                "width": width,
-                "quantity": quantity,
-                "unit_price": price,
-                "unit_discount": discount,
-                "unit_final_price": unit_final_price,
-                "price": price, # Backwards compatibility for UI
-                "discount": discount, # Backwards compatibility for UI
-                "final_price": unit_final_price, # Backwards compatibility for unit price display
-                "total_price": total_price,
-                "in_stock": True,
-                "image_url": product["image_url"],
-            })
-
-        return sorted(offers, key=lambda x: x["unit_final_price"])
-
-    def get_product(self, product_id: str) -> Optional[dict]:
-        return CATALOG.get(product_id)
+        offers = self.vendors.quote_all(product, quantity=quantity, width=width)
+        return sorted(offers, key=lambda x: x.unit_final_price)
+
+    def get_product(self, product_id: str) -> Optional[Product]:
+        return self.store.get(product_id)
+
+    def get_all_products(self) -> list[Product]:
+        return list(self.store.products())
 
     def get_all_categories(self) -> list[str]:
-        return list(set(p["category"] for p in CATALOG.values()))
+        return list(set(p.category for p in self.store.products()))
 
 
 catalog_service = CatalogService()
@@ -0,0 +1,249 @@
+"""
+Catalog Storage — pluggable product storage backends for CatalogService.
+
+  - MemoryCatalogStore: holds Product records built from a plain dict
+    (the built-in CATALOG by default)
+  - SQLiteCatalogStore: products in a SQLite file, opened lazily and
+    read-only, so several uvicorn workers can share one copy on disk.
+    Replacing the file (e.g. `os.replace(new_db, path)`) is picked up on
+    the next access without a restart.
+
+Build a database (and its precomputed search index, CATALOG_INDEX_PATH)
+from the built-in catalog with:
+    python catalog_store.py catalog.db
+"""
+import os
+import json
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+from models import Product
+
+logger = logging.getLogger(__name__)
+
+CATALOG_BACKEND = os.getenv("CATALOG_BACKEND", "memory")
+CATALOG_DB_PATH = os.getenv("CATALOG_DB_PATH", "catalog.db")
+# Saved CatalogIndex for the SQLite catalog (default: "<db path>.index"; "off" disables)
+CATALOG_INDEX_PATH = os.getenv("CATALOG_INDEX_PATH", "")
+
+
+class CatalogStore(ABC):
+    """Interface every catalog backend implements."""
+
+    index_path: Optional[str] = None  # where a built search index may be saved
+
+    def fingerprint(self) -> Optional[str]:
+        """Identifies the current contents, so a saved index can be reused; None if not persistable."""
+        return None
+
+    @abstractmethod
+    def get(self, product_id: str) -> Optional[Product]:
+        ...
+
+    @abstractmethod
+    def products(self) -> Iterator[Product]:
+        """All products, in catalog order."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def put(self, product: Product) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, product_id: str) -> None:
+        ...
+
+    def changed(self) -> bool:
+        """True if the underlying data was replaced since the last call."""
+        return False
+
+
+class MemoryCatalogStore(CatalogStore):
+    def __init__(self, catalog: dict):
+        self._catalog = {pid: Product.from_dict(data) for pid, data in catalog.items()}
+
+    def get(self, product_id: str) -> Optional[Product]:
+        return self._catalog.get(product_id)
+
+    def products(self) -> Iterator[Product]:
+        return iter(list(self._catalog.values()))
+
+    def __len__(self) -> int:
+        return len(self._catalog)
+
+    def put(self, product: Product) -> None:
+        self._catalog[product.id] = product
+
+    def delete(self, product_id: str) -> None:
+        self._catalog.pop(product_id, None)
+
+
+class SQLiteCatalogStore(CatalogStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            id TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            base_price REAL NOT NULL,
+            data TEXT NOT NULL
+        )
+    """
+
+    def __init__(self, path: str = CATALOG_DB_PATH, readonly: bool = True):
+        self.path = path
+        self.readonly = readonly
+        # One connection per thread (tool calls run in worker threads), each
+        # tagged with the file generation it was opened on
+        self._local = threading.local()
+        self._generation = 0
+        self._stamp = None
+        self._lock = threading.Lock()
+        if CATALOG_INDEX_PATH.lower() != "off":
+            self.index_path = CATALOG_INDEX_PATH or f"{path}.index"
+
+    @classmethod
+    def build(cls, path: str, products) -> "SQLiteCatalogStore":
+        """Write `products` (dicts or Products) to a fresh database at `path` and open it read-only."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        with conn:
+            conn.execute(cls.SCHEMA)
+            conn.executemany(
+                "INSERT INTO products (id, seq, category, base_price, data) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (p.id, seq, p.category, p.base_price, json.dumps(p.to_dict()))
+                    for seq, p in enumerate(_as_products(products))
+                ),
+            )
+        conn.close()
+        # Atomic swap so running workers never see a half-written file
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def fingerprint(self) -> Optional[str]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        # Not the inode: a copied DB with the same mtime and size can reuse the index too
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        This thread's connection, reopened once the file has been replaced.
+        Only its own thread ever closes it, so a swap can't pull a connection
+        out from under a query running elsewhere.
+        """
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = self._connect()
+            local.generation = self._generation
+        return local.conn
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(self.SCHEMA)
+        with self._lock:
+            if self._stamp is None:
+                self._stamp = self._file_stamp()
+                logger.info(f"Opened catalog database {self.path}")
+        return conn
+
+    def changed(self) -> bool:
+        if self._stamp is None:
+            return False
+        with self._lock:
+            try:
+                stamp = self._file_stamp()
+            except OSError:
+                return False
+            if stamp == self._stamp:
+                return False
+            # Each thread reopens on its next access; open connections are left alone
+            self._stamp = stamp
+            self._generation += 1
+        logger.info(f"Catalog database {self.path} replaced; reopening")
+        return True
+
+    def get(self, product_id: str) -> Optional[Product]:
+        row = self.conn.execute("SELECT data FROM products WHERE id = ?", (product_id,)).fetchone()
+        return Product.from_dict(json.loads(row[0])) if row else None
+
+    def products(self) -> Iterator[Product]:
+        rows = self.conn.execute("SELECT data FROM products ORDER BY seq").fetchall()
+        return (Product.from_dict(json.loads(row[0])) for row in rows)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def put(self, product: Product) -> None:
+        if self.readonly:
+            raise PermissionError("Catalog database is opened read-only.")
+        conn = self.conn
+        with conn:
+            row = conn.execute("SELECT seq FROM products WHERE id = ?", (product.id,)).fetchone()
+            if row:
+                seq = row[0]
+            else:
+                seq = conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM products").fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO products (id, seq, category, base_price, data) VALUES (?, ?, ?, ?, ?)",
+                (product.id, seq, product.category, product.base_price, json.dumps(product.to_dict())),
+            )
+        self._own_write()
+
+    def delete(self, product_id: str) -> None:
+        if self.readonly:
+            raise PermissionError("Catalog database is opened read-only.")
+        conn = self.conn
+        with conn:
+            conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+        self._own_write()
+
+    def _own_write(self) -> None:
+        """Re-stamp after our own commit so changed() only reports writes by someone else."""
+        with self._lock:
+            self._stamp = self._file_stamp()
+
+
+def _as_products(items) -> Iterator[Product]:
+    for item in items:
+        yield item if isinstance(item, Product) else Product.from_dict(item)
+
+
+def store_from_env(default_catalog: dict) -> CatalogStore:
+    """Pick the backend named by CATALOG_BACKEND (memory | sqlite)."""
+    if CATALOG_BACKEND == "sqlite":
+        return SQLiteCatalogStore(CATALOG_DB_PATH)
+    return MemoryCatalogStore(default_catalog)
+
+
+if __name__ == "__main__":
+    import sys
+    from catalog_service import CATALOG
+
+    from catalog_index import CatalogIndex
+
+    path = sys.argv[1] if len(sys.argv) > 1 else CATALOG_DB_PATH
+    store = SQLiteCatalogStore.build(path, CATALOG.values())
+    print(f"Wrote {len(store)} products to {path}")
+    if store.index_path:
+        CatalogIndex(store.products()).save(store.index_path, store.fingerprint())
+        print(f"Wrote search index to {store.index_path}")
@@ -0,0 +1,343 @@
+"""
+Fake Ollama — an Ollama-compatible /api/chat stand-in for offline and load runs.
+
+Answers from a script instead of a model. Each rule matches the latest
+user message and lists the steps of the turn: tool calls, then a reply.
+The step is picked by how many assistant messages already follow that
+user message, so a multi-tool plan plays out across the agent's loop.
+
+    [{"match": "price|deal", "steps": [
+        {"tool_calls": [{"name": "search_products", "arguments": {"query": "{message}"}}]},
+        {"tool_calls": [{"name": "get_best_offer", "arguments": {"product_id": "{product_id}"}}]},
+        {"content": "Found you a deal on {product_id}."}]}]
+
+Placeholders: {message} (the user message) and {product_id} (first
+product id seen in this turn's tool results).
+
+Timing model (per call):
+  FAKE_OLLAMA_LATENCY       fixed overhead in seconds before the first token
+  FAKE_OLLAMA_PROMPT_RATE   prompt tokens evaluated per second (0 = instant)
+  FAKE_OLLAMA_TOKEN_RATE    tokens generated per second when streaming (0 = instant)
+  FAKE_OLLAMA_PARALLEL      concurrent generations, like OLLAMA_NUM_PARALLEL (0 = unlimited)
+  FAKE_OLLAMA_LOAD_TIME     seconds to load the model when it isn't resident
+  FAKE_OLLAMA_SCRIPT        path to a JSON script (default: DEFAULT_SCRIPT)
+
+Like Ollama, the model stays loaded for the request's keep_alive (default
+5m) after each call, and each slot keeps its last prompt: only the part
+after the longest prefix shared with a cached prompt is evaluated.
+
+Run standalone (separate process, the most realistic for load tests):
+    FAKE_OLLAMA_TOKEN_RATE=40 python fake_ollama.py
+    OLLAMA_HOST=http://127.0.0.1:11500 python main.py
+
+or in-process with LLM_BACKEND=fake, served through FakeOllamaTransport.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_OLLAMA_LATENCY = float(os.getenv("FAKE_OLLAMA_LATENCY", "0"))
+FAKE_OLLAMA_PROMPT_RATE = float(os.getenv("FAKE_OLLAMA_PROMPT_RATE", "0"))
+FAKE_OLLAMA_TOKEN_RATE = float(os.getenv("FAKE_OLLAMA_TOKEN_RATE", "0"))
+FAKE_OLLAMA_PARALLEL = int(os.getenv("FAKE_OLLAMA_PARALLEL", "0"))
+FAKE_OLLAMA_LOAD_TIME = float(os.getenv("FAKE_OLLAMA_LOAD_TIME", "0"))
+FAKE_OLLAMA_SCRIPT = os.getenv("FAKE_OLLAMA_SCRIPT", "")
+
+DEFAULT_SCRIPT = [
+    {
+        "match": r"\b(?:best|cheapest|price|deal|offer)\b",
+        "steps": [
+            {"tool_calls": [{"name": "search_products", "arguments": {"query": "{message}"}}]},
+            {"tool_calls": [{"name": "get_best_offer", "arguments": {"product_id": "{product_id}"}}]},
+            {"content": "I found the best offer for you. Would you like to buy it?"},
+        ],
+    },
+    {
+        "match": "",
+        "steps": [
+            {"tool_calls": [{"name": "search_products", "arguments": {"query": "{message}"}}]},
+            {"content": "Here are some options from our catalog. Would you like the best price on any of them?"},
+        ],
+    },
+]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _render(body: dict) -> str:
+    """The prompt text a request evaluates: tool schemas, then messages in order."""
+    parts = [json.dumps(body.get("tools") or [])]
+    for m in body.get("messages", []):
+        tool_calls = json.dumps(m["tool_calls"]) if m.get("tool_calls") else ""
+        parts.append(f"{m.get('role')}: {m.get('content') or ''}{tool_calls}")
+    return "\n".join(parts)
+
+
+def _keep_alive_seconds(value) -> float:
+    """Ollama's keep_alive: seconds, or a duration like "30m"; negative = forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, str):
+        match = re.fullmatch(r"(-?[\d.]+)\s*([smh]?)", value.strip())
+        if not match:
+            return 300.0
+        value = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float("inf") if value < 0 else float(value)
+
+
+def _fill(value, variables: dict):
+    """Substitute {placeholders} in every string of a step."""
+    if isinstance(value, str):
+        return value.format_map(variables)
+    if isinstance(value, dict):
+        return {k: _fill(v, variables) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, variables) for v in value]
+    return value
+
+
+class FakeOllama:
+    def __init__(
+        self,
+        script: Optional[list] = None,
+        latency: float = FAKE_OLLAMA_LATENCY,
+        prompt_rate: float = FAKE_OLLAMA_PROMPT_RATE,
+        token_rate: float = FAKE_OLLAMA_TOKEN_RATE,
+        parallel: int = FAKE_OLLAMA_PARALLEL,
+        load_time: float = FAKE_OLLAMA_LOAD_TIME,
+    ):
+        self.rules = [(re.compile(rule.get("match", ""), re.I), rule["steps"]) for rule in (script or DEFAULT_SCRIPT)]
+        self.latency = latency
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.parallel = parallel
+        self._thread_slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self.load_time = load_time
+        self._state_lock = threading.Lock()
+        self._ready_at = 0.0  # when the model finished (or will finish) loading
+        self._unload_at = float("-inf")  # keep_alive expiry
+        self._prompts: deque = deque(maxlen=parallel or 4)  # last prompt per slot (its KV cache)
+
+    @classmethod
+    def from_env(cls) -> "FakeOllama":
+        if FAKE_OLLAMA_SCRIPT:
+            with open(FAKE_OLLAMA_SCRIPT) as f:
+                return cls(json.load(f))
+        return cls()
+
+    # ── Script ──────────────────────────────────────────────────────────────
+
+    def plan(self, messages: list) -> dict:
+        """The assistant message for this point of the turn."""
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        message = messages[last_user].get("content", "") if last_user >= 0 else ""
+        turn = messages[last_user + 1:]
+        step_index = sum(1 for m in turn if m.get("role") == "assistant")
+
+        steps = next((steps for pattern, steps in self.rules if pattern.search(message)), None)
+        if not steps:
+            return {"role": "assistant", "content": "How can I help you shop today?"}
+        step = steps[min(step_index, len(steps) - 1)]
+        if step_index >= len(steps) and "tool_calls" in step:
+            # Plan ran out mid-tools; end the turn rather than loop forever
+            step = {"content": "Is there anything else I can help with?"}
+
+        step = _fill(step, {"message": message, "product_id": self._first_product(turn)})
+        if "tool_calls" in step:
+            return {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"function": {"name": c["name"], "arguments": c.get("arguments", {})}} for c in step["tool_calls"]],
+            }
+        return {"role": "assistant", "content": step.get("content", "")}
+
+    @staticmethod
+    def _first_product(turn: list) -> str:
+        for m in turn:
+            if m.get("role") != "tool":
+                continue
+            try:
+                result = json.loads(m.get("content") or "{}")
+            except ValueError:
+                continue
+            products = result.get("products") if isinstance(result, dict) else None
+            if products:
+                return products[0].get("id", "")
+        return ""
+
+    # ── Responses ───────────────────────────────────────────────────────────
+
+    def _load(self, body: dict) -> tuple[float, int]:
+        """(seconds to wait for the model to load, prompt tokens past the longest cached prefix)."""
+        prompt = _render(body)
+        now = time.monotonic()
+        with self._state_lock:
+            if now > self._unload_at:
+                # Not resident: load it, with empty KV caches
+                self._ready_at = now + self.load_time
+                self._prompts.clear()
+            wait = max(0.0, self._ready_at - now)
+            self._unload_at = max(self._unload_at, now + wait + _keep_alive_seconds(body.get("keep_alive")))
+
+            # Take over the slot sharing the longest prefix (else the least recently used one)
+            shared = [len(os.path.commonprefix([prompt, cached])) for cached in self._prompts]
+            best = max(range(len(shared)), key=shared.__getitem__, default=None)
+            reused = 0
+            if best is not None and shared[best]:
+                reused = shared[best]
+                del self._prompts[best]
+            self._prompts.append(prompt)
+        return wait, _tokens(prompt[reused:]) if len(prompt) > reused else 0
+
+    def _respond(self, body: dict) -> tuple[float, list[tuple[float, dict]]]:
+        """(delay before the first chunk, [(delay, chunk), ...]) for a chat request."""
+        model = body.get("model", "fake")
+        messages = body.get("messages", [])
+        reply = self.plan(messages)
+        load_wait, prompt_tokens = self._load(body)
+        first = load_wait + self.latency + (prompt_tokens / self.prompt_rate if self.prompt_rate else 0)
+        per_token = 1 / self.token_rate if self.token_rate else 0
+
+        if reply.get("tool_calls"):
+            pieces = [reply]
+        else:
+            words = reply["content"].split(" ")
+            pieces = [{"role": "assistant", "content": w + (" " if i < len(words) - 1 else "")} for i, w in enumerate(words)]
+        eval_tokens = sum(_tokens(p.get("content", "") or json.dumps(p.get("tool_calls", ""))) for p in pieces)
+        num_predict = (body.get("options") or {}).get("num_predict")
+        if num_predict:
+            eval_tokens = min(eval_tokens, num_predict)
+
+        usage = {"prompt_eval_count": prompt_tokens, "eval_count": eval_tokens, "load_duration": int(load_wait * 1e9)}
+        if not body.get("stream", True):
+            total = first + eval_tokens * per_token
+            return total, [(0, _chunk(model, reply, True, usage))]
+
+        chunks = [(_tokens(p.get("content", "")) * per_token, _chunk(model, p, False)) for p in pieces]
+        chunks[0] = (0, chunks[0][1])
+        chunks.append((0, _chunk(model, {"role": "assistant", "content": ""}, True, usage)))
+        return first, chunks
+
+    async def astream(self, body: dict):
+        """NDJSON lines for a request, paced in real time (event-loop friendly)."""
+        if self.parallel and self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.parallel)
+        if self._async_slots:
+            await self._async_slots.acquire()
+        try:
+            first, chunks = self._respond(body)
+            await asyncio.sleep(first)
+            for delay, chunk in chunks:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield (json.dumps(chunk) + "\n").encode()
+        finally:
+            if self._async_slots:
+                self._async_slots.release()
+
+    def stream(self, body: dict):
+        """Blocking variant of astream() for synchronous clients."""
+        if self._thread_slots:
+            self._thread_slots.acquire()
+        try:
+            first, chunks = self._respond(body)
+            time.sleep(first)
+            for delay, chunk in chunks:
+                if delay:
+                    time.sleep(delay)
+                yield (json.dumps(chunk) + "\n").encode()
+        finally:
+            if self._thread_slots:
+                self._thread_slots.release()
+
+
+def _chunk(model: str, message: dict, done: bool, usage: Optional[dict] = None) -> dict:
+    chunk = {
+        "model": model,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "message": message,
+        "done": done,
+    }
+    if done:
+        chunk.update({"done_reason": "stop", **(usage or {})})
+    return chunk
+
+
+fake_ollama = FakeOllama.from_env()
+
+# ── In-process transports (LLM_BACKEND=fake) ────────────────────────────────
+
+
+class _AsyncBody(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def __aiter__(self):
+        async for chunk in self._chunks:
+            yield chunk
+
+
+class _SyncBody(httpx.SyncByteStream):
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __iter__(self):
+        yield from self._chunks
+
+
+class FakeOllamaTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """httpx transport that answers /api/chat from a FakeOllama without a socket."""
+
+    def __init__(self, fake: FakeOllama = fake_ollama):
+        self.fake = fake
+
+    def _not_found(self, request: httpx.Request) -> Optional[httpx.Response]:
+        if request.url.path != "/api/chat":
+            return httpx.Response(404, json={"error": f"{request.url.path} is not supported by the fake server"})
+        return None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        missing = self._not_found(request)
+        if missing:
+            return missing
+        body = json.loads(await request.aread())
+        return httpx.Response(200, headers={"content-type": "application/x-ndjson"}, stream=_AsyncBody(self.fake.astream(body)))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        missing = self._not_found(request)
+        if missing:
+            return missing
+        body = json.loads(request.read())
+        return httpx.Response(200, headers={"content-type": "application/x-ndjson"}, stream=_SyncBody(self.fake.stream(body)))
+
+
+# ── HTTP server ─────────────────────────────────────────────────────────────
+
+app = FastAPI(title="Fake Ollama")
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    if not body.get("stream", True):
+        lines = [line async for line in fake_ollama.astream(body)]
+        return JSONResponse(json.loads(lines[-1]))
+    return StreamingResponse(fake_ollama.astream(body), media_type="application/x-ndjson")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("FAKE_OLLAMA_PORT", "11500")))
@@ -0,0 +1,116 @@
+"""
+History Manager — keeps per-session conversation history within a prompt budget.
+
+Older tool results (full JSON search payloads, offers) are compacted to
+one-line summaries, and whole turns are dropped oldest-first once the
+estimated size exceeds HISTORY_TOKEN_BUDGET. The current offer is not
+lost when its turn is dropped: the agent re-injects it as pinned context.
+"""
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# Messages at the tail of the history that are never compacted
+HISTORY_KEEP_RECENT = int(os.getenv("HISTORY_KEEP_RECENT", "6"))
+
+
+def estimate_tokens(message) -> int:
+    """Rough token count (~4 chars per token) for a chat message."""
+    size = len(str(message.get("content") or ""))
+    if message.get("tool_calls"):
+        size += len(str(message["tool_calls"]))
+    return size // 4 + 4  # per-message role/formatting overhead
+
+
+def estimate_prompt_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m) for m in messages)
+
+
+def summarize_tool_result(content: str) -> str:
+    """One-line summary of a tool result JSON; non-JSON content is returned unchanged."""
+    try:
+        result = json.loads(content)
+    except (TypeError, ValueError):
+        return content
+    if not isinstance(result, dict):
+        return content
+
+    if "products" in result:
+        ids = ", ".join(p.get("id", "?") for p in result["products"])
+        return f"[search_products] {result.get('count', 0)} found: {ids}"
+    if "best_offer" in result:
+        o = result["best_offer"]
+        return (
+            f"[get_best_offer] {o.get('product_id')} x{o.get('quantity', 1)} from {o.get('vendor')} "
+            f"at ${o.get('total_price')} (offer_id {o.get('offer_id')})"
+        )
+    if "quotes" in result:
+        quotes = "; ".join(
+            f"{q['best_offer']['product_id']} ${q['best_offer']['total_price']} from {q['best_offer']['vendor']} "
+            f"(offer_id {q['best_offer']['offer_id']})" if q.get("found") else f"{q.get('product_id')} unavailable"
+            for q in result["quotes"]
+        )
+        return f"[get_best_offers] {quotes}"
+    if "checkout_details" in result:
+        d = result["checkout_details"]
+        return f"[initiate_checkout] {d.get('product_id')} x{d.get('quantity')}: checkout shown"
+    if "message" in result:
+        return f"[tool] {result['message']}"
+    if "error" in result:
+        return f"[tool error] {result['error']}"
+    return content
+
+
+class HistoryManager:
+    def __init__(self, max_tokens: int = HISTORY_TOKEN_BUDGET, keep_recent: int = HISTORY_KEEP_RECENT):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+
+    def compact(self, history: list) -> list:
+        """Return a bounded copy of `history`; the newest turn is always kept whole."""
+        cutoff = max(0, len(history) - self.keep_recent)
+        compacted = []
+        for i, message in enumerate(history):
+            if i < cutoff and message.get("role") == "tool":
+                message = {**message, "content": summarize_tool_result(message.get("content", ""))}
+            compacted.append(message)
+
+        # Drop whole turns (user message up to the next one) so no tool result is orphaned
+        turns = self._split_turns(compacted)
+        total = sum(estimate_prompt_tokens(t) for t in turns)
+        before = total
+        while len(turns) > 1 and total > self.max_tokens:
+            total -= estimate_prompt_tokens(turns.pop(0))
+
+        if total != before:
+            logger.info(f"History trimmed from ~{before} to ~{total} tokens")
+        return [m for turn in turns for m in turn]
+
+    @staticmethod
+    def _split_turns(history: list) -> list[list]:
+        turns = []
+        for message in history:
+            if message.get("role") == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    @staticmethod
+    def pinned_context(offer) -> list[dict]:
+        """System note carrying the active offer, so it survives trimming."""
+        if not offer:
+            return []
+        return [{
+            "role": "system",
+            "content": (
+                f"Current selection: {offer.get('product_name')} ({offer.get('product_id')}), "
+                f"quantity {offer.get('quantity', 1)}, from {offer.get('vendor')} at "
+                f"${offer.get('total_price', offer.get('final_price'))} — offer_id {offer.get('offer_id')}."
+            ),
+        }]
+
+
+history_manager = HistoryManager()
@@ -0,0 +1,164 @@
+"""
+Intent Router — deterministic fast path in front of the LLM.
+
+Recognises a few unambiguous requests and maps them straight to a tool:
+  - "show me shoes" / "browse books"         → search_products
+  - "best price for Brooks Ghost 16"         → get_best_offer
+  - "checkout" / "buy it" (with an offer)    → initiate_checkout
+
+Anything else (sizes, budgets, comparisons, questions) returns None and the
+agent falls back to the LLM loop. Hit/miss counters report how much model
+traffic the router absorbs.
+"""
+import os
+import re
+import logging
+import threading
+from typing import Optional
+from catalog_service import catalog_service
+
+logger = logging.getLogger(__name__)
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+
+CATEGORY_WORDS = {
+    "shoes": "shoes", "shoe": "shoes", "sneakers": "shoes", "running shoes": "shoes",
+    "books": "books", "book": "books",
+}
+
+_BROWSE = re.compile(
+    r"^(?:please\s+)?(?:show|list|browse|see|view)(?:\s+me)?(?:\s+(?:some|all|the|your))?\s+"
+    r"(?P<what>running shoes|shoes|shoe|sneakers|books|book)(?:\s+please)?$"
+)
+_OFFER = re.compile(
+    r"^(?:what(?:'s| is)\s+the\s+|get\s+(?:me\s+)?the\s+|find\s+(?:me\s+)?the\s+)?"
+    r"best\s+(?:price|offer|deal)\s+(?:for|on)\s+(?:the\s+)?(?P<product>.+?)$"
+)
+_CHECKOUT = re.compile(
+    r"^(?:yes,?\s+)?(?:checkout|check out|proceed to checkout|pay|pay now|buy it|buy now|"
+    r"i'?ll take it|purchase it|place (?:the )?order)(?:\s+please)?$"
+)
+
+
+def normalize(message: str) -> str:
+    return " ".join(re.sub(r"[!?.]+$", "", message.strip().lower()).split())
+
+
+class IntentRouter:
+    def __init__(self, enabled: bool = INTENT_ROUTER_ENABLED):
+        self.enabled = enabled
+        self.hits: dict[str, int] = {}
+        self.misses = 0
+        self._names: dict[str, Optional[str]] = {}
+        self._names_version = None
+        self._lock = threading.Lock()
+
+    def route(self, message: str, current_offer: Optional[dict] = None) -> Optional[dict]:
+        """
+        Classify a user message. Returns {"intent", "tool", "arguments"} for
+        a deterministic request, or None when the LLM should handle it.
+        """
+        if not self.enabled:
+            return None
+
+        text = normalize(message)
+        intent = self._match(text, current_offer)
+        with self._lock:
+            if intent:
+                self.hits[intent["intent"]] = self.hits.get(intent["intent"], 0) + 1
+            else:
+                self.misses += 1
+        if intent:
+            logger.info(f"Intent router: {intent['intent']} → {intent['tool']} (hit rate {self.hit_rate():.0%})")
+        return intent
+
+    def _match(self, text: str, current_offer: Optional[dict]) -> Optional[dict]:
+        m = _BROWSE.match(text)
+        if m:
+            category = CATEGORY_WORDS[m.group("what")]
+            return {"intent": "browse", "tool": "search_products", "arguments": {"query": m.group("what"), "category": category}}
+
+        m = _OFFER.match(text)
+        if m:
+            product_id = self._resolve_product(m.group("product"))
+            if product_id:
+                return {"intent": "best_offer", "tool": "get_best_offer", "arguments": {"product_id": product_id, "quantity": 1}}
+            return None
+
+        if _CHECKOUT.match(text) and current_offer and current_offer.get("product_id"):
+            arguments = {
+                "product_id": current_offer["product_id"],
+                "quantity": current_offer.get("quantity", 1),
+            }
+            if current_offer.get("offer_id"):
+                arguments["offer_id"] = current_offer["offer_id"]
+            return {"intent": "checkout", "tool": "initiate_checkout", "arguments": arguments}
+
+        return None
+
+    def _resolve_product(self, name: str) -> Optional[str]:
+        """Exact product id, full name, or name without its model number; ambiguous names fail."""
+        with self._lock:
+            if self._names_version != catalog_service.version or not self._names:
+                self._names = self._build_names()
+                self._names_version = catalog_service.version
+            return self._names.get(name.strip())
+
+    @staticmethod
+    def _build_names() -> dict[str, Optional[str]]:
+        names: dict[str, Optional[str]] = {}
+
+        def add(alias: str, product_id: str):
+            # An alias shared by two products is ambiguous — map it to None
+            names[alias] = product_id if names.get(alias, product_id) == product_id else None
+
+        for product in catalog_service.get_all_products():
+            full = normalize(product.name)
+            add(product.id, product.id)
+            add(full, product.id)
+            short = re.sub(r"\s+\S*\d\S*$", "", full)
+            # "brooks ghost" is fine, but a bare brand ("new balance") is not a product
+            if short and short != full and short != normalize(product.brand):
+                add(short, product.id)
+        return names
+
+    @staticmethod
+    def reply(intent: dict, result: dict) -> str:
+        """Templated assistant reply for a routed tool result."""
+        if intent["intent"] == "browse":
+            if not result.get("found"):
+                return result.get("message", "I couldn't find anything matching that.")
+            return (
+                f"Here are {result['count']} {intent['arguments']['category']} from our catalog. "
+                "Would you like the best price on any of these?"
+            )
+        if intent["intent"] == "best_offer":
+            if not result.get("found"):
+                return result.get("message", "No offers available.")
+            offer = result["best_offer"]
+            return (
+                f"The best price for **{offer['product_name']}** is **${offer['total_price']:.2f}** "
+                f"from {offer['vendor']}. Would you like to buy it?"
+            )
+        if intent["intent"] == "checkout":
+            if not result.get("success"):
+                return result.get("message", "I couldn't start checkout.")
+            offer = result.get("offer_details") or {}
+            return f"Great choice! Opening secure checkout for **{offer.get('product_name', 'your item')}**."
+        return ""
+
+    def hit_rate(self) -> float:
+        total = sum(self.hits.values()) + self.misses
+        return sum(self.hits.values()) / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": round(self.hit_rate(), 4),
+            }
+
+
+intent_router = IntentRouter()
@@ -0,0 +1,169 @@
+"""
+LLM Client — builds every chat request the agent sends to Ollama.
+
+Ollama keeps the KV cache of the previous prompt and only evaluates what
+follows the part a new prompt shares with it, so requests are laid out to
+share as long a prefix as possible: the tool schemas are the same list
+object on every call, the system prompt never changes, the pinned offer
+after it changes only when a new offer is quoted, and the new message goes
+after the history (see ShoppingAgent._build_messages).
+
+The model is kept loaded for OLLAMA_KEEP_ALIVE instead of Ollama's 5 idle
+minutes, and runner options are fixed per process (a different num_ctx
+makes Ollama reload the model). warm_up() loads the model and evaluates
+the fixed prefix at startup, so the first user doesn't pay for either.
+
+Calls go through a BackendPool (llm_pool.py), which picks the host and
+queues calls when every host is busy. A call that fails on an unhealthy
+host before anything was streamed is retried on another one.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from tools import TOOL_SCHEMAS
+from llm_pool import BackendPool, OLLAMA_HOSTS, is_host_failure
+from metrics import LLM_FIRST_TOKEN_SECONDS, LLM_QUEUE_SECONDS
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# "ollama" talks to OLLAMA_HOST; "fake" answers in-process from fake_ollama.py's script
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").lower()
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
+# Duration string ("30m", "2h") or seconds; -1 keeps the model loaded indefinitely
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Context window; 0 leaves the model's default
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
+# Upper bound on the startup warm-up (large models can take a while to load)
+LLM_WARMUP_TIMEOUT = float(os.getenv("LLM_WARMUP_TIMEOUT", "120"))
+
+
+class LLMClient:
+    def __init__(
+        self,
+        model: str = OLLAMA_MODEL,
+        backend: str = LLM_BACKEND,
+        keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE,
+        num_ctx: int = OLLAMA_NUM_CTX,
+        transport: Optional["httpx.BaseTransport"] = None,
+        pool: Optional[BackendPool] = None,
+    ):
+        self.model = model
+        self.backend = backend
+        self.keep_alive = _keep_alive(keep_alive)
+        self.options = {"num_ctx": num_ctx} if num_ctx else {}
+        if pool is None:
+            if transport is None and backend == "fake":
+                from fake_ollama import FakeOllamaTransport
+                transport = FakeOllamaTransport()
+            pool = BackendPool.from_hosts(OLLAMA_HOSTS, transport)
+        self.pool = pool
+
+    def _request(self, messages: list, **options) -> dict:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "tools": TOOL_SCHEMAS,
+            "keep_alive": self.keep_alive,
+            "options": {**self.options, **options},
+        }
+
+    def chat(self, messages: list, span_attrs: Optional[dict] = None, session_id: str = "default"):
+        """One blocking, non-streamed chat call."""
+        span_attrs = {} if span_attrs is None else span_attrs
+        attempts, tried = len(self.pool.backends), []
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            backend = self.pool.acquire(session_id, avoid=tried)
+            tried.append(backend)
+            self._record_queue(span_attrs, backend, started)
+            failed = False
+            try:
+                return backend.client.chat(**self._request(messages))
+            except Exception as e:
+                failed = is_host_failure(e)
+                if not failed or attempt + 1 == attempts:
+                    raise
+                logger.warning(f"LLM backend {backend.name} failed ({e}); retrying on another")
+            finally:
+                self.pool.release(backend, failed)
+
+    async def astream(self, messages: list, span_attrs: Optional[dict] = None, session_id: str = "default"):
+        """Stream a chat call's chunks; the time to the first one is recorded (and set on `span_attrs`)."""
+        span_attrs = {} if span_attrs is None else span_attrs
+        attempts, tried = len(self.pool.backends), []
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            backend = await self.pool.aacquire(session_id, avoid=tried)
+            tried.append(backend)
+            self._record_queue(span_attrs, backend, started)
+            started = time.perf_counter()
+            first, failed = True, False
+            try:
+                stream = await backend.async_client.chat(**self._request(messages), stream=True)
+                async for chunk in stream:
+                    if first:
+                        first = False
+                        elapsed = time.perf_counter() - started
+                        LLM_FIRST_TOKEN_SECONDS.observe(elapsed, model=self.model)
+                        span_attrs["first_token_ms"] = round(elapsed * 1000, 1)
+                    yield chunk
+                return
+            except Exception as e:
+                failed = is_host_failure(e)
+                # Once chunks have been streamed the caller has seen them — no retry
+                if not failed or not first or attempt + 1 == attempts:
+                    raise
+                logger.warning(f"LLM backend {backend.name} failed ({e}); retrying on another")
+            finally:
+                self.pool.release(backend, failed)
+
+    def _record_queue(self, span_attrs: dict, backend, started: float) -> None:
+        waited = time.perf_counter() - started
+        LLM_QUEUE_SECONDS.observe(waited)
+        span_attrs["backend"] = backend.name
+        span_attrs["queue_ms"] = round(waited * 1000, 1)
+
+    async def awarm_up(self, messages: list, timeout: float = LLM_WARMUP_TIMEOUT) -> Optional[float]:
+        """
+        Load the model on every backend and evaluate `messages` (the fixed
+        prompt prefix plus a throwaway user message), generating a single
+        token. Returns the seconds it took, or None if no backend could be
+        warmed within `timeout` — startup goes on and the first real
+        requests pay instead.
+        """
+        started = time.perf_counter()
+
+        async def warm(backend) -> bool:
+            try:
+                await asyncio.wait_for(backend.async_client.chat(**self._request(messages, num_predict=1)), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"LLM warm-up of {backend.name} timed out after {timeout}s")
+                return False
+            except Exception as e:
+                logger.warning(f"LLM warm-up of {backend.name} failed: {e}")
+                return False
+            return True
+
+        warmed = await asyncio.gather(*(warm(b) for b in self.pool.backends))
+        if not any(warmed):
+            return None
+        elapsed = time.perf_counter() - started
+        logger.info(f"LLM warm-up: {self.model} ready on {sum(warmed)}/{len(warmed)} backends in {elapsed * 1000:.0f}ms")
+        return elapsed
+
+
+def _keep_alive(value: Optional[str]):
+    """Ollama takes a duration string or a number of seconds; pass numbers as numbers."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
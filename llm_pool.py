@@ -0,0 +1,270 @@
+"""
+LLM Backend Pool — spreads chat calls over several Ollama hosts.
+
+    OLLAMA_HOSTS=http://gpu1:11434,http://gpu2:11434
+
+Each call takes a slot on the backend with the fewest outstanding requests,
+up to LLM_MAX_OUTSTANDING per host (match it to the host's
+OLLAMA_NUM_PARALLEL). When every slot is taken the call waits in a queue of
+at most LLM_QUEUE_SIZE, served round-robin across sessions, so a session
+with many calls in flight can't push everyone else's turns to the back.
+
+A host that fails LLM_FAILURE_THRESHOLD calls in a row (connection errors,
+timeouts, 5xx) is taken out of rotation for LLM_HOST_COOLDOWN seconds and
+then tried again. If every host is out, they are all tried anyway.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Callable, Collection, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    import ollama
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated; empty uses OLLAMA_HOST (or Ollama's default) through a single backend
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()]
+LLM_MAX_OUTSTANDING = int(os.getenv("LLM_MAX_OUTSTANDING", "4"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+# "false" serves queued calls strictly first-come first-served
+LLM_FAIR_QUEUE = os.getenv("LLM_FAIR_QUEUE", "true").lower() == "true"
+LLM_FAILURE_THRESHOLD = int(os.getenv("LLM_FAILURE_THRESHOLD", "3"))
+LLM_HOST_COOLDOWN = float(os.getenv("LLM_HOST_COOLDOWN", "15"))
+
+
+class PoolExhausted(Exception):
+    """No backend slot could be had: the queue is full or the wait timed out."""
+
+
+class Backend:
+    """One Ollama host and its clients."""
+
+    def __init__(self, host: Optional[str] = None, transport: Optional["httpx.BaseTransport"] = None):
+        self.host = host
+        self.transport = transport
+        self.outstanding = 0
+        self.calls = 0
+        self.failures = 0  # consecutive
+        self.down_until = 0.0
+        self._client = None
+        self._async_client = None
+
+    @property
+    def name(self) -> str:
+        return self.host or "default"
+
+    @property
+    def client(self) -> "ollama.Client":
+        """Created on first use, so importing the agent doesn't import the Ollama/httpx stack."""
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(**self._client_options())
+        return self._client
+
+    @property
+    def async_client(self) -> "ollama.AsyncClient":
+        """Lazily created so the underlying HTTP pool binds to the running loop."""
+        if self._async_client is None:
+            import ollama
+            self._async_client = ollama.AsyncClient(**self._client_options())
+        return self._async_client
+
+    def _client_options(self) -> dict:
+        options = {"host": self.host} if self.host else {}
+        if self.transport is not None:
+            options["transport"] = self.transport
+        return options
+
+
+class _Waiter:
+    __slots__ = ("session", "notify", "avoid", "backend")
+
+    def __init__(self, session: str, notify: Callable[[], None], avoid: Collection[Backend] = ()):
+        self.session = session
+        self.notify = notify
+        self.avoid = avoid
+        self.backend: Optional[Backend] = None
+
+
+class BackendPool:
+    def __init__(
+        self,
+        backends: list[Backend],
+        max_outstanding: int = LLM_MAX_OUTSTANDING,
+        queue_size: int = LLM_QUEUE_SIZE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        fair: bool = LLM_FAIR_QUEUE,
+        failure_threshold: int = LLM_FAILURE_THRESHOLD,
+        cooldown: float = LLM_HOST_COOLDOWN,
+    ):
+        self.backends = backends
+        self.max_outstanding = max_outstanding
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.fair = fair
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.rejected = 0
+        # Sessions with queued calls, in the order they'll next be served
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._waiting = 0
+        # A plain lock (held only for bookkeeping) so sync and async callers share one queue
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_hosts(cls, hosts: list[str], transport: Optional["httpx.BaseTransport"] = None, **kwargs) -> "BackendPool":
+        return cls([Backend(host, transport) for host in hosts] or [Backend(None, transport)], **kwargs)
+
+    # ── Slots ───────────────────────────────────────────────────────────────
+
+    def acquire(self, session: str = "default", avoid: Collection[Backend] = ()) -> Backend:
+        """
+        Block until a backend slot is free; release() it when the call is
+        done. Backends in `avoid` (already tried for this call) are skipped
+        unless there are no others.
+        """
+        event = threading.Event()
+        waiter = _Waiter(session, event.set, avoid)
+        backend = self._grant_or_queue(waiter)
+        if backend:
+            return backend
+        if not event.wait(self.queue_timeout) and self._abandon(waiter):
+            raise PoolExhausted(f"No LLM backend free after {self.queue_timeout}s")
+        return waiter.backend
+
+    async def aacquire(self, session: str = "default", avoid: Collection[Backend] = ()) -> Backend:
+        """acquire() for the event loop: waits without blocking it."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            # Called under the pool lock, possibly from a worker thread
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = _Waiter(session, notify, avoid)
+        backend = self._grant_or_queue(waiter)
+        if backend:
+            return backend
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(waiter):
+                raise PoolExhausted(f"No LLM backend free after {self.queue_timeout}s")
+        except asyncio.CancelledError:
+            if not self._abandon(waiter):
+                # Granted just as we were cancelled — hand the slot on
+                self.release(waiter.backend)
+            raise
+        return waiter.backend
+
+    def release(self, backend: Backend, failed: bool = False) -> None:
+        """Return a slot; `failed` counts towards taking the host out of rotation."""
+        with self._lock:
+            backend.outstanding -= 1
+            if not failed:
+                backend.failures = 0
+                backend.down_until = 0.0
+            else:
+                backend.failures += 1
+                if backend.failures >= self.failure_threshold:
+                    backend.down_until = time.monotonic() + self.cooldown
+                    logger.warning(
+                        f"LLM backend {backend.name} failed {backend.failures} calls in a row; "
+                        f"out of rotation for {self.cooldown}s"
+                    )
+            self._dispatch()
+
+    def _grant_or_queue(self, waiter: _Waiter) -> Optional[Backend]:
+        with self._lock:
+            if not self._waiting:
+                backend = self._free_backend(waiter.avoid)
+                if backend:
+                    self._take(backend)
+                    return backend
+            if self._waiting >= self.queue_size:
+                self.rejected += 1
+                raise PoolExhausted(f"LLM queue full ({self.queue_size} waiting)")
+            key = waiter.session if self.fair else ""
+            self._queues.setdefault(key, deque()).append(waiter)
+            self._waiting += 1
+        return None
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; False if it was granted a slot meanwhile."""
+        with self._lock:
+            if waiter.backend is not None:
+                return False
+            key = waiter.session if self.fair else ""
+            queue = self._queues[key]
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[key]
+            self._waiting -= 1
+            return True
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued calls, one session at a time (caller holds the lock)."""
+        while self._waiting:
+            for key, queue in self._queues.items():
+                backend = self._free_backend(queue[0].avoid)
+                if backend:
+                    break
+            else:
+                return
+            waiter = queue.popleft()
+            # The session just served goes to the back of the rotation
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            self._waiting -= 1
+            self._take(backend)
+            waiter.backend = backend
+            waiter.notify()
+
+    def _free_backend(self, avoid: Collection[Backend] = ()) -> Optional[Backend]:
+        """Least-outstanding backend with a free slot, preferring hosts in rotation."""
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in avoid] or self.backends
+        up = [b for b in candidates if b.down_until <= now] or candidates
+        free = [b for b in up if b.outstanding < self.max_outstanding]
+        return min(free, key=lambda b: (b.outstanding, b.failures), default=None)
+
+    @staticmethod
+    def _take(backend: Backend) -> None:
+        backend.outstanding += 1
+        backend.calls += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "backends": [
+                    {
+                        "host": b.name,
+                        "up": b.down_until <= now,
+                        "outstanding": b.outstanding,
+                        "calls": b.calls,
+                        "failures": b.failures,
+                    }
+                    for b in self.backends
+                ],
+                "waiting": self._waiting,
+                "sessions_waiting": len(self._queues),
+                "rejected": self.rejected,
+            }
+
+
+def is_host_failure(error: Exception) -> bool:
+    """Errors that say the host is unwell (as opposed to a bad request)."""
+    import httpx
+    from ollama import ResponseError
+
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
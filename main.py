@@ -1,26 +1,83 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+import os
+import asyncio
 import logging
 import json
+import uuid
+import weakref
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
 from agent import agent
+from llm_client import LLM_WARMUP
 from payment_service import payment_service
+from payment_jobs import payment_jobs
+from catalog_service import catalog_service
+from history_manager import history_manager
+from session_store import session_store
+from intent_router import intent_router
+from response_cache import response_cache
+from metrics import registry
+from admission import admission, Overloaded
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Shopping Agent")
+_IMPORTS_DONE = time.perf_counter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load startup state before taking traffic and report how long it took; close pools on shutdown."""
+    started = time.perf_counter()
+    # The catalog index is loaded from its saved copy when available (see CatalogService._load_index)
+    # Meanwhile, load the model so the first chat doesn't wait for it
+    warm_up = asyncio.create_task(agent.warm_up()) if LLM_WARMUP else None
+    await asyncio.to_thread(lambda: catalog_service.index)
+    indexed = time.perf_counter()
+    warm_up_seconds = await warm_up if warm_up else None
+    ready = time.perf_counter()
+    app.state.startup = {
+        "imports_ms": round((_IMPORTS_DONE - _IMPORT_STARTED) * 1000, 1),
+        "catalog_index_ms": round((indexed - started) * 1000, 1),
+        "llm_warmup_ms": round(warm_up_seconds * 1000, 1) if warm_up_seconds is not None else None,
+        "ready_ms": round((ready - _IMPORT_STARTED) * 1000, 1),
+    }
+    logger.info(
+        f"Startup: imports {app.state.startup['imports_ms']}ms, "
+        f"catalog index {app.state.startup['catalog_index_ms']}ms, "
+        f"LLM warm-up {app.state.startup['llm_warmup_ms']}ms, "
+        f"ready {app.state.startup['ready_ms']}ms after import"
+    )
+    yield
+    await payment_jobs.stop()
+    await payment_service.aclose()
+
+
+app = FastAPI(title="AI Shopping Agent", lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="./static"), name="static")
 templates = Jinja2Templates(directory="./templates")
 
-# In-memory session state
-sessions: dict = {}
+# Append every chat message here as JSONL, for replay with benchmarks/replay.py (empty = off)
+CHAT_RECORD_PATH = os.getenv("CHAT_RECORD_PATH", "")
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    """Fast rejection from admission control; `reply` for the chat UI, `message` for checkout."""
+    return JSONResponse(
+        {"success": False, "reply": str(exc), "message": str(exc), "retry_after": exc.retry_after},
+        status_code=exc.status,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 @app.get("/")
@@ -28,6 +85,28 @@ async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+def _record(session_id: str, message: str) -> None:
+    if CHAT_RECORD_PATH:
+        with open(CHAT_RECORD_PATH, "a") as f:
+            f.write(json.dumps({"ts": time.time(), "session_id": session_id, "message": message}) + "\n")
+
+
+def _apply_turn(session: dict, result: dict) -> dict:
+    """Fold an agent turn into the session and build the client payload."""
+    session["history"] = history_manager.compact(session["history"] + result["new_messages"])
+    if result.get("offer_details"):
+        session["best_offer"] = result["offer_details"]
+
+    return {
+        "reply": result["reply"],
+        "offer_details": result.get("offer_details"),
+        "current_context_offer": session.get("best_offer"),
+        "thinking_steps": result.get("thinking_steps", []),
+        "search_results": result.get("search_results", []),
+        "trigger_checkout": result.get("trigger_checkout", False),
+    }
+
+
 @app.post("/chat")
 async def chat(request: Request):
     data = await request.json()
@@ -36,85 +115,167 @@ async def chat(request: Request):
 
     if not user_message:
         return JSONResponse({"reply": "Please type a message."})
+    _record(session_id, user_message)
 
-    # Initialize session
-    if session_id not in sessions:
-        sessions[session_id] = {"history": [], "best_offer": None}
+    # Bounded concurrency per route; beyond the queue the request is rejected with 503
+    async with admission.admit("chat", session_id):
+        # Turns for the same session run one at a time; other sessions proceed concurrently
+        async with session_store.lock(session_id):
+            session = await session_store.aget_or_create(session_id)
 
-    session = sessions[session_id]
+            # Run the agentic loop without blocking other sessions
+            result = await agent.achat(user_message, session["history"], session.get("best_offer"), session_id)
 
-    # Run the agentic loop
-    result = agent.chat(user_message, session["history"])
+            payload = _apply_turn(session, result)
+            await session_store.asave(session_id, session)
 
-    # Update session history and context
-    session["history"].extend(result["new_messages"])
-    if result.get("offer_details"):
-        session["best_offer"] = result["offer_details"]
+    return JSONResponse(payload)
 
-    return JSONResponse({
-        "reply": result["reply"],
-        "offer_details": result.get("offer_details"),
-        "current_context_offer": session.get("best_offer"),
-        "thinking_steps": result.get("thinking_steps", []),
-        "search_results": result.get("search_results", []),
-        "trigger_checkout": result.get("trigger_checkout", False),
-    })
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    """
+    Streaming variant of /chat. Responds with NDJSON: one event per line
+    (thinking / search_results / offer_details / token) as the agent
+    produces them, then a final "done" event carrying the /chat payload.
+    """
+    data = await request.json()
+    user_message = data.get("message", "").strip()
+    session_id = data.get("session_id", "default")
+
+    if not user_message:
+        return JSONResponse({"reply": "Please type a message."})
+    _record(session_id, user_message)
+    # Admitted before the response starts, so overload is a plain 503; the slot is held until the stream ends
+    ticket = await admission.enter("chat", session_id)
+
+    async def events():
+        try:
+            async with session_store.lock(session_id):
+                session = await session_store.aget_or_create(session_id)
+                async for event in agent.astream(user_message, session["history"], session.get("best_offer"), session_id):
+                    if event["event"] == "done":
+                        event = {"event": "done", **_apply_turn(session, event["result"])}
+                        await session_store.asave(session_id, session)
+                    yield json.dumps(event) + "\n"
+        finally:
+            ticket.release()
+
+    stream = events()
+    # A client that disconnects before the first chunk never starts the generator (so no finally)
+    weakref.finalize(stream, ticket.release)
+    return StreamingResponse(stream, media_type="application/x-ndjson")
 
 
 @app.post("/checkout")
 async def checkout(request: Request):
+    """
+    Queue the payment and return its job at once (202); poll
+    /checkout/status/{job_id} for the outcome. A repeated request with the
+    same idempotency key returns the job already queued for it.
+    """
     data = await request.json()
     session_id = data.get("session_id", "default")
-    card_type = data.get("card_type")
-    card_number = data.get("card_number")
-    card_expiry = data.get("card_expiry", "")
-    card_cvc = data.get("card_cvc", "")
+    # One key per Pay attempt; without one every request is a new payment
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key") or str(uuid.uuid4())
+    card = {
+        "card_type": data.get("card_type"),
+        "card_number": data.get("card_number"),
+        "card_expiry": data.get("card_expiry", ""),
+        "card_cvc": data.get("card_cvc", ""),
+    }
     shipping_address = data.get("shipping_address", {})
 
-    session = sessions.get(session_id)
-    if not session or not session.get("best_offer"):
-        return JSONResponse({"success": False, "message": "No active purchase found. Please start a new search."})
-
-    offer = session["best_offer"]
-    product_name = offer.get("product_name", "Shopping purchase")
-
-    if shipping_address:
-        logger.info(
-            f"Shipping to: {shipping_address.get('name')}, "
-            f"{shipping_address.get('street')}, {shipping_address.get('city')}, "
-            f"{shipping_address.get('state')} {shipping_address.get('zip')}, "
-            f"{shipping_address.get('country')}"
-        )
-    result = payment_service.process_payment(
-        amount=offer.get("total_price", offer["final_price"]),
-        card_type=card_type,
-        card_number=card_number,
-        card_expiry=card_expiry,
-        card_cvc=card_cvc,
-        description=product_name[:24],
-    )
+    # Checkouts are admitted ahead of queued chats. Hold the session lock so a
+    # concurrent /chat can't swap best_offer while the job is queued
+    async with admission.admit("checkout", session_id), session_store.lock(session_id):
+        session = await session_store.aget(session_id)
+        job = payment_jobs.find(session, idempotency_key) if session else None
+        if job:
+            return JSONResponse(payment_jobs.public(job))
+        if not session or not session.get("best_offer"):
+            return JSONResponse({"success": False, "message": "No active purchase found. Please start a new search."})
+
+        offer = session["best_offer"]
+        if offer.get("offer_id"):
+            # Charge exactly the quoted snapshot, not whatever the session dict says
+            snapshot = catalog_service.get_offer(offer["offer_id"])
+            if snapshot is None:
+                session["best_offer"] = None
+                await session_store.asave(session_id, session)
+                return JSONResponse({"success": False, "message": "This offer has expired. Please ask for a fresh quote."})
+            offer = snapshot.to_dict()
+
+        if shipping_address:
+            logger.info(
+                f"Shipping to: {shipping_address.get('name')}, "
+                f"{shipping_address.get('street')}, {shipping_address.get('city')}, "
+                f"{shipping_address.get('state')} {shipping_address.get('zip')}, "
+                f"{shipping_address.get('country')}"
+            )
+        job = payment_jobs.submit(session_id, session, offer, card, idempotency_key)
+        await session_store.asave(session_id, session)
+
+    return JSONResponse(payment_jobs.public(job), status_code=202)
+
+
+@app.get("/checkout/status/{job_id}")
+async def checkout_status(job_id: str, session_id: str = "default"):
+    """A payment job's status: pending, then succeeded or failed with the gateway's message."""
+    session = await session_store.aget(session_id)
+    job = session.get("payments", {}).get(job_id) if session else None
+    if job is None:
+        return JSONResponse({"success": False, "message": "Unknown payment."}, status_code=404)
+    return JSONResponse(payment_jobs.public(job))
+
+
+@app.get("/payments/stats")
+async def payment_stats():
+    """Debug endpoint reporting payment workers, queued jobs and average gateway time."""
+    return JSONResponse(payment_jobs.stats())
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Debug endpoint reporting in-flight and queued requests per route, and rejections."""
+    return JSONResponse(admission.stats())
+
+
+@app.get("/router/stats")
+async def router_stats():
+    """Debug endpoint reporting how often the intent router bypasses the LLM."""
+    return JSONResponse(intent_router.stats())
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Debug endpoint reporting response cache size and hit rate."""
+    return JSONResponse(response_cache.stats())
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Debug endpoint reporting each LLM backend's load and health, and the request queue."""
+    return JSONResponse(agent.llm.pool.stats())
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: turn, LLM, tool, session and payment latency histograms."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
-    if result["success"]:
-        session["best_offer"] = None
-        return JSONResponse({
-            "success": True,
-            "message": f"🎉 Order confirmed for **{product_name}**! {result['message']}",
-            "transaction_id": result["transaction_id"],
-            "worldpay_outcome": result.get("worldpay_outcome"),
-        })
 
-    return JSONResponse({
-        "success": False,
-        "message": result["message"],
-        "worldpay_outcome": result.get("worldpay_outcome"),
-    })
+@app.get("/startup")
+async def startup_report():
+    """Debug endpoint reporting how long this worker took to become ready."""
+    return JSONResponse(app.state.startup)
 
 
 @app.get("/catalog")
 async def get_catalog():
     """Debug endpoint to view the full product catalog."""
-    from .catalog_service import CATALOG
-    return JSONResponse({"products": list(CATALOG.values()), "total": len(CATALOG)})
+    products = [p.to_dict() for p in catalog_service.get_all_products()]
+    return JSONResponse({"products": products, "total": len(products)})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+"""
+Metrics — latency histograms and counters exposed in Prometheus text format.
+
+Hot paths are wrapped in span(), which times the block, observes the
+result in a histogram and logs a structured line at DEBUG:
+
+    with span(TOOL_SECONDS, tool=name) as s:
+        result = func(**arguments)
+        s["outcome"] = "ok"
+
+Keys set on the span that aren't histogram labels (e.g. token counts) are
+logged but not used as labels. GET /metrics renders the registry.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds — from sub-millisecond catalog work up to slow LLM turns
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Tokens — a bare system prompt up to a full context window
+TOKEN_BUCKETS = (256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192, 12288, 16384, 32768)
+
+
+def _label_str(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value: float) -> str:
+    """Full precision: %g would round a counter past 1e6 to 6 significant digits and flatten rate()."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_format(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # label values → [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series):
+                    le = f'le="{_format(bound)}"'
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {n}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ── Instrumented paths ──────────────────────────────────────────────────────
+
+TURN_SECONDS = registry.histogram(
+    "agent_turn_seconds", "Whole agent turn, by how it was answered (router, cache, llm, busy, error)", ("path",))
+LLM_SECONDS = registry.histogram(
+    "llm_request_seconds", "One Ollama chat call, including streaming the response", ("model", "backend", "outcome"))
+LLM_QUEUE_SECONDS = registry.histogram(
+    "llm_queue_seconds", "Wait for a free LLM backend slot")
+LLM_FIRST_TOKEN_SECONDS = registry.histogram(
+    "llm_first_token_seconds", "Streamed Ollama chat call, from request to first chunk (load + prompt eval)", ("model",))
+PROMPT_TOKENS = registry.histogram(
+    "agent_prompt_tokens", "Estimated prompt size sent per LLM call, after history compaction "
+    "(call: first of the turn, or a follow-up after tool results)", ("call",), buckets=TOKEN_BUCKETS)
+LLM_PROMPT_TOKENS = registry.counter(
+    "llm_prompt_tokens_total", "Prompt tokens evaluated by the model (prompt_eval_count)", ("model",))
+LLM_EVAL_TOKENS = registry.counter(
+    "llm_eval_tokens_total", "Tokens generated by the model (eval_count)", ("model",))
+TOOL_SECONDS = registry.histogram(
+    "tool_call_seconds", "One execute_tool call", ("tool", "outcome"))
+SESSION_SECONDS = registry.histogram(
+    "session_store_seconds", "Session lookup (get_or_create) and per-session lock wait", ("store", "operation"))
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "admission_wait_seconds", "Time an admitted request spent queued for a route slot", ("route",))
+ADMISSION_REJECTED = registry.counter(
+    "admission_rejected_total", "Requests turned away by admission control", ("route", "status"))
+PAYMENT_SECONDS = registry.histogram(
+    "payment_seconds", "One WorldPay authorization call", ("outcome",))
+PAYMENT_QUEUE_SECONDS = registry.histogram(
+    "payment_queue_seconds", "Time a payment job waited for a worker")
+PAYMENT_JOBS = registry.counter(
+    "payment_jobs_total", "/checkout submissions, by result (queued, duplicate, rejected, succeeded, failed)", ("status",))
+
+
+@contextmanager
+def span(histogram: Histogram, trace: Optional["TurnTrace"] = None, **labels):
+    """
+    Time the block into `histogram`. The yielded dict holds the labels and
+    may be updated inside the block (outcome, token counts, ...). If the
+    block raises, outcome defaults to "error". With `trace`, the duration
+    is also attributed to that turn.
+    """
+    started = time.perf_counter()
+    try:
+        yield labels
+    except BaseException:
+        labels.setdefault("outcome", "error")
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        labels.setdefault("outcome", "ok")
+        histogram.observe(elapsed, **labels)
+        if trace is not None:
+            trace.add(histogram.name.removesuffix("_seconds"), elapsed)
+        if logger.isEnabledFor(logging.DEBUG):
+            attrs = " ".join(f"{k}={v}" for k, v in labels.items())
+            logger.debug(f"span {histogram.name} {elapsed * 1000:.1f}ms {attrs}")
+
+
+class TurnTrace:
+    """Where one agent turn spent its time, for a one-line breakdown in the log."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.parts: dict[str, list] = {}  # span name → [seconds, calls]
+
+    def add(self, name: str, seconds: float) -> None:
+        part = self.parts.setdefault(name, [0.0, 0])
+        part[0] += seconds
+        part[1] += 1
+
+    @contextmanager
+    def part(self, name: str):
+        """Attribute the block's wall time to `name` (for work timed as a whole, e.g. a tool batch)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def finish(self, path: str) -> float:
+        """Observe the turn's total latency and log the breakdown; returns the total in seconds."""
+        total = time.perf_counter() - self.started
+        TURN_SECONDS.observe(total, path=path)
+        accounted = sum(seconds for seconds, _ in self.parts.values())
+        parts = ", ".join(f"{name} {seconds * 1000:.0f}ms/{calls}" for name, (seconds, calls) in self.parts.items())
+        logger.info(
+            f"Turn ({path}) {total * 1000:.0f}ms: {parts + ', ' if parts else ''}"
+            f"other {max(total - accounted, 0) * 1000:.0f}ms"
+        )
+        return total
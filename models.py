@@ -0,0 +1,171 @@
+"""
+Compact catalog models — slotted Product and Offer records.
+
+Products keep their sizes and widths as bitsets over shared, interned
+vocabularies instead of per-product string lists; offers store each price
+once. Both convert to the existing JSON dict shape only via to_dict(), at
+the API/tool edge.
+"""
+import sys
+from typing import Iterable, Optional
+
+
+class Vocabulary:
+    """Interns a small set of string values and maps them to bit positions."""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self._bits: dict[str, int] = {}
+        self._values: list[str] = []
+        for value in values:
+            self.bit(value)
+
+    def bit(self, value: str) -> int:
+        bit = self._bits.get(value)
+        if bit is None:
+            bit = len(self._values)
+            value = sys.intern(value)
+            self._bits[value] = bit
+            self._values.append(value)
+        return bit
+
+    def encode(self, values: Iterable[str]) -> int:
+        mask = 0
+        for value in values:
+            mask |= 1 << self.bit(value)
+        return mask
+
+    def decode(self, mask: int) -> list[str]:
+        return [value for bit, value in enumerate(self._values) if mask >> bit & 1]
+
+
+SIZES = Vocabulary(["7", "7.5", "8", "8.5", "9", "9.5", "10", "10.5", "11", "12", "13", "14"])
+WIDTHS = Vocabulary(["B", "D", "2E", "4E"])
+
+
+class Product:
+    __slots__ = (
+        "id", "name", "brand", "category", "description", "base_price",
+        "image_url", "tags", "size_mask", "width_mask",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        brand: str,
+        category: str,
+        description: str,
+        base_price: float,
+        image_url: Optional[str] = None,
+        tags: Iterable[str] = (),
+        size_mask: Optional[int] = None,
+        width_mask: Optional[int] = None,
+    ):
+        self.id = id
+        self.name = name
+        self.brand = sys.intern(brand)
+        self.category = sys.intern(category)
+        self.description = description
+        self.base_price = base_price
+        self.image_url = sys.intern(image_url) if image_url else image_url
+        self.tags = tuple(sys.intern(t) for t in tags)
+        # None means the product has no size/width dimension (e.g. books)
+        self.size_mask = size_mask
+        self.width_mask = width_mask
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Product":
+        sizes = data.get("available_sizes")
+        widths = data.get("available_widths")
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            brand=data["brand"],
+            category=data["category"],
+            description=data["description"],
+            base_price=data["base_price"],
+            image_url=data.get("image_url"),
+            tags=data.get("tags", ()),
+            size_mask=SIZES.encode(sizes) if sizes is not None else None,
+            width_mask=WIDTHS.encode(widths) if widths is not None else None,
+        )
+
+    @property
+    def available_sizes(self) -> list[str]:
+        return SIZES.decode(self.size_mask) if self.size_mask is not None else []
+
+    @property
+    def available_widths(self) -> list[str]:
+        return WIDTHS.decode(self.width_mask) if self.width_mask is not None else []
+
+    def to_dict(self) -> dict:
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "brand": self.brand,
+            "category": self.category,
+            "description": self.description,
+        }
+        if self.size_mask is not None:
+            data["available_sizes"] = self.available_sizes
+        if self.width_mask is not None:
+            data["available_widths"] = self.available_widths
+        data["base_price"] = self.base_price
+        data["image_url"] = self.image_url
+        data["tags"] = list(self.tags)
+        return data
+
+
+class Offer:
+    __slots__ = (
+        "vendor", "product_id", "product_name", "category", "size", "width",
+        "quantity", "unit_price", "unit_discount", "unit_final_price",
+        "total_price", "in_stock", "image_url", "offer_id",
+    )
+
+    def __init__(
+        self,
+        vendor: str,
+        product: Product,
+        unit_price: float,
+        unit_discount: float,
+        quantity: int = 1,
+        width: Optional[str] = None,
+        size: Optional[str] = None,
+        in_stock: bool = True,
+    ):
+        self.vendor = vendor
+        self.product_id = product.id
+        self.product_name = product.name
+        self.category = product.category
+        self.size = size
+        self.width = width
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.unit_discount = unit_discount
+        self.unit_final_price = round(unit_price - unit_discount, 2)
+        self.total_price = round(self.unit_final_price * quantity, 2)
+        self.in_stock = in_stock
+        self.image_url = product.image_url
+        self.offer_id = None  # assigned when the offer is cached as a snapshot
+
+    def to_dict(self) -> dict:
+        return {
+            "vendor": self.vendor,
+            "product_id": self.product_id,
+            "product_name": self.product_name,
+            "category": self.category,
+            "size": self.size,  # Will be filled in by agent
+            "width": self.width,
+            "quantity": self.quantity,
+            "unit_price": self.unit_price,
+            "unit_discount": self.unit_discount,
+            "unit_final_price": self.unit_final_price,
+            "price": self.unit_price, # Backwards compatibility for UI
+            "discount": self.unit_discount, # Backwards compatibility for UI
+            "final_price": self.unit_final_price, # Backwards compatibility for unit price display
+            "total_price": self.total_price,
+            "in_stock": self.in_stock,
+            "image_url": self.image_url,
+            "offer_id": self.offer_id,
+        }
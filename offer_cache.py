@@ -0,0 +1,99 @@
+"""
+Offer Cache — TTL + LRU cache of vendor offers with versioned price snapshots.
+
+Each priced (catalog version, product, width, quantity) key is cached for
+OFFER_CACHE_TTL seconds so repeated get_best_offer / initiate_checkout
+calls see the same prices. Every offer also gets an offer_id
+("<product>:<quantity>:v<version>:<n>") that stays resolvable for
+OFFER_SNAPSHOT_TTL seconds, which is what checkout charges against.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from itertools import count
+from typing import Callable, Optional
+from models import Offer
+
+OFFER_CACHE_TTL = float(os.getenv("OFFER_CACHE_TTL", "300"))
+OFFER_CACHE_SIZE = int(os.getenv("OFFER_CACHE_SIZE", "1024"))
+OFFER_SNAPSHOT_TTL = float(os.getenv("OFFER_SNAPSHOT_TTL", "1800"))
+
+
+class OfferCache:
+    def __init__(
+        self,
+        ttl: float = OFFER_CACHE_TTL,
+        max_entries: int = OFFER_CACHE_SIZE,
+        snapshot_ttl: float = OFFER_SNAPSHOT_TTL,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.snapshot_ttl = snapshot_ttl
+        self._entries: OrderedDict = OrderedDict()    # key → (expires_at, offers)
+        self._snapshots: OrderedDict = OrderedDict()  # offer_id → (expires_at, offer)
+        self._versions = count(1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_price(self, key: tuple, price: Callable[[], list[Offer]]) -> list[Offer]:
+        """Return cached offers for `key`, calling `price()` on a miss or expiry."""
+        offers = self.get(key)
+        if offers is not None:
+            return offers
+        # Pricing may be slow (vendor calls) — don't hold the lock for it
+        return self.put(key, price())
+
+    def get(self, key: tuple) -> Optional[list[Offer]]:
+        """Cached offers for `key`, or None on a miss or expiry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, offers: list[Offer]) -> list[Offer]:
+        """Cache freshly priced offers under `key` and snapshot each under a new offer_id."""
+        if not offers:
+            return offers
+
+        now = time.monotonic()
+        with self._lock:
+            version = next(self._versions)
+            for n, offer in enumerate(offers):
+                offer.offer_id = f"{offer.product_id}:{offer.quantity}:v{version}:{n}"
+                self._snapshots[offer.offer_id] = (now + self.snapshot_ttl, offer)
+
+            self._entries[key] = (now + self.ttl, offers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._evict_snapshots(now)
+
+        return list(offers)
+
+    def snapshot(self, offer_id: str) -> Optional[Offer]:
+        """The exact offer quoted under `offer_id`, or None once it has expired."""
+        with self._lock:
+            entry = self._snapshots.get(offer_id)
+            if not entry or entry[0] <= time.monotonic():
+                return None
+            return entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._snapshots.clear()
+
+    def _evict_snapshots(self, now: float) -> None:
+        # Snapshots are inserted in expiry order, so stop at the first live one
+        while self._snapshots:
+            offer_id, (expires_at, _) = next(iter(self._snapshots.items()))
+            if expires_at > now and len(self._snapshots) <= self.max_entries * 8:
+                break
+            del self._snapshots[offer_id]
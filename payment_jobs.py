@@ -0,0 +1,229 @@
+"""
+Payment Jobs — /checkout queues the payment and returns at once; a small
+pool of workers makes the WorldPay call while the client polls for the
+outcome, so no web request sits open for the gateway round trip.
+
+Each job is keyed by a client-supplied idempotency key, one per Pay attempt.
+A repeated /checkout with a key the session has already used gets the
+existing job back instead of a second authorisation. The job id is also the
+WorldPay transactionReference.
+
+Job status is kept in the session (see session_store.py), so any worker
+sharing the session store can answer a status poll. Card details never are:
+they stay in this process's queue and are dropped once the call is made.
+
+A job still pending PAYMENT_JOB_DEADLINE seconds after submission (its
+worker crashed, or shutdown dropped it) is reported as "unknown": the card
+may or may not have been charged, so it's never retried automatically. A
+result that arrives late still replaces it.
+"""
+import os
+import math
+import time
+import uuid
+import asyncio
+import logging
+from typing import Optional
+
+from admission import Overloaded, BUSY_MESSAGE
+from metrics import PAYMENT_QUEUE_SECONDS, PAYMENT_JOBS
+from payment_service import PaymentService, payment_service, WORLDPAY_MAX_CONNECTIONS
+from session_store import session_store
+
+logger = logging.getLogger(__name__)
+
+# Concurrent gateway calls; more than the pooled connections would only queue in httpx
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", str(WORLDPAY_MAX_CONNECTIONS)))
+PAYMENT_QUEUE_SIZE = int(os.getenv("PAYMENT_QUEUE_SIZE", "256"))
+# Finished jobs remembered per session, for status polls and retried submissions
+PAYMENT_JOBS_KEPT = int(os.getenv("PAYMENT_JOBS_KEPT", "20"))
+# On shutdown, wait this long for queued payments before dropping them
+PAYMENT_DRAIN_TIMEOUT = float(os.getenv("PAYMENT_DRAIN_TIMEOUT", "30"))
+# Longer than a queue wait plus the gateway's connect + read timeouts
+PAYMENT_JOB_DEADLINE = float(os.getenv("PAYMENT_JOB_DEADLINE", "120"))
+
+UNKNOWN_MESSAGE = (
+    "We couldn't confirm whether this payment went through. "
+    "Please check your card statement before trying again."
+)
+
+
+class PaymentJob:
+    """A queued payment; `card` holds the card fields until the call is made."""
+
+    def __init__(self, job_id: str, session_id: str, offer: dict, quoted: dict, card: dict):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.offer = offer  # what is charged
+        self.quoted = quoted  # the session's best_offer at submission, cleared on success
+        self.card: Optional[dict] = card
+        self.enqueued = time.monotonic()
+
+
+class PaymentQueue:
+    def __init__(
+        self,
+        payments: PaymentService = payment_service,
+        workers: int = PAYMENT_WORKERS,
+        queue_size: int = PAYMENT_QUEUE_SIZE,
+        jobs_kept: int = PAYMENT_JOBS_KEPT,
+        deadline: float = PAYMENT_JOB_DEADLINE,
+    ):
+        self.payments = payments
+        self.workers = workers
+        self.queue_size = queue_size
+        self.jobs_kept = jobs_kept
+        self.deadline = deadline
+        self.service_time = 1.0  # moving average of seconds per payment
+        self.processed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+
+    # ── Submission ──────────────────────────────────────────────────────────
+
+    def find(self, session: dict, idempotency_key: str) -> Optional[dict]:
+        """The session's job for this key, if it was already submitted."""
+        record = next((job for job in session.get("payments", {}).values() if job["idempotency_key"] == idempotency_key), None)
+        if record is not None:
+            PAYMENT_JOBS.inc(status="duplicate")
+            self._expire(record)
+        return record
+
+    def submit(self, session_id: str, session: dict, offer: dict, card: dict, idempotency_key: str) -> dict:
+        """
+        Queue a payment for `offer` and record it in `session` (the caller
+        holds the session lock and saves it). Returns the job record; raises
+        Overloaded (503) when the queue is full.
+        """
+        self._start()
+        job = PaymentJob(str(uuid.uuid4()), session_id, offer, session.get("best_offer"), card)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            PAYMENT_JOBS.inc(status="rejected")
+            logger.warning(f"Payment queue full ({self.queue_size} jobs); rejecting checkout")
+            raise Overloaded(503, self._retry_after(), BUSY_MESSAGE)
+        PAYMENT_JOBS.inc(status="queued")
+
+        record = {
+            "job_id": job.job_id,
+            "idempotency_key": idempotency_key,
+            "status": "pending",
+            "created_at": time.time(),
+        }
+        payments = session.setdefault("payments", {})
+        payments[job.job_id] = record
+        self._trim(payments)
+        return record
+
+    def public(self, record: dict) -> dict:
+        """Client view of a job record; `success` is None while it's pending or unknown."""
+        self._expire(record)
+        payload = {k: v for k, v in record.items() if k not in ("idempotency_key", "created_at")}
+        payload["success"] = {"succeeded": True, "failed": False}.get(record["status"])
+        return payload
+
+    # ── Workers ─────────────────────────────────────────────────────────────
+
+    def _start(self) -> None:
+        """Create the queue and workers on first use, on the running loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Let queued payments finish (up to PAYMENT_DRAIN_TIMEOUT), then stop the workers."""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), PAYMENT_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Shutting down with {self._queue.qsize()} payment jobs still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue, self._tasks = None, []
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._finish(job, await self._pay(job))
+            except Exception as e:
+                # Only the session store can get here; the outcome is in the payment logs
+                logger.exception(f"Payment job {job.job_id} could not be recorded: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _pay(self, job: PaymentJob) -> dict:
+        PAYMENT_QUEUE_SECONDS.observe(time.monotonic() - job.enqueued)
+        started = time.monotonic()
+        card, job.card = job.card, None
+        product_name = job.offer.get("product_name", "Shopping purchase")
+        try:
+            result = await self.payments.aprocess_payment(
+                amount=job.offer.get("total_price", job.offer["final_price"]),
+                description=product_name[:24],
+                transaction_ref=job.job_id,
+                **card,
+            )
+        except Exception as e:
+            logger.exception(f"Payment job {job.job_id} failed: {e}")
+            return {"success": False, "message": "An unexpected payment error occurred."}
+        # Smooth so one slow payment doesn't swing Retry-After
+        self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - started)
+        if result["success"]:
+            result = {**result, "message": f"🎉 Order confirmed for **{product_name}**! {result['message']}"}
+        return result
+
+    async def _finish(self, job: PaymentJob, result: dict) -> None:
+        """Record the outcome in the session and, on success, clear the offer that was paid for."""
+        self.processed += 1
+        status = "succeeded" if result["success"] else "failed"
+        PAYMENT_JOBS.inc(status=status)
+        async with session_store.lock(job.session_id):
+            session = await session_store.aget_or_create(job.session_id)
+            record = session.setdefault("payments", {}).setdefault(
+                job.job_id, {"job_id": job.job_id, "idempotency_key": None, "created_at": time.time()})
+            record.update(
+                status=status,
+                message=result["message"],
+                transaction_id=result.get("transaction_id"),
+                worldpay_outcome=result.get("worldpay_outcome"),
+            )
+            # A chat may have quoted something else meanwhile — keep that
+            if result["success"] and session.get("best_offer") == job.quoted:
+                session["best_offer"] = None
+            self._trim(session["payments"])
+            await session_store.asave(job.session_id, session)
+        logger.info(f"Payment job {job.job_id} {status}")
+
+    def _expire(self, record: dict) -> None:
+        """Mark a job pending past the deadline as unknown; its worker is gone."""
+        if record["status"] == "pending" and time.time() - record["created_at"] > self.deadline:
+            logger.warning(f"Payment job {record['job_id']} still pending after {self.deadline:.0f}s; outcome unknown")
+            record.update(status="unknown", message=UNKNOWN_MESSAGE)
+
+    def _trim(self, payments: dict) -> None:
+        """Drop the oldest settled jobs beyond jobs_kept (pending ones stay until their deadline)."""
+        for job in payments.values():
+            self._expire(job)
+        finished = [job_id for job_id, job in payments.items() if job["status"] != "pending"]
+        for job_id in finished[:max(0, len(payments) - self.jobs_kept)]:
+            del payments[job_id]
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue ahead of a new payment should have drained."""
+        return max(1, min(60, math.ceil(self.service_time * self._queue.qsize() / max(self.workers, 1))))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "processed": self.processed,
+            "service_time_s": round(self.service_time, 3),
+        }
+
+
+payment_jobs = PaymentQueue()
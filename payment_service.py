@@ -5,16 +5,20 @@ Uses the WorldPay Access API (v7) to authorize card payments with auto-settlemen
 Sandbox: https://try.access.worldpay.com
 Production: https://access.worldpay.com
 
-Credentials are loaded from environment variables (see .env).
+Credentials are loaded from environment variables (main.py loads .env).
+Both the sync and async paths reuse pooled keep-alive connections; the
+HTTP libraries are imported when the first payment is made, not at startup.
 """
 import os
 import uuid
 import logging
-import requests
+from typing import TYPE_CHECKING, Optional
 from base64 import b64encode
-from dotenv import load_dotenv
+from metrics import span, PAYMENT_SECONDS
 
-load_dotenv()
+if TYPE_CHECKING:
+    import httpx
+    import requests
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +28,10 @@ WORLDPAY_USERNAME = os.getenv("WORLDPAY_USERNAME", "")
 WORLDPAY_PASSWORD = os.getenv("WORLDPAY_PASSWORD", "")
 WORLDPAY_MERCHANT_ENTITY = os.getenv("WORLDPAY_MERCHANT_ENTITY", "")
 
+WORLDPAY_CONNECT_TIMEOUT = float(os.getenv("WORLDPAY_CONNECT_TIMEOUT", "5"))
+WORLDPAY_READ_TIMEOUT = float(os.getenv("WORLDPAY_READ_TIMEOUT", "30"))
+WORLDPAY_MAX_CONNECTIONS = int(os.getenv("WORLDPAY_MAX_CONNECTIONS", "20"))
+
 API_VERSION = "application/vnd.worldpay.payments-v7+json"
 
 
@@ -36,6 +44,47 @@ def _basic_auth_header() -> str:
 class PaymentService:
     """Processes card payments through the WorldPay Access API."""
 
+    def __init__(self, base_url: str = WORLDPAY_BASE_URL):
+        self.base_url = base_url
+        # Credentials don't change at runtime — build the headers once
+        self._headers = {
+            "Authorization": _basic_auth_header(),
+            "Content-Type": API_VERSION,
+            "Accept": API_VERSION,
+        }
+        self._session: Optional["requests.Session"] = None
+        self._async_client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def session(self) -> "requests.Session":
+        """Keep-alive session for the synchronous path."""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update(self._headers)
+        return self._session
+
+    @property
+    def async_client(self) -> "httpx.AsyncClient":
+        """Pooled keep-alive client reused across payments, so TLS is negotiated once."""
+        if self._async_client is None:
+            import httpx
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers,
+                timeout=httpx.Timeout(WORLDPAY_READ_TIMEOUT, connect=WORLDPAY_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=WORLDPAY_MAX_CONNECTIONS,
+                    max_keepalive_connections=WORLDPAY_MAX_CONNECTIONS,
+                ),
+            )
+        return self._async_client
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
     def process_payment(
         self,
         amount: float,
@@ -44,6 +93,7 @@ class PaymentService:
         card_expiry: str = "",
         card_cvc: str = "",
         description: str = "AI Shopping Agent purchase",
+        transaction_ref: Optional[str] = None,
     ) -> dict:
         """
         Authorize (and auto-settle) a card payment via WorldPay.
@@ -55,29 +105,109 @@ class PaymentService:
             card_expiry:  Expiry in MM/YY or MM / YY format.
             card_cvc:     3-digit CVC code.
             description:  Narrative shown on the cardholder statement.
+            transaction_ref: WorldPay transactionReference; reuse it when
+                          re-sending the same payment (default: a new UUID).
 
         Returns:
             dict with 'success', 'transaction_id', 'message', and optionally
             'worldpay_outcome' and 'risk_factors'.
         """
+        request = self._build_request(amount, card_type, card_number, card_expiry, card_cvc, description, transaction_ref)
+        if "error" in request:
+            return request["error"]
+
+        # ── Call WorldPay API ───────────────────────────────────────────────
+        import requests
+        with span(PAYMENT_SECONDS) as s:
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/payments/authorizations",
+                    json=request["payload"],
+                    timeout=(WORLDPAY_CONNECT_TIMEOUT, WORLDPAY_READ_TIMEOUT),
+                )
+                response_data = response.json() if response.content else {}
+            except requests.exceptions.Timeout:
+                logger.error("WorldPay API timeout")
+                s["outcome"] = "timeout"
+                return self._timeout_error()
+            except requests.exceptions.ConnectionError as e:
+                logger.error(f"WorldPay connection error: {e}")
+                s["outcome"] = "connection_error"
+                return self._connection_error()
+            except Exception as e:
+                logger.error(f"WorldPay unexpected error: {e}")
+                s["outcome"] = "error"
+                return self._unexpected_error()
+
+            s["outcome"] = response_data.get("outcome") or f"http_{response.status_code}"
+            return self._parse_response(request, response.status_code, response_data)
+
+    async def aprocess_payment(
+        self,
+        amount: float,
+        card_type: str,
+        card_number: str,
+        card_expiry: str = "",
+        card_cvc: str = "",
+        description: str = "AI Shopping Agent purchase",
+        transaction_ref: Optional[str] = None,
+    ) -> dict:
+        """Async variant of process_payment() on the pooled client; same arguments and result."""
+        request = self._build_request(amount, card_type, card_number, card_expiry, card_cvc, description, transaction_ref)
+        if "error" in request:
+            return request["error"]
+
+        # ── Call WorldPay API ───────────────────────────────────────────────
+        import httpx
+        with span(PAYMENT_SECONDS) as s:
+            try:
+                response = await self.async_client.post("/payments/authorizations", json=request["payload"])
+                response_data = response.json() if response.content else {}
+            except httpx.TimeoutException:
+                logger.error("WorldPay API timeout")
+                s["outcome"] = "timeout"
+                return self._timeout_error()
+            except httpx.TransportError as e:
+                logger.error(f"WorldPay connection error: {e}")
+                s["outcome"] = "connection_error"
+                return self._connection_error()
+            except Exception as e:
+                logger.error(f"WorldPay unexpected error: {e}")
+                s["outcome"] = "error"
+                return self._unexpected_error()
+
+            s["outcome"] = response_data.get("outcome") or f"http_{response.status_code}"
+            return self._parse_response(request, response.status_code, response_data)
+
+    def _build_request(
+        self,
+        amount: float,
+        card_type: str,
+        card_number: str,
+        card_expiry: str,
+        card_cvc: str,
+        description: str,
+        transaction_ref: Optional[str] = None,
+    ) -> dict:
+        """Validate card input and build the WorldPay payload, or return {'error': result}."""
         # ── Input validation ────────────────────────────────────────────────
         if card_type not in ("Visa", "Mastercard"):
-            return {
+            return {"error": {
                 "success": False,
                 "message": "Invalid card type. Only Visa and Mastercard are accepted.",
-            }
+            }}
 
         clean_number = card_number.replace(" ", "").replace("-", "")
         if not clean_number.isdigit() or len(clean_number) != 16:
-            return {"success": False, "message": "Invalid card number format."}
+            return {"error": {"success": False, "message": "Invalid card number format."}}
 
         # Parse expiry → month / year
         expiry_parts = card_expiry.replace(" ", "").split("/")
         if len(expiry_parts) != 2 or not all(p.isdigit() for p in expiry_parts):
-            return {
+            return {"error": {
                 "success": False,
                 "message": "Invalid expiry date. Please use MM/YY format.",
-            }
+            }}
         expiry_month = int(expiry_parts[0])
         expiry_year = int(expiry_parts[1])
         # Convert 2-digit year to 4-digit
@@ -86,10 +216,10 @@ class PaymentService:
 
         clean_cvc = card_cvc.replace(" ", "")
         if not clean_cvc.isdigit() or len(clean_cvc) not in (3, 4):
-            return {"success": False, "message": "Invalid CVC code."}
+            return {"error": {"success": False, "message": "Invalid CVC code."}}
 
         # ── Build WorldPay request ──────────────────────────────────────────
-        transaction_ref = str(uuid.uuid4())
+        transaction_ref = transaction_ref or str(uuid.uuid4())
         amount_in_cents = int(round(amount * 100))
 
         payload = {
@@ -120,70 +250,68 @@ class PaymentService:
             },
         }
 
-        headers = {
-            "Authorization": _basic_auth_header(),
-            "Content-Type": API_VERSION,
-            "Accept": API_VERSION,
-        }
-
-        url = f"{WORLDPAY_BASE_URL}/payments/authorizations"
-
         logger.info(
             f"WorldPay authorize request: {card_type} ending {clean_number[-4:]}, "
             f"${amount:.2f} (ref: {transaction_ref})"
         )
 
-        # ── Call WorldPay API ───────────────────────────────────────────────
-        try:
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            response_data = response.json() if response.content else {}
-        except requests.exceptions.Timeout:
-            logger.error("WorldPay API timeout")
-            return {
-                "success": False,
-                "message": "Payment gateway timed out. Please try again.",
-            }
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"WorldPay connection error: {e}")
-            return {
-                "success": False,
-                "message": "Unable to reach payment gateway. Please try again later.",
-            }
-        except Exception as e:
-            logger.error(f"WorldPay unexpected error: {e}")
-            return {
-                "success": False,
-                "message": "An unexpected payment error occurred.",
-            }
+        return {
+            "payload": payload,
+            "transaction_ref": transaction_ref,
+            "amount": amount,
+            "card_used": f"{card_type} ending in {clean_number[-4:]}",
+        }
 
+    def _parse_response(self, request: dict, status_code: int, response_data: dict) -> dict:
         logger.info(
-            f"WorldPay response: HTTP {response.status_code} — "
+            f"WorldPay response: HTTP {status_code} — "
             f"{response_data.get('outcome', 'no outcome')}"
         )
 
         # ── Parse response ──────────────────────────────────────────────────
         outcome = response_data.get("outcome", "")
 
-        if response.status_code in (200, 201) and outcome == "authorized":
+        if status_code in (200, 201) and outcome == "authorized":
             return {
                 "success": True,
-                "transaction_id": transaction_ref,
-                "amount": amount,
-                "card_used": f"{card_type} ending in {clean_number[-4:]}",
+                "transaction_id": request["transaction_ref"],
+                "amount": request["amount"],
+                "card_used": request["card_used"],
                 "message": "Payment authorized and settled successfully via WorldPay.",
                 "worldpay_outcome": outcome,
                 "risk_factors": response_data.get("riskFactors", []),
             }
 
         # Handle specific WorldPay decline / error outcomes
-        error_message = self._extract_error_message(response.status_code, response_data)
+        error_message = self._extract_error_message(status_code, response_data)
         return {
             "success": False,
-            "transaction_id": transaction_ref,
+            "transaction_id": request["transaction_ref"],
             "message": error_message,
             "worldpay_outcome": outcome,
         }
 
+    @staticmethod
+    def _timeout_error() -> dict:
+        return {
+            "success": False,
+            "message": "Payment gateway timed out. Please try again.",
+        }
+
+    @staticmethod
+    def _connection_error() -> dict:
+        return {
+            "success": False,
+            "message": "Unable to reach payment gateway. Please try again later.",
+        }
+
+    @staticmethod
+    def _unexpected_error() -> dict:
+        return {
+            "success": False,
+            "message": "An unexpected payment error occurred.",
+        }
+
     @staticmethod
     def _extract_error_message(status_code: int, data: dict) -> str:
         """Turn WorldPay error responses into user-friendly messages."""
@@ -0,0 +1,101 @@
+"""
+Response Cache — replays whole agent turns for repeated requests.
+
+Keyed by the normalised user message, the last few user/assistant texts,
+the pinned offer and the catalog version. An entry stores the tool plan
+(the calls made per iteration) and the final reply; on a hit the agent
+re-runs the tools for fresh UI data and returns the reply without calling
+the LLM.
+
+Only turns whose tools are deterministic for a given catalog version are
+stored, so a replayed reply never quotes a stale price.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_HISTORY = int(os.getenv("RESPONSE_CACHE_HISTORY", "2"))
+
+# Tools whose output depends only on their arguments and the catalog
+CACHEABLE_TOOLS = {"search_products"}
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s$.]", " ", (text or "").lower()).split()).strip(" .")
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, history_window: int = RESPONSE_CACHE_HISTORY):
+        self.max_entries = max_entries
+        self.history_window = history_window
+        self._entries: OrderedDict = OrderedDict()  # key → {"plan", "reply"}
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, user_message: str, history: list, catalog_version: int, pinned_offer: Optional[dict] = None) -> str:
+        recent = [
+            [m.get("role"), normalize_text(m.get("content"))]
+            for m in history
+            if m.get("role") in ("user", "assistant") and m.get("content")
+        ][-self.history_window:] if self.history_window else []
+        raw = json.dumps([
+            normalize_text(user_message),
+            recent,
+            catalog_version,
+            (pinned_offer or {}).get("offer_id"),
+        ])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key: str, catalog_version: int) -> Optional[dict]:
+        with self._lock:
+            self._check_version(catalog_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, catalog_version: int, plan: list, reply: str) -> bool:
+        """Store a finished turn; returns False if its tools make it uncacheable."""
+        if any(name not in CACHEABLE_TOOLS for calls in plan for name, _ in calls):
+            return False
+        with self._lock:
+            self._check_version(catalog_version)
+            self._entries[key] = {"plan": plan, "reply": reply}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def _check_version(self, catalog_version: int) -> None:
+        # Replies may describe catalog contents — drop everything when it changes
+        if catalog_version != self._version:
+            if self._entries:
+                logger.info(f"Catalog changed (v{catalog_version}); clearing {len(self._entries)} cached responses")
+            self._entries.clear()
+            self._version = catalog_version
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+response_cache = ResponseCache()
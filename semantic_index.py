@@ -0,0 +1,242 @@
+"""
+Semantic Index — optional embedding-based retrieval for CatalogService.search.
+
+Product texts (name, brand, category, description, tags) are embedded once
+into a row-normalised NumPy matrix, so a query is a single matrix-vector
+product followed by an argpartition top-k. The matrix is saved to
+SEMANTIC_INDEX_PATH with a fingerprint of the catalog and embedder, and
+reused on the next start unless either changed.
+
+Each row is keyed by a hash of the embedder and the product's text, so when
+the catalog changes only new or edited products are embedded again; rows
+for unchanged texts are copied from the previous (or saved) matrix.
+
+Embedders:
+  - "hash":   hashed word + character-trigram vectors (no extra services)
+  - "ollama": a local Ollama embedding model (EMBED_MODEL)
+
+Enable with SEMANTIC_SEARCH=hash|ollama. Requires numpy (imported only
+when semantic search is enabled); without it the catalog silently stays
+keyword-only.
+
+Compare against the keyword scorer with:
+    python semantic_index.py "comfy shoes for marathons"
+"""
+import os
+import re
+import zlib
+import hashlib
+import logging
+from typing import Optional
+
+np = None  # numpy, imported by load_numpy() — semantic search is optional
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_SEARCH = os.getenv("SEMANTIC_SEARCH", "off").lower()
+SEMANTIC_INDEX_PATH = os.getenv("SEMANTIC_INDEX_PATH", "semantic_index.npz")
+SEMANTIC_WEIGHT = float(os.getenv("SEMANTIC_WEIGHT", "2.0"))
+SEMANTIC_MIN_SIMILARITY = float(os.getenv("SEMANTIC_MIN_SIMILARITY", "0.2"))
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
+
+
+def load_numpy() -> bool:
+    """Import numpy on first use; False if it isn't installed."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+def product_text(product) -> str:
+    return " ".join([product.name, product.brand, product.category, product.description, *product.tags])
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and character trigrams into a fixed-size vector."""
+
+    def __init__(self, dims: int = 1024):
+        if not load_numpy():
+            raise ImportError("numpy is required for semantic search")
+        self.dims = dims
+        self.name = f"hash-{dims}"
+
+    def _features(self, text: str) -> list[str]:
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        features = list(words)
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: list[str]):
+        matrix = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode())
+                matrix[row, h % self.dims] += 1.0 if h & 0x80000000 else -1.0
+        return matrix
+
+
+class OllamaEmbedder:
+    """Embeddings from a local Ollama model."""
+
+    def __init__(self, model: str = EMBED_MODEL):
+        if not load_numpy():
+            raise ImportError("numpy is required for semantic search")
+        self.model = model
+        self.name = f"ollama-{model}"
+
+    def embed(self, texts: list[str]):
+        import ollama
+        response = ollama.embed(model=self.model, input=texts)
+        return np.asarray(response["embeddings"], dtype=np.float32)
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _row_key(embedder, text: str) -> str:
+    return hashlib.sha1(f"{embedder.name}\0{text}".encode()).hexdigest()
+
+
+class SemanticIndex:
+    """Immutable once built: updates return a new index, so searches in flight keep a consistent matrix."""
+
+    def __init__(self, ids: list[str], keys: list[str], matrix, embedder):
+        self.ids = ids
+        self.keys = keys  # _row_key per row
+        self.rows = {pid: i for i, pid in enumerate(ids)}
+        self.matrix = matrix
+        self.embedder = embedder
+
+    @classmethod
+    def load_or_build(
+        cls, products, embedder, path: Optional[str] = SEMANTIC_INDEX_PATH, previous: Optional["SemanticIndex"] = None,
+    ) -> "SemanticIndex":
+        """
+        Reuse the on-disk matrix when it matches this catalog and embedder;
+        else embed what `previous` (or the saved matrix) doesn't already
+        have a row for, and save the result.
+        """
+        products = list(products)
+        ids = [p.id for p in products]
+        texts = [product_text(p) for p in products]
+        keys = [_row_key(embedder, text) for text in texts]
+        fingerprint = hashlib.sha1("\0".join([*ids, *keys]).encode()).hexdigest()
+
+        if path and os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    if str(data["fingerprint"]) == fingerprint:
+                        logger.info(f"Loaded semantic index from {path}")
+                        return cls(ids, keys, data["matrix"], embedder)
+                    if previous is None and "keys" in data:
+                        previous = cls(data["ids"].tolist(), data["keys"].tolist(), data["matrix"], embedder)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable semantic index {path}: {e}")
+
+        matrix, embedded = cls._embed_rows(keys, texts, embedder, previous)
+        if path:
+            np.savez(path, matrix=matrix, ids=np.array(ids), keys=np.array(keys), fingerprint=np.array(fingerprint))
+            logger.info(f"Built semantic index for {len(ids)} products ({embedded} embedded) → {path}")
+        return cls(ids, keys, matrix, embedder)
+
+    @staticmethod
+    def _embed_rows(keys: list[str], texts: list[str], embedder, previous: Optional["SemanticIndex"]):
+        """Matrix for `keys`, copying rows `previous` has and embedding the rest; returns (matrix, rows embedded)."""
+        known = {key: row for row, key in enumerate(previous.keys)} if previous is not None else {}
+        missing = [i for i, key in enumerate(keys) if key not in known]
+        fresh = _normalize(embedder.embed([texts[i] for i in missing])) if missing else None
+        if not keys:
+            return np.zeros((0, 1), dtype=np.float32), 0
+        width = fresh.shape[1] if fresh is not None else previous.matrix.shape[1]
+        matrix = np.empty((len(keys), width), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in known:
+                matrix[i] = previous.matrix[known[key]]
+        if missing:
+            matrix[missing] = fresh
+        return matrix, len(missing)
+
+    def with_product(self, product) -> "SemanticIndex":
+        """A copy with `product` added or updated; only its text is embedded, and only if it changed."""
+        text = product_text(product)
+        key = _row_key(self.embedder, text)
+        row = self.rows.get(product.id)
+        if row is not None and self.keys[row] == key:
+            return self
+        vector = _normalize(self.embedder.embed([text]))
+        if row is not None:
+            matrix = self.matrix.copy()
+            matrix[row] = vector[0]
+            keys = self.keys.copy()
+            keys[row] = key
+            return SemanticIndex(self.ids, keys, matrix, self.embedder)
+        matrix = np.vstack([self.matrix, vector]) if self.ids else vector
+        return SemanticIndex([*self.ids, product.id], [*self.keys, key], matrix, self.embedder)
+
+    def without(self, product_id: str) -> "SemanticIndex":
+        """A copy without `product_id`'s row (no embedding)."""
+        row = self.rows.get(product_id)
+        if row is None:
+            return self
+        return SemanticIndex(
+            self.ids[:row] + self.ids[row + 1:], self.keys[:row] + self.keys[row + 1:],
+            np.delete(self.matrix, row, axis=0), self.embedder,
+        )
+
+    def similarities(self, query: str):
+        """Cosine similarity of `query` to every product, aligned with self.ids."""
+        if not len(self.ids):
+            return np.zeros(0, dtype=np.float32)
+        q = _normalize(self.embedder.embed([query])[0])
+        return self.matrix @ q
+
+    def top_k(self, sims, k: int) -> list[str]:
+        """Ids of the k most similar products above SEMANTIC_MIN_SIMILARITY, best first."""
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+        idx = np.argpartition(-sims, k - 1)[:k]
+        idx = idx[np.argsort(-sims[idx], kind="stable")]
+        return [self.ids[i] for i in idx if sims[i] >= SEMANTIC_MIN_SIMILARITY]
+
+
+def embedder_from_env():
+    """Embedder named by SEMANTIC_SEARCH, or None when semantic search is off or numpy is missing."""
+    if SEMANTIC_SEARCH in ("", "off", "false", "0"):
+        return None
+    if not load_numpy():
+        logger.warning("SEMANTIC_SEARCH is set but numpy is not installed; using keyword search only")
+        return None
+    if SEMANTIC_SEARCH == "ollama":
+        return OllamaEmbedder()
+    return HashingEmbedder()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from catalog_service import CatalogService
+
+    queries = sys.argv[1:] or ["comfy shoes for marathons", "books about habits", "brooks", "learn to code"]
+    keyword = CatalogService(semantic=False)
+    semantic = CatalogService(semantic=True)
+    semantic.search("warm up")
+
+    for query in queries:
+        print(f"\n{query!r}")
+        for label, service in (("keyword", keyword), ("blended", semantic)):
+            start = time.perf_counter()
+            for _ in range(200):
+                results = service.search(query)
+            per_query = (time.perf_counter() - start) / 200 * 1e6
+            print(f"  {label:8} {per_query:8.1f} µs  {[p.id for p in results]}")
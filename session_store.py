@@ -0,0 +1,270 @@
+"""
+Session Store — where per-session chat history and the active offer live.
+
+  - MemorySessionStore: in-process LRU with idle TTL (single worker)
+  - SQLiteSessionStore: JSON rows in a SQLite file shared by every uvicorn
+    worker, with lease-based per-session locks across processes. The lease
+    is renewed while its block runs, so a turn may outlast SESSION_LOCK_TTL
+    (10 LLM iterations, each queued up to LLM_QUEUE_TIMEOUT, easily do); the
+    TTL only bounds how long a crashed worker's lock outlives it
+
+Both expose lock(session_id), an async context manager that serialises
+/chat and /checkout for the same session so they never race on history
+or best_offer. Async code uses aget / asave / aget_or_create: the SQLite
+backend runs its queries on one dedicated thread, so a write lock held by
+another worker (up to the 10s busy timeout) never blocks the event loop.
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+from metrics import span, SESSION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+# A crashed worker's session lock is reclaimed after this many seconds; a live
+# holder renews it every SESSION_LOCK_TTL / 3, however long its turn runs
+SESSION_LOCK_TTL = float(os.getenv("SESSION_LOCK_TTL", "120"))
+
+
+class LeaseLost(RuntimeError):
+    """The session's lock lease expired and was taken by another worker; the turn must not be saved."""
+
+
+def new_session() -> dict:
+    return {"history": [], "best_offer": None}
+
+
+class SessionStore(ABC):
+    """Interface every session backend implements."""
+
+    backend = "memory"  # label for session_store_seconds
+
+    def __init__(self):
+        # One asyncio.Lock per active session; entries vanish once unused
+        self._locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    def get_or_create(self, session_id: str) -> dict:
+        with span(SESSION_SECONDS, store=self.backend, operation="lookup"):
+            session = self.get(session_id)
+            if session is None:
+                session = new_session()
+                self.save(session_id, session)
+            return session
+
+    # ── Async access (what request handlers use) ────────────────────────────
+
+    async def _run(self, func, *args):
+        """Run a storage call for async code; in-memory backends just call it."""
+        return func(*args)
+
+    async def aget(self, session_id: str) -> Optional[dict]:
+        return await self._run(self.get, session_id)
+
+    async def asave(self, session_id: str, session: dict) -> None:
+        await self._run(self.save, session_id, session)
+
+    async def aget_or_create(self, session_id: str) -> dict:
+        return await self._run(self.get_or_create, session_id)
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        """Hold the session's lock for the block; time spent waiting for it is recorded."""
+        started = time.perf_counter()
+        async with self._acquire(session_id):
+            SESSION_SECONDS.observe(time.perf_counter() - started, store=self.backend, operation="lock_wait")
+            yield
+
+    @asynccontextmanager
+    async def _acquire(self, session_id: str):
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        async with lock:
+            yield
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_sessions: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict = OrderedDict()  # id → (last_used, session)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._sessions[session_id]
+            return None
+        self._sessions[session_id] = (time.monotonic(), entry[1])
+        self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    def save(self, session_id: str, session: dict) -> None:
+        self._sessions[session_id] = (time.monotonic(), session)
+        self._sessions.move_to_end(session_id)
+        self._evict()
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_used <= self.ttl:
+                break
+            del self._sessions[session_id]
+
+
+class SQLiteSessionStore(SessionStore):
+    backend = "sqlite"
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)",
+        "CREATE TABLE IF NOT EXISTS session_locks (id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+    )
+    _PURGE_INTERVAL = 60.0
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: float = SESSION_TTL, lock_ttl: float = SESSION_LOCK_TTL):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self._owner = f"{os.getpid()}:{id(self)}"
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_lock = threading.Lock()
+        self._last_purge = 0.0
+        # Sessions held by this process whose lease another worker has since taken
+        self._lost: set[str] = set()
+        # sqlite3 calls block (up to the busy timeout); keep them off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-db")
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._conn_lock:
+            return self.conn.execute(sql, params)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        self._purge_expired()
+        row = self._execute(
+            "SELECT data FROM sessions WHERE id = ? AND updated_at > ?",
+            (session_id, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, session: dict) -> None:
+        if session_id in self._lost:
+            raise LeaseLost(f"Lock on session {session_id} was lost; not saving over the new holder's changes")
+        self._execute(
+            "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(session), time.time()),
+        )
+
+    def delete(self, session_id: str) -> None:
+        self._execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        if now - self._last_purge < self._PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self._execute("DELETE FROM sessions WHERE updated_at <= ?", (now - self.ttl,))
+        self._execute("DELETE FROM session_locks WHERE expires_at <= ?", (now,))
+
+    def _try_acquire(self, session_id: str) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO session_locks (id, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE session_locks.expires_at <= ?",
+            (session_id, self._owner, now + self.lock_ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def _renew(self, session_id: str) -> bool:
+        cursor = self._execute(
+            "UPDATE session_locks SET expires_at = ? WHERE id = ? AND owner = ?",
+            (time.time() + self.lock_ttl, session_id, self._owner),
+        )
+        return cursor.rowcount == 1
+
+    def _release(self, session_id: str) -> None:
+        self._execute("DELETE FROM session_locks WHERE id = ? AND owner = ?", (session_id, self._owner))
+
+    async def _heartbeat(self, session_id: str) -> None:
+        """Keep the lease alive while the block runs; flag the session if it was taken meanwhile."""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            if not await self._run(self._renew, session_id):
+                logger.error(f"Session {session_id}: lock lease lost to another worker; the turn won't be saved")
+                self._lost.add(session_id)
+                return
+
+    @asynccontextmanager
+    async def _acquire(self, session_id: str):
+        # In-process lock first so local requests queue without polling the DB
+        async with super()._acquire(session_id):
+            while not await self._run(self._try_acquire, session_id):
+                await asyncio.sleep(0.05)
+            heartbeat = asyncio.create_task(self._heartbeat(session_id))
+            try:
+                yield
+            finally:
+                heartbeat.cancel()
+                if session_id in self._lost:
+                    self._lost.discard(session_id)
+                else:
+                    await self._run(self._release, session_id)
+
+
+def session_store_from_env() -> SessionStore:
+    """Pick the backend named by SESSION_STORE (memory | sqlite)."""
+    if SESSION_STORE == "sqlite":
+        return SQLiteSessionStore(SESSION_DB_PATH)
+    return MemorySessionStore()
+
+
+session_store = session_store_from_env()
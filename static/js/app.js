@@ -129,58 +129,108 @@ async function sendMessage() {
     appendUserMsg(text);
     setThinking(true);
 
-    // Show immediate thinking animation
+    // Show immediate thinking animation; steps are filled in as they stream
     const thinkingEl = appendThinkingMsg([]);
+    const steps = [];
+    let replyEl = null;
+    let replyText = '';
+    let finished = false;
 
     try {
-        const res = await fetch('/chat', {
+        const res = await fetch('/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ message: text, session_id: sessionId }),
         });
-        const data = await res.json();
-
-        // Replace thinking animation with real thinking steps
-        thinkingEl.remove();
-        if (data.thinking_steps && data.thinking_steps.length > 0) {
-            appendThinkingMsg(data.thinking_steps);
-        }
-
-        // Build bot reply
-        let replyHtml = markdownText(data.reply);
-
-        // Show search result cards with product images
-        if (data.search_results && data.search_results.length > 0 && !data.offer_details) {
-            replyHtml += buildSearchResultCards(data.search_results);
-        }
-
-        // Show product card if we have a NEW offer
-        if (data.offer_details) {
-            replyHtml += buildProductCard(data.offer_details);
-        }
 
-        // Always sync the current contextual offer from backend session
-        if (data.current_context_offer) {
-            currentOffer = data.current_context_offer;
+        // Empty messages get a plain JSON reply instead of a stream
+        if (!res.headers.get('Content-Type').includes('ndjson')) {
+            const data = await res.json();
+            thinkingEl.remove();
+            appendBotMsg(markdownText(data.reply));
+            setThinking(false);
+            return;
         }
 
-        const msgEl = appendBotMsg(replyHtml);
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        const handleEvent = (evt) => {
+            if (evt.event === 'thinking') {
+                steps.push(evt.step);
+                thinkingEl.querySelector('.msg-content').innerHTML =
+                    steps.map(s => `<div class="thinking-step">${markdownText(s)}</div>`).join('');
+                scrollBottom();
+            } else if (evt.event === 'token') {
+                replyText += evt.content;
+                if (!replyEl) replyEl = appendBotMsg('');
+                replyEl.querySelector('.msg-content').innerHTML = markdownText(replyText);
+                scrollBottom();
+            } else if (evt.event === 'search_results' || evt.event === 'offer_details') {
+                // Text streamed before a tool call is superseded by the next reply
+                if (replyEl) replyEl.remove();
+                replyEl = null;
+                replyText = '';
+            } else if (evt.event === 'done') {
+                finished = true;
+                if (steps.length === 0) thinkingEl.remove();
+                if (replyEl) replyEl.remove();
+                renderReply(evt);
+            }
+        };
 
-        // Auto-trigger checkout if signaled by agent
-        if (data.trigger_checkout) {
-            console.log('trigger_checkout signal received, data:', data);
-            console.log('currentOffer before showCheckout:', currentOffer);
-            showCheckout();
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (line.trim()) handleEvent(JSON.parse(line));
+            }
         }
+        if (buffer.trim()) handleEvent(JSON.parse(buffer));
+        if (!finished) throw new Error('stream ended early');
 
     } catch (err) {
         thinkingEl.remove();
+        if (replyEl) replyEl.remove();
         appendBotMsg("Sorry, I'm having trouble reaching my backend. Please try again.");
     }
 
     setThinking(false);
 }
 
+function renderReply(data) {
+    // Build bot reply
+    let replyHtml = markdownText(data.reply);
+
+    // Show search result cards with product images
+    if (data.search_results && data.search_results.length > 0 && !data.offer_details) {
+        replyHtml += buildSearchResultCards(data.search_results);
+    }
+
+    // Show product card if we have a NEW offer
+    if (data.offer_details) {
+        replyHtml += buildProductCard(data.offer_details);
+    }
+
+    // Always sync the current contextual offer from backend session
+    if (data.current_context_offer) {
+        currentOffer = data.current_context_offer;
+    }
+
+    appendBotMsg(replyHtml);
+
+    // Auto-trigger checkout if signaled by agent
+    if (data.trigger_checkout) {
+        console.log('trigger_checkout signal received, data:', data);
+        console.log('currentOffer before showCheckout:', currentOffer);
+        showCheckout();
+    }
+}
+
 function handleKeyPress(e) {
     if (e.key === 'Enter') sendMessage();
 }
@@ -226,6 +276,34 @@ function cancelCheckout() {
     checkoutPanel.classList.add('hidden');
 }
 
+// One idempotency key per payment attempt: re-sending it (double-click, retry
+// after a dropped response) returns the same job instead of charging again
+let checkoutKey = null;
+
+function newCheckoutKey() {
+    return window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).substring(2);
+}
+
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+// Poll a queued payment until the worker has a result. The server reports a
+// job it lost track of as "unknown" after PAYMENT_JOB_DEADLINE (120s); stop a
+// little after that either way
+const PAYMENT_POLL_LIMIT_MS = 150000;
+
+async function waitForPayment(jobId) {
+    const giveUp = Date.now() + PAYMENT_POLL_LIMIT_MS;
+    for (let delay = 250; Date.now() < giveUp; delay = Math.min(delay * 2, 2000)) {
+        await sleep(delay);
+        const res = await fetch(`/checkout/status/${encodeURIComponent(jobId)}?session_id=${encodeURIComponent(sessionId)}`);
+        const data = await res.json();
+        if (!res.ok || data.status !== 'pending') return data;
+    }
+    return { status: 'pending', message: 'Your payment is still processing. Please check back before paying again.' };
+}
+
 async function processCheckout() {
     // Shipping address
     const shipName = document.getElementById('shipName').value.trim();
@@ -264,10 +342,11 @@ async function processCheckout() {
     payBtn.disabled = true;
     payBtn.textContent = '⏳ Processing…';
 
+    checkoutKey = checkoutKey || newCheckoutKey();
     try {
         const res = await fetch('/checkout', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': checkoutKey },
             body: JSON.stringify({
                 session_id: sessionId,
                 card_type: cardType,
@@ -284,7 +363,17 @@ async function processCheckout() {
                 },
             }),
         });
-        const data = await res.json();
+        let data = await res.json();
+        if (res.status === 429 || res.status === 503) {
+            // Turned away before charging — keep the form so the user can retry
+            const wait = res.headers.get('Retry-After');
+            alert(wait ? `${data.message} (try again in ${wait}s)` : data.message);
+            return;
+        }
+        if (data.status === 'pending') data = await waitForPayment(data.job_id);
+        // Settled either way, a new attempt (e.g. with another card) gets a new key;
+        // still pending, a retry must find the same job
+        if (data.status !== 'pending') checkoutKey = null;
         cancelCheckout();
         appendBotMsg(markdownText(data.message));
         if (data.success) currentOffer = null;
@@ -0,0 +1,126 @@
+"""AdmissionController: checkout priority, per-session 429 and queue 503s with Retry-After."""
+import asyncio
+
+import httpx
+import pytest
+
+from admission import AdmissionController, Overloaded, RouteLimit
+
+
+def _controller(max_concurrency: int = 1, chat_limit: int = 1, chat_queue: int = 4, queue_timeout: float = 5, **kwargs):
+    return AdmissionController(
+        [
+            RouteLimit("checkout", 1, 4, priority=0),
+            RouteLimit("chat", chat_limit, chat_queue, priority=1),
+        ],
+        max_concurrency=max_concurrency,
+        queue_timeout=queue_timeout,
+        **kwargs,
+    )
+
+
+def test_queued_checkout_is_admitted_before_queued_chat():
+    async def scenario():
+        controller = _controller()
+        running = await controller.enter("chat", "s0")
+        order = []
+
+        async def request(route: str, session_id: str):
+            ticket = await controller.enter(route, session_id)
+            order.append(route)
+            return ticket
+
+        chat = asyncio.create_task(request("chat", "s1"))
+        await asyncio.sleep(0)
+        checkout = asyncio.create_task(request("checkout", "s2"))
+        await asyncio.sleep(0)
+        assert controller.stats()["routes"]["chat"]["waiting"] == 1
+        assert controller.stats()["routes"]["checkout"]["waiting"] == 1
+
+        running.release()
+        (await checkout).release()
+        (await chat).release()
+        return order
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 5)) == ["checkout", "chat"]
+
+
+def test_chat_cannot_jump_a_waiting_checkout():
+    async def scenario():
+        controller = _controller(max_concurrency=3, chat_limit=2)
+        await controller.enter("checkout")
+        waiting_checkout = asyncio.create_task(controller.enter("checkout"))
+        await asyncio.sleep(0)
+        # Checkout is at its own limit, so its queued request doesn't hold chats back
+        await controller.enter("chat")
+        assert controller.active == 2
+
+        # Once checkout has room, a chat may not take the free shared slot ahead of it
+        controller.routes["checkout"].limit = 2
+        late_chat = asyncio.create_task(controller.enter("chat"))
+        await asyncio.sleep(0)
+        assert controller.stats()["routes"]["chat"]["waiting"] == 1
+        assert controller.active == 2
+        for task in (waiting_checkout, late_chat):
+            task.cancel()
+        await asyncio.gather(waiting_checkout, late_chat, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+
+
+def test_session_over_its_limit_gets_429():
+    async def scenario():
+        controller = _controller(max_concurrency=4, chat_limit=4, max_per_session=1)
+        ticket = await controller.enter("chat", "s1")
+        with pytest.raises(Overloaded) as rejected:
+            await controller.enter("chat", "s1")
+        assert rejected.value.status == 429 and rejected.value.retry_after == 1
+        # Other sessions are unaffected, and the session may continue once its request ends
+        (await controller.enter("chat", "s2")).release()
+        ticket.release()
+        (await controller.enter("chat", "s1")).release()
+        assert controller.routes["chat"].rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_gets_503_with_retry_after():
+    async def scenario():
+        controller = _controller(chat_queue=0)
+        await controller.enter("chat")
+        with pytest.raises(Overloaded) as rejected:
+            await controller.enter("chat")
+        assert rejected.value.status == 503 and rejected.value.retry_after >= 1
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_gets_503_and_leaves_the_queue():
+    async def scenario():
+        controller = _controller(queue_timeout=0.05)
+        await controller.enter("chat")
+        with pytest.raises(Overloaded) as rejected:
+            await controller.enter("chat")
+        assert rejected.value.status == 503 and rejected.value.retry_after >= 1
+        assert controller.stats()["routes"]["chat"]["waiting"] == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("session_id, status", [("busy", 429), ("other", 503)])
+def test_rejections_carry_retry_after_header(monkeypatch, session_id, status):
+    import main
+
+    controller = _controller(chat_queue=0, max_per_session=1)
+    monkeypatch.setattr(main, "admission", controller)
+
+    async def scenario():
+        await controller.enter("chat", "busy")
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/chat", json={"session_id": session_id, "message": "running shoes"})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == status
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["retry_after"] == int(response.headers["Retry-After"])
@@ -0,0 +1,71 @@
+"""/checkout replays: a repeated Idempotency-Key returns the same job and authorises once."""
+import uuid
+import asyncio
+
+import httpx
+
+import main
+from session_store import session_store, new_session
+
+OFFER = {"product_name": "Brooks Ghost 16", "vendor": "RunDirect", "final_price": 129.99, "total_price": 129.99}
+CARD = {"card_type": "VISA", "card_number": "4444333322221111", "card_expiry": "12/30", "card_cvc": "123"}
+
+
+class FakePayments:
+    """Stands in for PaymentService; each payment waits for `settle` so tests can replay while pending."""
+
+    def __init__(self):
+        self.calls = []
+        self.settle = asyncio.Event()
+
+    async def aprocess_payment(self, amount, transaction_ref=None, **kwargs):
+        self.calls.append(transaction_ref)
+        await self.settle.wait()
+        return {"success": True, "message": "Payment authorized.", "transaction_id": transaction_ref}
+
+
+async def _checkout_twice_then_replay(monkeypatch):
+    payments = FakePayments()
+    monkeypatch.setattr(main.payment_jobs, "payments", payments)
+    session_id = f"test-{uuid.uuid4()}"
+    session = new_session()
+    session["best_offer"] = dict(OFFER)
+    session_store.save(session_id, session)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def checkout(key: str) -> httpx.Response:
+            return await client.post(
+                "/checkout", json={"session_id": session_id, **CARD}, headers={"Idempotency-Key": key}
+            )
+
+        # A double-click: both requests carry the same key
+        first, second = await asyncio.gather(checkout("attempt-1"), checkout("attempt-1"))
+        assert sorted([first.status_code, second.status_code]) == [200, 202]
+        job_id = first.json()["job_id"]
+        assert second.json()["job_id"] == job_id
+        assert second.json()["status"] == "pending"
+
+        payments.settle.set()
+        for _ in range(100):
+            status = (await client.get(f"/checkout/status/{job_id}", params={"session_id": session_id})).json()
+            if status["status"] != "pending":
+                break
+            await asyncio.sleep(0.01)
+        assert status["status"] == "succeeded" and status["success"] is True
+
+        # A retry after the response was lost gets the settled job, not a new charge
+        replay = await checkout("attempt-1")
+        assert replay.status_code == 200
+        assert replay.json()["job_id"] == job_id and replay.json()["status"] == "succeeded"
+
+        # A new key is a new attempt; the paid offer is gone
+        fresh = await checkout("attempt-2")
+        assert fresh.json()["success"] is False
+
+    await main.payment_jobs.stop()
+    assert payments.calls == [job_id]
+
+
+def test_replayed_checkout_returns_the_same_job(monkeypatch):
+    asyncio.run(asyncio.wait_for(_checkout_twice_then_replay(monkeypatch), 10))
@@ -0,0 +1,102 @@
+"""BackendPool: fair queueing across sessions and taking failing hosts out of rotation."""
+import time
+import asyncio
+
+import pytest
+
+from llm_pool import Backend, BackendPool, PoolExhausted
+
+
+async def _serve_order(fair: bool) -> list[str]:
+    """Queue a1-a3 then b1 behind one busy slot and report the order they are served in."""
+    host = Backend("h1")
+    pool = BackendPool([host], max_outstanding=1, fair=fair)
+    await pool.aacquire("other")
+    order = []
+
+    async def call(session: str, label: str):
+        backend = await pool.aacquire(session)
+        order.append(label)
+        return backend
+
+    tasks = []
+    for session, label in (("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")):
+        tasks.append(asyncio.create_task(call(session, label)))
+        await asyncio.sleep(0)
+    assert pool.stats()["waiting"] == 4
+
+    for served in range(1, len(tasks) + 1):
+        pool.release(host)
+        while len(order) < served:
+            await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_fair_queue_rotates_sessions():
+    assert asyncio.run(asyncio.wait_for(_serve_order(fair=True), 5)) == ["a1", "b1", "a2", "a3"]
+
+
+def test_unfair_queue_is_first_come_first_served():
+    assert asyncio.run(asyncio.wait_for(_serve_order(fair=False), 5)) == ["a1", "a2", "a3", "b1"]
+
+
+def test_picks_least_outstanding_backend():
+    h1, h2 = Backend("h1"), Backend("h2")
+    pool = BackendPool([h1, h2], max_outstanding=2)
+    assert [pool.acquire() for _ in range(4)] == [h1, h2, h1, h2]
+
+
+def test_failing_host_cools_down_then_returns():
+    h1, h2 = Backend("h1"), Backend("h2")
+    pool = BackendPool([h1, h2], max_outstanding=4, failure_threshold=2, cooldown=0.1)
+    for _ in range(2):
+        pool.release(pool.acquire(avoid={h2}), failed=True)
+    assert not pool.stats()["backends"][0]["up"]
+
+    # h2 is busier, but h1 is out of rotation
+    held = [pool.acquire() for _ in range(3)]
+    assert held == [h2, h2, h2]
+
+    time.sleep(0.15)
+    assert pool.acquire() is h1
+    pool.release(h1)
+    assert h1.failures == 0 and pool.stats()["backends"][0]["up"]
+
+
+def test_success_resets_failure_count():
+    h1 = Backend("h1")
+    pool = BackendPool([h1], failure_threshold=2, cooldown=60)
+    pool.release(pool.acquire(), failed=True)
+    pool.release(pool.acquire())
+    pool.release(pool.acquire(), failed=True)
+    assert h1.failures == 1 and h1.down_until == 0.0
+
+
+def test_all_hosts_down_are_still_tried():
+    h1 = Backend("h1")
+    pool = BackendPool([h1], failure_threshold=1, cooldown=60)
+    pool.release(pool.acquire(), failed=True)
+    assert h1.down_until > time.monotonic()
+    assert pool.acquire() is h1
+
+
+def test_avoid_skips_hosts_already_tried():
+    h1, h2 = Backend("h1"), Backend("h2")
+    pool = BackendPool([h1, h2])
+    assert pool.acquire(avoid={h1}) is h2
+    # Nothing else left: an avoided host beats failing the call
+    assert pool.acquire(avoid={h1, h2}) in (h1, h2)
+
+
+def test_full_queue_and_timeout_raise_pool_exhausted():
+    pool = BackendPool([Backend("h1")], max_outstanding=1, queue_size=0, queue_timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolExhausted):
+        pool.acquire()
+    assert pool.rejected == 1
+
+    pool.queue_size = 1
+    with pytest.raises(PoolExhausted):
+        pool.acquire()
+    assert pool.stats()["waiting"] == 0
@@ -1,13 +1,19 @@
 """
 Consolidated Tool Registry — defines both schemas and implementations for the Shopping Agent.
 """
+import os
 import json
+import asyncio
 import logging
-from catalog_service import catalog_service
-from payment_service import payment_service
+from concurrent.futures import ThreadPoolExecutor
+from catalog_service import catalog_service, DEFAULT_SEARCH_RESULTS_LIMIT
+from metrics import span, TOOL_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# Feed the model pruned tool results (see encode_result); "false" sends the full JSON
+COMPACT_TOOL_RESULTS = os.getenv("COMPACT_TOOL_RESULTS", "true").lower() == "true"
+
 # ──────────────────────────────────────────────────────────────────────────────
 # TOOLS SCHEMA
 # ──────────────────────────────────────────────────────────────────────────────
@@ -24,7 +30,8 @@ TOOL_SCHEMAS = [
                     "query": {"type": "string", "description": "Search term, e.g. 'Brooks shoe'"},
                     "category": {"type": "string", "enum": ["shoes", "books"], "description": "Optional category filter"},
                     "size": {"type": "string", "description": "Shoe size (optional)"},
-                    "max_price": {"type": "number", "description": "Maximum price limit (optional)"}
+                    "max_price": {"type": "number", "description": "Maximum price limit (optional)"},
+                    "limit": {"type": "integer", "description": "Maximum number of results (default 6)", "minimum": 1}
                 },
                 "required": ["query"]
             }
@@ -48,33 +55,41 @@ TOOL_SCHEMAS = [
     {
         "type": "function",
         "function": {
-            "name": "initiate_checkout",
-            "description": "Triggers the secure payment UI. Call this IMMEDIATELY when the user confirms they want to buy.",
+            "name": "get_best_offers",
+            "description": "Get the best price for several products in one call. Use this to compare products instead of calling get_best_offer for each.",
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "product_id": {"type": "string", "description": "The product ID to purchase"},
-                    "quantity": {"type": "integer", "description": "Units to purchase", "minimum": 1}
+                    "items": {
+                        "type": "array",
+                        "description": "Products to price, e.g. [{'product_id': 'brooks_ghost', 'quantity': 1}]",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "product_id": {"type": "string"},
+                                "quantity": {"type": "integer", "minimum": 1}
+                            },
+                            "required": ["product_id"]
+                        }
+                    }
                 },
-                "required": ["product_id"]
+                "required": ["items"]
             }
         }
     },
     {
         "type": "function",
         "function": {
-            "name": "process_payment",
-            "description": "Process payment if user provides card details in chat.",
+            "name": "initiate_checkout",
+            "description": "Triggers the secure payment UI. Call this IMMEDIATELY when the user confirms they want to buy.",
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "amount": {"type": "number"},
-                    "card_type": {"type": "string", "enum": ["Visa", "Mastercard"]},
-                    "card_number": {"type": "string"},
-                    "card_expiry": {"type": "string"},
-                    "card_cvc": {"type": "string"}
+                    "product_id": {"type": "string", "description": "The product ID to purchase"},
+                    "quantity": {"type": "integer", "description": "Units to purchase", "minimum": 1},
+                    "offer_id": {"type": "string", "description": "offer_id from get_best_offer, to lock in the quoted price (optional)"}
                 },
-                "required": ["amount", "card_type", "card_number", "card_expiry", "card_cvc"]
+                "required": ["product_id"]
             }
         }
     }
@@ -84,14 +99,19 @@ TOOL_SCHEMAS = [
 # TOOLS IMPLEMENTATION
 # ──────────────────────────────────────────────────────────────────────────────
 
-def search_products(query: str, category: str = None, size: str = None, max_price: float = None, **kwargs) -> dict:
+def search_products(query: str, category: str = None, size: str = None, max_price: float = None, limit: int = DEFAULT_SEARCH_RESULTS_LIMIT, **kwargs) -> dict:
     if max_price is not None:
         try:
             max_price = float(max_price)
         except (ValueError, TypeError):
             max_price = None
-            
-    results = catalog_service.search(query, category=category, size=size, max_price=max_price)
+
+    try:
+        limit = max(1, int(limit))
+    except (ValueError, TypeError):
+        limit = DEFAULT_SEARCH_RESULTS_LIMIT
+
+    results = catalog_service.search(query, category=category, size=size, max_price=max_price, limit=limit)
     if not results:
         return {"found": False, "message": f"No products found matching '{query}'."}
 
@@ -100,13 +120,13 @@ def search_products(query: str, category: str = None, size: str = None, max_pric
         "count": len(results),
         "products": [
             {
-                "id": r["id"],
-                "name": r["name"],
-                "brand": r["brand"],
-                "category": r["category"],
-                "description": r["description"],
-                "base_price": r["base_price"],
-                "image_url": r.get("image_url"),
+                "id": r.id,
+                "name": r.name,
+                "brand": r.brand,
+                "category": r.category,
+                "description": r.description,
+                "base_price": r.base_price,
+                "image_url": r.image_url,
             }
             for r in results
         ]
@@ -123,32 +143,168 @@ def get_best_offer(product_id: str, quantity: int = 1, **kwargs) -> dict:
     if not offers:
         return {"found": False, "message": "No offers available."}
 
-    best = min(offers, key=lambda x: x["unit_final_price"])
-    return {"found": True, "best_offer": best}
+    best = min(offers, key=lambda x: x.unit_final_price)
+    return {"found": True, "best_offer": best.to_dict()}
+
+# Products priced per get_best_offers call, to keep the tool result readable for the model
+BULK_OFFERS_LIMIT = 20
 
-def initiate_checkout(product_id: str, quantity: int = 1, **kwargs) -> dict:
+
+def get_best_offers(items: list, **kwargs) -> dict:
+    # Accept bare product ids as well as {"product_id", "quantity"} objects
+    pairs = []
+    for item in (items or [])[:BULK_OFFERS_LIMIT]:
+        if isinstance(item, str):
+            item = {"product_id": item}
+        try:
+            quantity = int(item.get("quantity", 1))
+        except (ValueError, TypeError):
+            quantity = 1
+        pairs.append((item.get("product_id", ""), quantity))
+    if not pairs:
+        return {"found": False, "message": "No products given."}
+
+    quotes = []
+    for (product_id, quantity), offers in zip(pairs, catalog_service.get_vendor_prices_bulk(pairs)):
+        if not offers:
+            quotes.append({"product_id": product_id, "quantity": quantity, "found": False})
+            continue
+        best = min(offers, key=lambda x: x.unit_final_price)
+        quotes.append({
+            "product_id": product_id,
+            "quantity": quantity,
+            "found": True,
+            "best_offer": best.to_dict(),
+            # Full comparison table, one row per vendor
+            "vendors": [
+                {"vendor": o.vendor, "unit_final_price": o.unit_final_price, "total_price": o.total_price, "in_stock": o.in_stock}
+                for o in offers
+            ],
+        })
+
+    found = [q for q in quotes if q["found"]]
+    if not found:
+        return {"found": False, "message": "No offers available."}
+    cheapest = min(found, key=lambda q: q["best_offer"]["total_price"])
+    return {"found": True, "count": len(found), "quotes": quotes, "cheapest": cheapest["product_id"]}
+
+def initiate_checkout(product_id: str, quantity: int = 1, offer_id: str = None, **kwargs) -> dict:
     # Ensure quantity is an integer
     try:
         quantity = int(quantity)
     except (ValueError, TypeError):
         quantity = 1
-    
-    # Get the best offer to ensure we have the current offer details
-    offers = catalog_service.get_vendor_prices(product_id, quantity=quantity)
-    if not offers:
-        return {"success": False, "message": "No offers available for checkout."}
-    
-    # Find the best offer by unit_final_price
-    best = min(offers, key=lambda x: x["unit_final_price"])
+
+    # Prefer the exact snapshot the user was quoted
+    best = catalog_service.get_offer(offer_id) if offer_id else None
+    if best and (best.product_id != product_id or best.quantity != quantity):
+        best = None
+
+    if best is None:
+        # Cached offers keep the price consistent with the last get_best_offer
+        offers = catalog_service.get_vendor_prices(product_id, quantity=quantity)
+        if not offers:
+            return {"success": False, "message": "No offers available for checkout."}
+
+        # Find the best offer by unit_final_price
+        best = min(offers, key=lambda x: x.unit_final_price)
     return {
         "success": True, 
         "message": f"✅ Checkout UI triggered for {quantity} unit(s) of '{product_id}'.",
         "checkout_details": {"product_id": product_id, "quantity": quantity},
-        "offer_details": best  # Include offer details for frontend
+        "offer_details": best.to_dict()  # Include offer details for frontend
+    }
+
+# ──────────────────────────────────────────────────────────────────────────────
+# MODEL-FACING ENCODING
+# ──────────────────────────────────────────────────────────────────────────────
+# Tool results are re-sent to the model on every later iteration and turn, so
+# they are pruned to what it needs to reason and answer. The UI still gets the
+# full payloads through search_results / offer_details.
+
+def _short(text: str, limit: int = 80) -> str:
+    """First sentence of `text`, capped at `limit` characters."""
+    text = (text or "").split(". ")[0].strip()
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _compact_offer(offer: dict) -> dict:
+    compact = {
+        "offer_id": offer.get("offer_id"),
+        "product_id": offer.get("product_id"),
+        "product_name": offer.get("product_name"),
+        "vendor": offer.get("vendor"),
+        "quantity": offer.get("quantity", 1),
+        "unit_price": offer.get("unit_price"),
+    }
+    if offer.get("unit_discount"):
+        compact["unit_discount"] = offer["unit_discount"]
+    compact["total_price"] = offer.get("total_price")
+    for key in ("size", "width"):
+        if offer.get(key):
+            compact[key] = offer[key]
+    if offer.get("in_stock") is False:
+        compact["in_stock"] = False
+    return compact
+
+
+def _encode_search_products(result: dict) -> dict:
+    return {
+        "found": True,
+        "count": result["count"],
+        "products": [
+            {"id": p["id"], "name": p["name"], "brand": p["brand"], "base_price": p["base_price"], "about": _short(p.get("description"))}
+            for p in result["products"]
+        ],
+    }
+
+
+def _encode_get_best_offer(result: dict) -> dict:
+    return {"found": True, "best_offer": _compact_offer(result["best_offer"])}
+
+
+def _encode_get_best_offers(result: dict) -> dict:
+    quotes = []
+    for q in result["quotes"]:
+        if not q["found"]:
+            quotes.append({"product_id": q["product_id"], "found": False})
+            continue
+        quotes.append({
+            "product_id": q["product_id"],
+            "found": True,
+            "best_offer": _compact_offer(q["best_offer"]),
+            # Other vendors as [vendor, unit price] pairs; the best one is already above
+            "others": [[v["vendor"], v["unit_final_price"]] for v in q["vendors"] if v["vendor"] != q["best_offer"]["vendor"]],
+        })
+    return {"found": True, "count": result["count"], "cheapest": result["cheapest"], "quotes": quotes}
+
+
+def _encode_initiate_checkout(result: dict) -> dict:
+    return {
+        "success": True,
+        "message": result["message"],
+        "checkout_details": result["checkout_details"],
+        "offer_details": _compact_offer(result["offer_details"]),
     }
 
-def process_payment(**kwargs) -> dict:
-    return payment_service.process_payment(**kwargs)
+
+# Applied only to successful results; errors and "not found" messages are already small
+MODEL_ENCODERS = {
+    "search_products": _encode_search_products,
+    "get_best_offer": _encode_get_best_offer,
+    "get_best_offers": _encode_get_best_offers,
+    "initiate_checkout": _encode_initiate_checkout,
+}
+
+
+def encode_result(name: str, result: dict, compact: bool = COMPACT_TOOL_RESULTS) -> str:
+    """The tool message content the model sees for `result`."""
+    if not compact:
+        return json.dumps(result)
+    encoder = MODEL_ENCODERS.get(name)
+    if encoder and (result.get("found") or result.get("success")):
+        result = encoder(result)
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
 
 # ──────────────────────────────────────────────────────────────────────────────
 # EXECUTION ENGINE
@@ -157,18 +313,64 @@ def process_payment(**kwargs) -> dict:
 TOOL_MAP = {
     "search_products": search_products,
     "get_best_offer": get_best_offer,
+    "get_best_offers": get_best_offers,
     "initiate_checkout": initiate_checkout,
-    "process_payment": process_payment,
 }
 
 def execute_tool(name: str, arguments: dict) -> dict:
     func = TOOL_MAP.get(name)
     if not func:
         return {"error": f"Tool '{name}' not found."}
-    try:
-        if isinstance(arguments, str):
-            arguments = json.loads(arguments)
-        return func(**arguments)
-    except Exception as e:
-        logger.error(f"Error executing tool {name}: {e}")
-        return {"error": str(e)}
+    with span(TOOL_SECONDS, tool=name) as s:
+        try:
+            if isinstance(arguments, str):
+                arguments = json.loads(arguments)
+            return func(**arguments)
+        except Exception as e:
+            logger.error(f"Error executing tool {name}: {e}")
+            s["outcome"] = "error"
+            return {"error": str(e)}
+
+
+# Tools with external side effects never run concurrently with other calls
+SIDE_EFFECT_TOOLS = {"initiate_checkout"}
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+
+def _batches(calls: list[tuple[str, dict]]) -> list[list[int]]:
+    """
+    Split calls (in order) into batches of indexes: runs of read-only calls
+    share a batch, each side-effecting call gets its own.
+    """
+    batches: list[list[int]] = []
+    for i, (name, _) in enumerate(calls):
+        if name in SIDE_EFFECT_TOOLS or not batches or calls[batches[-1][0]][0] in SIDE_EFFECT_TOOLS:
+            batches.append([])
+        batches[-1].append(i)
+    return batches
+
+
+def execute_tools(calls: list[tuple[str, dict]]) -> list[dict]:
+    """Execute (name, arguments) calls, read-only ones concurrently; results keep call order."""
+    results: list[dict] = [None] * len(calls)
+    for batch in _batches(calls):
+        if len(batch) == 1:
+            results[batch[0]] = execute_tool(*calls[batch[0]])
+            continue
+        futures = {i: _executor.submit(execute_tool, *calls[i]) for i in batch}
+        for i, future in futures.items():
+            results[i] = future.result()
+    return results
+
+
+async def aexecute_tools(calls: list[tuple[str, dict]]) -> list[dict]:
+    """Async execute_tools(): each call runs in a worker thread, off the event loop."""
+    results: list[dict] = [None] * len(calls)
+    for batch in _batches(calls):
+        batch_results = await asyncio.gather(
+            *(asyncio.to_thread(execute_tool, *calls[i]) for i in batch)
+        )
+        for i, result in zip(batch, batch_results):
+            results[i] = result
+    return results
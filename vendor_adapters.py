@@ -0,0 +1,213 @@
+"""
+Vendor Adapters — async price sources fanned out in parallel.
+
+Each vendor is a VendorAdapter with its own deadline. VendorGateway quotes
+all vendors for a category concurrently and returns whatever arrived in
+time, so best-offer latency is bounded by the slowest *allowed* vendor
+rather than the sum of all of them.
+
+By default every vendor is simulated in-process. Set VENDOR_FEED_URL to
+point the adapters at an HTTP price feed instead (see vendor_simulator.py
+for a local stand-in).
+
+quote_many() prices a whole list of products at once: simulated vendors
+in one vectorised NumPy pass (a plain loop without NumPy), other vendors
+fanned out concurrently.
+"""
+import os
+import random
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Optional
+
+from models import Offer, Product
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+VENDOR_TIMEOUT = float(os.getenv("VENDOR_TIMEOUT", "2.0"))
+VENDOR_FEED_URL = os.getenv("VENDOR_FEED_URL", "")
+
+
+class VendorAdapter(ABC):
+    """A single vendor price source."""
+
+    def __init__(self, name: str, timeout: float = VENDOR_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+
+    @abstractmethod
+    async def quote(self, product: Product, quantity: int = 1, width: Optional[str] = None) -> Optional[Offer]:
+        ...
+
+
+class SimulatedVendor(VendorAdapter):
+    """Random prices within ±12% of base, with an occasional 5-18% discount."""
+
+    def __init__(self, name: str, timeout: float = VENDOR_TIMEOUT, latency: float = 0.0):
+        super().__init__(name, timeout)
+        self.latency = latency
+
+    async def quote(self, product: Product, quantity: int = 1, width: Optional[str] = None) -> Optional[Offer]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return _simulated_offer(self.name, product, quantity, width)
+
+    @staticmethod
+    def price_batch(rows: list[tuple[str, Product, int]], width: Optional[str] = None) -> list[Offer]:
+        """quote() for many (vendor name, product, quantity) rows at once, with the same price model."""
+        np = _numpy()
+        if np is None:
+            return [_simulated_offer(vendor, product, quantity, width) for vendor, product, quantity in rows]
+
+        rng = np.random.default_rng()
+        n = len(rows)
+        base = np.fromiter((product.base_price for _, product, _ in rows), dtype=np.float64, count=n)
+        prices = np.round(base + rng.uniform(-0.12, 0.12, n) * base, 2)
+        discounts = np.where(rng.random(n) > 0.6, np.round(prices * rng.uniform(0.05, 0.18, n), 2), 0.0)
+        return [
+            Offer(vendor, product, price, discount or 0, quantity=quantity, width=width)
+            for (vendor, product, quantity), price, discount in zip(rows, prices.tolist(), discounts.tolist())
+        ]
+
+
+def _simulated_offer(vendor: str, product: Product, quantity: int, width: Optional[str]) -> Offer:
+    base = product.base_price
+    price = round(base + random.uniform(-base * 0.12, base * 0.12), 2)
+    discount = 0
+    if random.random() > 0.6:
+        discount = round(price * random.uniform(0.05, 0.18), 2)
+    return Offer(vendor, product, price, discount, quantity=quantity, width=width)
+
+
+def _numpy():
+    """numpy if installed (imported on the first bulk quote), else None."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class HttpVendor(VendorAdapter):
+    """Vendor reached over HTTP: GET {base_url}/quote → {unit_price, unit_discount, in_stock}."""
+
+    def __init__(self, name: str, base_url: str, client: "httpx.AsyncClient", timeout: float = VENDOR_TIMEOUT):
+        super().__init__(name, timeout)
+        self.base_url = base_url.rstrip("/")
+        self.client = client
+
+    async def quote(self, product: Product, quantity: int = 1, width: Optional[str] = None) -> Optional[Offer]:
+        response = await self.client.get(
+            f"{self.base_url}/quote",
+            params={"vendor": self.name, "product_id": product.id, "base_price": product.base_price},
+        )
+        response.raise_for_status()
+        data = response.json()
+        return Offer(
+            self.name,
+            product,
+            data["unit_price"],
+            data.get("unit_discount", 0),
+            quantity=quantity,
+            width=width,
+            in_stock=data.get("in_stock", True),
+        )
+
+
+class VendorGateway:
+    """
+    Owns the vendor adapters and a background event loop for their I/O,
+    so synchronous callers (tools run in worker threads) can fan out too.
+    """
+
+    def __init__(self, vendors: dict[str, list[str]], feed_url: str = VENDOR_FEED_URL):
+        self.vendors = vendors
+        self.feed_url = feed_url
+        self._adapters: dict[str, VendorAdapter] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._lock = threading.Lock()
+
+    def register(self, adapter: VendorAdapter) -> None:
+        """Replace the adapter used for `adapter.name`."""
+        self._adapters[adapter.name] = adapter
+
+    def adapter(self, name: str) -> VendorAdapter:
+        if name not in self._adapters:
+            if self.feed_url:
+                self._adapters[name] = HttpVendor(name, self.feed_url, self._http_client())
+            else:
+                self._adapters[name] = SimulatedVendor(name)
+        return self._adapters[name]
+
+    def _http_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx  # only needed for HTTP price feeds
+            self._client = httpx.AsyncClient(timeout=VENDOR_TIMEOUT)
+        return self._client
+
+    def vendor_names(self, product: Product) -> list[str]:
+        return self.vendors.get(product.category, self.vendors["books"])
+
+    async def aquote_all(self, product: Product, quantity: int = 1, width: Optional[str] = None) -> list[Offer]:
+        """Quote every vendor for the product's category concurrently; drop slow or failing ones."""
+        adapters = [self.adapter(name) for name in self.vendor_names(product)]
+
+        async def bounded(adapter: VendorAdapter):
+            return await asyncio.wait_for(adapter.quote(product, quantity, width), adapter.timeout)
+
+        results = await asyncio.gather(*(bounded(a) for a in adapters), return_exceptions=True)
+
+        offers = []
+        for adapter, result in zip(adapters, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning(f"Vendor {adapter.name} timed out after {adapter.timeout}s")
+            elif isinstance(result, Exception):
+                logger.warning(f"Vendor {adapter.name} failed: {result}")
+            elif result is not None:
+                offers.append(result)
+        return offers
+
+    def quote_all(self, product: Product, quantity: int = 1, width: Optional[str] = None) -> list[Offer]:
+        """Blocking wrapper around aquote_all() for synchronous callers."""
+        future = asyncio.run_coroutine_threadsafe(self.aquote_all(product, quantity, width), self._event_loop())
+        return future.result()
+
+    def quote_many(self, items: list[tuple[Product, int]], width: Optional[str] = None) -> list[list[Offer]]:
+        """
+        Offers for many (product, quantity) pairs, aligned with `items`.
+        Products whose vendors are all instant simulations are priced in a
+        single batch; the rest go through aquote_all() concurrently.
+        """
+        results: list[list[Offer]] = [[] for _ in items]
+        rows, owners, remote = [], [], []
+        for i, (product, quantity) in enumerate(items):
+            names = self.vendor_names(product)
+            if all(isinstance(a, SimulatedVendor) and not a.latency for a in map(self.adapter, names)):
+                rows.extend((name, product, quantity) for name in names)
+                owners.extend([i] * len(names))
+            else:
+                remote.append(i)
+
+        for i, offer in zip(owners, SimulatedVendor.price_batch(rows, width)):
+            results[i].append(offer)
+
+        if remote:
+            async def quote_remote():
+                return await asyncio.gather(*(self.aquote_all(items[i][0], items[i][1], width) for i in remote))
+
+            for i, offers in zip(remote, asyncio.run_coroutine_threadsafe(quote_remote(), self._event_loop()).result()):
+                results[i] = offers
+        return results
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="vendor-io", daemon=True).start()
+            return self._loop
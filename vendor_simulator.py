@@ -0,0 +1,47 @@
+"""
+Vendor Simulator — a local stand-in for real vendor price feeds.
+
+Serves GET /quote with the same pricing rules as SimulatedVendor, plus
+configurable latency so timeouts and partial results can be exercised:
+
+    VENDOR_SIM_LATENCY=0.2 VENDOR_SIM_SLOW="Zappos=5" python vendor_simulator.py
+    VENDOR_FEED_URL=http://127.0.0.1:9100 python main.py
+"""
+import os
+import random
+import asyncio
+from fastapi import FastAPI
+
+DEFAULT_LATENCY = float(os.getenv("VENDOR_SIM_LATENCY", "0"))
+# Per-vendor overrides, e.g. "Zappos=5,eBay Books=0.5"
+SLOW_VENDORS = {
+    name.strip(): float(seconds)
+    for name, seconds in (
+        item.split("=", 1) for item in os.getenv("VENDOR_SIM_SLOW", "").split(",") if "=" in item
+    )
+}
+
+app = FastAPI(title="Vendor Price Simulator")
+
+
+@app.get("/quote")
+async def quote(vendor: str, product_id: str, base_price: float):
+    await asyncio.sleep(SLOW_VENDORS.get(vendor, DEFAULT_LATENCY))
+
+    price = round(base_price + random.uniform(-base_price * 0.12, base_price * 0.12), 2)
+    discount = 0
+    if random.random() > 0.6:
+        discount = round(price * random.uniform(0.05, 0.18), 2)
+
+    return {
+        "vendor": vendor,
+        "product_id": product_id,
+        "unit_price": price,
+        "unit_discount": discount,
+        "in_stock": True,
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("VENDOR_SIM_PORT", "9100")))
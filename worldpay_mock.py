@@ -0,0 +1,48 @@
+"""
+WorldPay Mock — a local stand-in for the WorldPay Access authorizations API.
+
+Accepts the same v7 request as the sandbox and answers "authorized",
+except for cards ending in 0002 ("refused"). WORLDPAY_MOCK_LATENCY adds
+a per-request delay for load and timeout testing:
+
+    WORLDPAY_MOCK_LATENCY=0.5 python worldpay_mock.py
+    WORLDPAY_BASE_URL=http://127.0.0.1:9200 python main.py
+"""
+import os
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+API_VERSION = "application/vnd.worldpay.payments-v7+json"
+LATENCY = float(os.getenv("WORLDPAY_MOCK_LATENCY", "0"))
+
+app = FastAPI(title="WorldPay Mock")
+
+
+@app.post("/payments/authorizations")
+async def authorize(request: Request):
+    await asyncio.sleep(LATENCY)
+
+    if not request.headers.get("authorization", "").startswith("Basic "):
+        return JSONResponse({"errorName": "unauthorized"}, status_code=401)
+    if request.headers.get("content-type") != API_VERSION:
+        return JSONResponse({"errorName": "headerIsMissing", "message": "Invalid Content-Type"}, status_code=415)
+
+    body = await request.json()
+    card_number = body["instruction"]["paymentInstrument"]["cardNumber"]
+    outcome = "refused" if card_number.endswith("0002") else "authorized"
+
+    return JSONResponse(
+        {
+            "outcome": outcome,
+            "transactionReference": body["transactionReference"],
+            "riskFactors": [],
+        },
+        status_code=201,
+        media_type=API_VERSION,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("WORLDPAY_MOCK_PORT", "9200")))